@@ -1,17 +1,40 @@
 import os
 import sys
-from fastapi import APIRouter, HTTPException
-import requests
-from app.core.github_client import github_client
-from app.core.db_client import db_client
+from typing import Any, Dict
+from fastapi import APIRouter, Depends, HTTPException
+import httpx
+from starlette.concurrency import run_in_threadpool
+from app.api.dependencies import get_db, get_github, get_requester
+from app.config import settings
+from app.core.admission import choose_queue, estimate_cost, fair_priority, in_flight_ttl, queue_options
+from app.core.async_db_client import AsyncDBClient
+from app.core.async_github_client import AsyncGitHubClient
+from app.core.db_client import is_stale
+from app.core.rate_limiter import RateLimitExceeded
 from worker.worker import analyze_repository
 
 router = APIRouter()
 
 @router.get("/analyze")
-def analyze_repo(repo: str):
+async def analyze_repo(
+    repo: str,
+    refresh: bool = False,
+    force: bool = False,
+    db_client: AsyncDBClient = Depends(get_db),
+    github_client: AsyncGitHubClient = Depends(get_github),
+    requester: str = Depends(get_requester),
+):
     """
     Analyzes a GitHub repository.
+    With refresh=true an already analyzed repository is re-analyzed from the
+    commit it was last built from.
+    Concurrent calls for the same repository share one job: while an analysis
+    is queued or running, its job_id is returned instead of starting another.
+    force=true always starts a new analysis. Results older than
+    RESULT_MAX_AGE are returned with "stale": true while a refresh is
+    queued ("refresh_job_id").
+    Jobs go to the small or large queue by the repository's estimated size,
+    and a requester's jobs lose priority the more of them are waiting.
     """
     try:
         # 1. Validate and parse the repo string
@@ -22,27 +45,84 @@ def analyze_repo(repo: str):
         owner, repo_name = path_parts
 
         # 2. Check if the repository is public
-        repo_info = github_client.get_repo(owner, repo_name)
+        repo_info = await github_client.get_repo(owner, repo_name)
         if repo_info.get("private"):
             raise HTTPException(status_code=403, detail="Repository is private")
 
         # 3. Check if the repository has been analyzed before
-        existing_repo = db_client.get_repo_by_name(owner, repo_name)
-        if existing_repo and existing_repo.get("last_analyzed"):
-            return existing_repo
+        existing_repo = await db_client.get_repo_by_name(owner, repo_name, fields=[])
+        # Evicted results only keep the summary, so those are rebuilt
+        if existing_repo and existing_repo.get("last_analyzed") and not existing_repo.get("evicted") and not (refresh or force):
+            results = await db_client.get_repo_by_id(existing_repo["id"])
+            if not is_stale(existing_repo):
+                return results
+            # Serve the stale results now; the refresh replaces them once done
+            try:
+                refresh_job = await _start_analysis(db_client, owner, repo_name, existing_repo, repo_info, requester)
+            except Exception as e:
+                print(f"Could not queue a refresh of {owner}/{repo_name}: {e}")
+                refresh_job = {}
+            return {**results, "stale": True, "refresh_job_id": refresh_job.get("job_id")}
 
         # 4. If not, create a new repository entry and analysis job
         if not existing_repo:
-            existing_repo = db_client.create_repo(owner, repo_name, not repo_info.get("private"))
+            existing_repo = await db_client.create_repo(owner, repo_name, not repo_info.get("private"))
 
-        job = db_client.create_job(existing_repo["id"])
-        
-        # 5. Trigger the Celery task
-        task = analyze_repository.apply_async(args=[owner, repo_name, existing_repo["id"]], task_id=str(job["id"]))
+        return await _start_analysis(db_client, owner, repo_name, existing_repo, repo_info, requester, force)
 
-        return {"message": "Analysis started", "job_id": job["id"], "repo_id": existing_repo["id"]}
+    except HTTPException:
+        raise
 
-    except requests.exceptions.RequestException as e:
+    except RateLimitExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(int(e.retry_after) + 1)})
+    except httpx.HTTPError as e:
         raise HTTPException(status_code=404, detail=f"Repository not found or GitHub API error: {e}")
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def _start_analysis(
+    db_client: AsyncDBClient,
+    owner: str,
+    repo_name: str,
+    repo_record: Dict[str, Any],
+    repo_info: Dict[str, Any],
+    requester: str,
+    force: bool = False,
+) -> Dict[str, Any]:
+    """
+    Queues an analysis of a repository, or returns the job already in flight.
+    """
+    cost = estimate_cost(await db_client.get_repo_cost(repo_record["id"]), repo_info)
+    queue = choose_queue(cost)
+    job = await db_client.create_job(repo_record["id"], {"queue": queue, "requester": requester})
+    in_flight = await db_client.claim_analysis(owner, repo_name, job["id"], force=force, ttl=in_flight_ttl(queue, queued=True))
+    if in_flight:
+        await db_client.delete_job(job["id"])
+        return {"message": "Analysis already in progress", "job_id": in_flight, "repo_id": repo_record["id"]}
+
+    waiting = await db_client.admit_job(job["id"], queue, requester)
+    if waiting is None:
+        await db_client.release_analysis(owner, repo_name, job["id"])
+        await db_client.delete_job(job["id"])
+        raise HTTPException(
+            status_code=429,
+            detail=f"At most {settings.REQUESTER_MAX_QUEUED} analyses per client may wait at a time",
+        )
+
+    # 5. Trigger the Celery task
+    # Publishing to the broker is a blocking call
+    try:
+        await run_in_threadpool(
+            analyze_repository.apply_async,
+            args=[owner, repo_name, repo_record["id"]],
+            kwargs={"refresh": bool(repo_record.get("last_analyzed"))},
+            task_id=str(job["id"]),
+            priority=fair_priority(waiting),
+            **queue_options(queue),
+        )
+    except Exception:
+        await db_client.unadmit_job(job["id"], queue, requester)
+        await db_client.release_analysis(owner, repo_name, job["id"])
+        raise
+
+    return {"message": "Analysis started", "job_id": job["id"], "repo_id": repo_record["id"], "queue": queue}
@@ -0,0 +1,40 @@
+from fastapi import Request
+
+from app.config import settings
+
+from app.core.async_db_client import AsyncDBClient
+from app.core.async_github_client import AsyncGitHubClient
+from app.core.job_events import JobEventBroker
+
+def get_db(request: Request) -> AsyncDBClient:
+    """
+    The AsyncDBClient created in the app lifespan.
+    """
+    return request.app.state.db
+
+def get_github(request: Request) -> AsyncGitHubClient:
+    """
+    The AsyncGitHubClient created in the app lifespan.
+    """
+    return request.app.state.github
+
+def get_events(request: Request) -> JobEventBroker:
+    """
+    The JobEventBroker started in the app lifespan.
+    """
+    return request.app.state.events
+
+def get_requester(request: Request) -> str:
+    """
+    The address analyses are queued for, for fair queueing. Behind
+    TRUSTED_PROXY_HOPS proxies the peer is a proxy, so the client is read
+    from the X-Forwarded-For entry the outermost proxy appended.
+    """
+    peer = request.client.host if request.client else "unknown"
+    if not settings.TRUSTED_PROXY_HOPS:
+        return peer
+    forwarded = [entry.strip() for entry in request.headers.get("x-forwarded-for", "").split(",") if entry.strip()]
+    if len(forwarded) < settings.TRUSTED_PROXY_HOPS:
+        # Not sent through all the proxies
+        return peer
+    return forwarded[-settings.TRUSTED_PROXY_HOPS]
@@ -1,12 +1,27 @@
-from fastapi import APIRouter, Depends
-from app.core.db_client import db_client
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from app.api.dependencies import get_db
+from app.core.async_db_client import AsyncDBClient
 
 router = APIRouter()
 
 @router.get("/history")
-async def get_analysis_history():
+async def get_analysis_history(
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    sort: str = "recent",
+    owner: Optional[str] = None,
+    db_client: AsyncDBClient = Depends(get_db),
+):
     """
-    Returns a list of all analyzed repositories.
+    Returns a page of analyzed repositories. The cursor of the next page, if
+    there is one, is returned in the X-Next-Cursor header.
     """
-    history = await db_client.get_analysis_history()
+    try:
+        history, next_cursor = await db_client.get_analysis_history(limit=limit, cursor=cursor, sort=sort, owner=owner)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return history
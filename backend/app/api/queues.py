@@ -0,0 +1,14 @@
+from fastapi import APIRouter, Depends
+
+from app.api.dependencies import get_db
+from app.core.async_db_client import AsyncDBClient
+
+router = APIRouter()
+
+@router.get("/queues")
+async def get_queues(db_client: AsyncDBClient = Depends(get_db)):
+    """
+    Depth and wait times (seconds) of the analysis queues. The same waits
+    are exported by the workers as analysis_queue_wait_seconds.
+    """
+    return await db_client.get_queue_stats()
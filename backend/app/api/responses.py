@@ -0,0 +1,75 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Dict, Optional
+
+import orjson
+from fastapi import Request, Response
+
+def json_response(data: Any, headers: Optional[Dict[str, str]] = None) -> Response:
+    """
+    Serializes data with orjson, which is several times faster than the
+    default encoder on large graphs.
+    """
+    return Response(
+        content=orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS),
+        media_type="application/json",
+        headers=headers,
+    )
+
+def validators(version: str, last_modified: Optional[str] = None) -> Dict[str, str]:
+    """
+    Returns the ETag (and Last-Modified, from a str(datetime.utcnow())
+    timestamp) headers of a representation identified by `version`. The ETag
+    is weak because GZipMiddleware may re-encode the body.
+    """
+    headers = {
+        "ETag": f'W/"{hashlib.sha1(version.encode("utf-8")).hexdigest()[:20]}"',
+        "Cache-Control": "no-cache",
+    }
+    if last_modified:
+        try:
+            modified = datetime.fromisoformat(last_modified).replace(tzinfo=timezone.utc)
+            headers["Last-Modified"] = format_datetime(modified, usegmt=True)
+        except ValueError:
+            pass
+    return headers
+
+def not_modified(request: Request, headers: Dict[str, str]) -> Optional[Response]:
+    """
+    Returns a 304 response if the client's If-None-Match / If-Modified-Since
+    validators still match, else None.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        etag = headers["ETag"][2:]
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        if "*" in tags or etag in tags:
+            return Response(status_code=304, headers=headers)
+        return None
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and "Last-Modified" in headers:
+        try:
+            if parsedate_to_datetime(headers["Last-Modified"]) <= parsedate_to_datetime(if_modified_since):
+                return Response(status_code=304, headers=headers)
+        except (TypeError, ValueError):
+            pass
+    return None
+
+def accepts(request: Request, media_type: str) -> bool:
+    """
+    Whether the request's Accept header lists `media_type` (with a non-zero
+    quality). Wildcards do not count: the other representation is the
+    default.
+    """
+    for entry in request.headers.get("accept", "").split(","):
+        kind, *params = [part.strip() for part in entry.split(";")]
+        if kind.lower() != media_type:
+            continue
+        quality = next((param.split("=", 1)[1] for param in params if param.startswith("q=")), "1")
+        try:
+            return float(quality) > 0
+        except ValueError:
+            return False
+    return False
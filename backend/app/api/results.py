@@ -1,24 +1,243 @@
 import os
 import sys
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 import uuid
+from typing import Any, Dict, Optional
+import numpy as np
 
 # Add the project root to the python path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
 
-from app.core.db_client import db_client
+from starlette.concurrency import run_in_threadpool
+from app.api.dependencies import get_db
+from app.core.async_db_client import AsyncDBClient
+from app.core.compact_graph import GRAPH_MEDIA_TYPE
+from app.core.db_client import REPO_SECTIONS
+from app.core.graph_index import GraphIndex
+from app.core.graph_hierarchy import GRAPH_VIEWS
+from app.api.responses import accepts, json_response, not_modified, validators
 
 router = APIRouter()
 
 @router.get("/results/{repo_id}")
-def get_results_by_repo_id(repo_id: str):
+async def get_results_by_repo_id(
+    repo_id: str,
+    request: Request,
+    fields: Optional[str] = None,
+    db_client: AsyncDBClient = Depends(get_db),
+):
     """
     Retrieves the results of a completed analysis job by repo ID.
+    `fields` is a comma-separated subset of graph, metrics, clusters and
+    narrative; by default all of them are returned. Results carry an ETag and
+    Last-Modified derived from the analysis time, and revalidation requests
+    are answered with 304 before any section is read. Results evicted for
+    lack of reads are a 404 until the repository is analyzed again.
+    With "Accept: application/vnd.synapse.graph" the graph alone is returned
+    in its binary format (see CompactGraph), several times smaller than its
+    JSON and served as stored.
     """
+    selected = None
+    if fields is not None:
+        selected = [field.strip() for field in fields.split(',') if field.strip()]
+        unknown = set(selected) - set(REPO_SECTIONS)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    binary = accepts(request, GRAPH_MEDIA_TYPE)
+    if binary and selected not in (None, ["graph"]):
+        raise HTTPException(status_code=406, detail=f"Only the graph is available as {GRAPH_MEDIA_TYPE}")
     try:
-        results = db_client.get_repo_by_id(repo_id)
+        record = await db_client.get_repo_by_id(repo_id, fields=[])
+        if not record:
+            raise HTTPException(status_code=404, detail="Results not found for this repo ID")
+        if record.get("evicted"):
+            raise HTTPException(status_code=404, detail="Results were evicted; analyze the repository again")
+        sections = "graph.bin" if binary else ','.join(sorted(selected or REPO_SECTIONS))
+        headers = validators(f"{repo_id}:{record.get('last_analyzed')}:{sections}", record.get("last_analyzed"))
+        headers["Vary"] = "Accept"
+        cached = not_modified(request, headers)
+        if cached:
+            return cached
+
+        if binary:
+            graph = await db_client.get_encoded_graph(repo_id)
+            if graph is None:
+                raise HTTPException(status_code=404, detail="Results not found for this repo ID")
+            return Response(content=graph, media_type=GRAPH_MEDIA_TYPE, headers=headers)
+
+        results = await db_client.get_repo_by_id(repo_id, selected)
         if not results:
             raise HTTPException(status_code=404, detail="Results not found for this repo ID")
-        return results
+        return json_response(results, headers)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/results/{repo_id}/graph")
+async def get_graph_slice(
+    repo_id: str,
+    request: Request,
+    view: str = "directory",
+    root: str = "",
+    level: int = Query(1, ge=1, le=8),
+    db_client: AsyncDBClient = Depends(get_db),
+):
+    """
+    Returns a level-of-detail slice of the dependency graph: the contents of
+    the group `root` ("" for the whole repository) of a "directory" or
+    "cluster" view, expanded `level` levels deep. Groups at the last level
+    are collapsed into nodes of type "group" carrying their file count and
+    summed churn; links carry the number of file-level imports they stand
+    for. Expand a group by requesting it as `root`.
+    """
+    if view not in GRAPH_VIEWS:
+        raise HTTPException(status_code=400, detail=f"view must be one of {', '.join(GRAPH_VIEWS)}")
+    try:
+        record = await db_client.get_repo_by_id(repo_id, fields=[])
+        if not record:
+            raise HTTPException(status_code=404, detail="Results not found for this repo ID")
+        if record.get("evicted"):
+            raise HTTPException(status_code=404, detail="Results were evicted; analyze the repository again")
+        version = f"{repo_id}:{record.get('last_analyzed')}:graph:{view}:{level}:{root}"
+        headers = validators(version, record.get("last_analyzed"))
+        cached = not_modified(request, headers)
+        if cached:
+            return cached
+
+        graph = await db_client.get_graph_slice(repo_id, view, root, level)
+        if graph is None:
+            raise HTTPException(status_code=404, detail=f"No group '{root}' in the {view} view of this repository")
+        return json_response({"view": view, **graph}, headers)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def _graph_index(
+    repo_id: str,
+    request: Request,
+    db_client: AsyncDBClient,
+    query: str,
+    paths: Dict[str, str],
+):
+    """
+    The query index of a repository for a graph query, or a 304 response
+    when the client's copy of the answer is current. 404s for unknown
+    repositories and for files not in the graph.
+    """
+    record = await db_client.get_repo_by_id(repo_id, fields=[])
+    if not record:
+        raise HTTPException(status_code=404, detail="Results not found for this repo ID")
+    if record.get("evicted"):
+        raise HTTPException(status_code=404, detail="Results were evicted; analyze the repository again")
+    headers = validators(f"{repo_id}:{record.get('last_analyzed')}:{query}", record.get("last_analyzed"))
+    cached = not_modified(request, headers)
+    if cached:
+        return None, cached
+
+    index = await db_client.get_graph_index(repo_id, str(record.get("last_analyzed")))
+    if index is None:
+        raise HTTPException(status_code=404, detail="No dependency graph for this repository; analyze it again")
+    for name, path in paths.items():
+        if path not in index.index:
+            raise HTTPException(status_code=404, detail=f"No file '{path}' ({name}) in the graph of this repository")
+    return index, headers
+
+def _reach(index: GraphIndex, path: str, dependents: bool, depth: Optional[int], limit: int) -> Dict[str, Any]:
+    found, distances = index.traverse(path, dependents, depth)
+    # Nearest first, ties in tree order
+    order = np.lexsort((found, distances))[:limit]
+    by_distance = np.bincount(distances)[1:].tolist() if len(distances) else []
+    return {
+        "path": path,
+        "depth": depth,
+        "total": len(found),
+        "max_distance": len(by_distance),
+        "by_distance": by_distance,
+        "cycle": index.cycle(path),
+        "files": [{"path": index.files[found[i]], "distance": int(distances[i])} for i in order],
+        "truncated": len(found) > limit,
+    }
+
+@router.get("/results/{repo_id}/dependents")
+async def get_dependents(
+    repo_id: str,
+    request: Request,
+    path: str,
+    depth: Optional[int] = Query(None, ge=1),
+    limit: int = Query(1000, ge=1, le=100000),
+    db_client: AsyncDBClient = Depends(get_db),
+):
+    """
+    The files that import `path`, directly or through others up to `depth`
+    imports away (all of them by default): what a change to it can affect.
+    Files are listed nearest first, at most `limit` of them; `total` and
+    `by_distance` (counts at distance 1, 2, ...) cover all of them, and
+    `cycle` lists the files in an import cycle with `path`.
+    """
+    try:
+        index, headers = await _graph_index(repo_id, request, db_client, f"dependents:{path}:{depth}:{limit}", {"path": path})
+        if index is None:
+            return headers
+        result = await run_in_threadpool(_reach, index, path, True, depth, limit)
+        return json_response(result, headers)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/results/{repo_id}/dependencies")
+async def get_dependencies(
+    repo_id: str,
+    request: Request,
+    path: str,
+    depth: Optional[int] = Query(None, ge=1),
+    limit: int = Query(1000, ge=1, le=100000),
+    db_client: AsyncDBClient = Depends(get_db),
+):
+    """
+    The files `path` imports, directly or transitively up to `depth`
+    imports away. Same shape as /dependents.
+    """
+    try:
+        index, headers = await _graph_index(repo_id, request, db_client, f"dependencies:{path}:{depth}:{limit}", {"path": path})
+        if index is None:
+            return headers
+        result = await run_in_threadpool(_reach, index, path, False, depth, limit)
+        return json_response(result, headers)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/results/{repo_id}/path")
+async def get_import_path(
+    repo_id: str,
+    request: Request,
+    source: str,
+    target: str,
+    db_client: AsyncDBClient = Depends(get_db),
+):
+    """
+    The shortest import chain from `source` to `target` (source imports ...
+    imports target), or "path": null when `source` does not depend on
+    `target`.
+    """
+    try:
+        index, headers = await _graph_index(
+            repo_id, request, db_client, f"path:{source}:{target}", {"source": source, "target": target},
+        )
+        if index is None:
+            return headers
+        chain = await run_in_threadpool(index.shortest_path, source, target)
+        return json_response({
+            "source": source,
+            "target": target,
+            "path": chain,
+            "length": len(chain) - 1 if chain else None,
+        }, headers)
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,42 +1,121 @@
+import asyncio
 import os
 import sys
 import uuid
-from fastapi import APIRouter, HTTPException
+from typing import Any, Dict, Optional
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
 
 # Add the project root to the python path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
 
-from app.core.db_client import db_client
+from app.api.dependencies import get_db, get_events
+from app.core.async_db_client import AsyncDBClient
+from app.core.db_client import JOB_FINAL_STATUSES
+from app.core.job_events import JobEventBroker
+from app.api.responses import json_response, not_modified, validators
 
 router = APIRouter()
 
-@router.get("/status/{job_id}")
-def get_status(job_id: str):
-    """
-    Retrieves the status of an analysis job.
-    """
+# Seconds between keep-alive comments on an idle stream
+STREAM_KEEPALIVE = 15
+
+def _parse_job_id(job_id: str) -> str:
     try:
-        job_uuid = uuid.UUID(job_id)
+        return str(uuid.UUID(job_id))
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid job ID format")
 
-    job = db_client.get_job(str(job_uuid))
-    
+def _status_body(job_id: str, job: Dict[str, Any], result: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    return {
+        "job_id": job_id,
+        "status": job["status"],
+        "stage": job.get("stage"),
+        "progress": job.get("progress"),
+        "result": result,
+    }
+
+def _event(job_id: str, job: Dict[str, Any]) -> bytes:
+    """
+    Formats a job update as a Server-Sent Event: "progress" while the job is
+    pending or running, then "completed", "failed" or "timed_out". The
+    completion event points at the results instead of carrying them.
+    """
+    result = None
+    if job["status"] == "completed":
+        result = {"repo_id": job.get("repo_id"), "url": f"/api/v1/results/{job.get('repo_id')}"}
+    elif job["status"] == "failed":
+        result = {"error": "Analysis failed"}
+    elif job["status"] == "TIMED_OUT":
+        result = {"error": "Analysis timed out"}
+    data = orjson.dumps(_status_body(job_id, job, result))
+    name = job["status"].lower() if job["status"] in JOB_FINAL_STATUSES else "progress"
+    return b"event: " + name.encode('utf-8') + b"\ndata: " + data + b"\n\n"
+
+@router.get("/status/{job_id}")
+async def get_status(job_id: str, request: Request, db_client: AsyncDBClient = Depends(get_db)):
+    """
+    Retrieves the status of an analysis job. Polls of a job that has not
+    changed since the last response get a 304.
+    """
+    job_uuid = _parse_job_id(job_id)
+    job = await db_client.get_job(job_uuid)
+
     if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
 
+    headers = validators(f"{job_id}:{job.get('updated_at')}:{job['status']}", job.get("updated_at"))
+    cached = not_modified(request, headers)
+    if cached:
+        return cached
+
     result = None
     if job["status"] == "completed":
-        result = db_client.get_results_by_job_id(str(job_uuid))
+        # Only the repository record; the sections are served by /results
+        result = await db_client.get_results_by_job_id(job_uuid, fields=[])
     elif job["status"] == "failed":
         result = {"error": "Analysis failed"}
     elif job["status"] == "TIMED_OUT":
         result = {"error": "Analysis timed out"}
 
+    return json_response(_status_body(job_id, job, result), headers)
 
-    response = {
-        "job_id": job_id,
-        "status": job["status"],
-        "result": result,
-    }
-    return response
\ No newline at end of file
+@router.get("/status/{job_id}/stream")
+async def stream_status(
+    job_id: str,
+    request: Request,
+    db_client: AsyncDBClient = Depends(get_db),
+    events: JobEventBroker = Depends(get_events),
+):
+    """
+    Streams a job's status and progress as Server-Sent Events, starting with
+    its current state. The stream ends after the completed, failed or
+    TIMED_OUT event.
+    """
+    job_uuid = _parse_job_id(job_id)
+    if await db_client.get_job(job_uuid) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def stream():
+        async with events.subscribe(job_uuid) as updates:
+            # Read the current state after subscribing so no update is missed
+            job = await db_client.get_job(job_uuid)
+            while job is not None:
+                yield _event(job_id, job)
+                if job["status"] in JOB_FINAL_STATUSES:
+                    return
+                job = None
+                while job is None:
+                    if await request.is_disconnected():
+                        return
+                    try:
+                        job = await asyncio.wait_for(updates.get(), STREAM_KEEPALIVE)
+                    except asyncio.TimeoutError:
+                        yield b": keep-alive\n\n"
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
\ No newline at end of file
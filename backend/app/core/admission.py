@@ -0,0 +1,72 @@
+from typing import Any, Dict, List, Optional
+
+from app.config import settings
+
+# Analyses run on one of two queues, each consumed by its own workers, so a
+# big monorepo never sits in front of a batch of small repositories
+SMALL_QUEUE = "analysis.small"
+LARGE_QUEUE = "analysis.large"
+ANALYSIS_QUEUES = (SMALL_QUEUE, LARGE_QUEUE)
+
+# Lowest Celery priority (the Redis transport serves 0 first)
+LOWEST_PRIORITY = 9
+
+def tree_cost(file_tree: List[Dict[str, Any]]) -> Dict[str, int]:
+    """
+    The cost of analyzing a tree: its number of files and their total size
+    in bytes (0 when the source does not report sizes).
+    """
+    blobs = [item for item in file_tree if item.get('type') == 'blob']
+    return {"files": len(blobs), "bytes": sum(item.get('size') or 0 for item in blobs)}
+
+def estimate_cost(cached: Optional[Dict[str, int]], repo_info: Dict[str, Any]) -> Dict[str, int]:
+    """
+    The cost recorded when the repository's tree was last fetched or, for a
+    repository never analyzed, its size as reported by GitHub (in KB, and
+    including history, so it errs on the large side).
+    """
+    if cached:
+        return cached
+    return {"files": 0, "bytes": int(repo_info.get("size") or 0) * 1024}
+
+def choose_queue(cost: Dict[str, int]) -> str:
+    if cost["files"] > settings.LARGE_REPO_FILES or cost["bytes"] > settings.LARGE_REPO_BYTES:
+        return LARGE_QUEUE
+    return SMALL_QUEUE
+
+def queue_options(queue: str) -> Dict[str, Any]:
+    """
+    Celery options sending an analysis to `queue`. Large analyses get their
+    own time limits; small ones keep the task's defaults.
+    """
+    if queue == LARGE_QUEUE:
+        limit = settings.LARGE_ANALYSIS_TIME_LIMIT
+        return {"queue": queue, "soft_time_limit": limit, "time_limit": limit + 10}
+    return {"queue": queue}
+
+def in_flight_ttl(queue: str, queued: bool = False) -> int:
+    """
+    How long an analysis on `queue` may hold its repository's in-flight
+    marker, counted from when it starts running. With queued=True it is
+    counted from when the job is queued, which adds the QUEUED_JOB_TTL it
+    may wait; the worker shortens the marker once the job starts.
+    """
+    ttl = settings.ANALYSIS_IN_FLIGHT_TTL
+    if queue == LARGE_QUEUE:
+        ttl += settings.LARGE_ANALYSIS_TIME_LIMIT - 300
+    return ttl + settings.QUEUED_JOB_TTL if queued else ttl
+
+def fair_priority(waiting: int) -> int:
+    """
+    Priority of a requester's next job given how many of theirs are already
+    waiting: the first goes out at the top priority and each further one a
+    step lower, so one client queueing many repositories cannot starve the
+    others.
+    """
+    return min(waiting, LOWEST_PRIORITY)
+
+def percentile(samples: List[float], fraction: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
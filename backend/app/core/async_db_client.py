@@ -0,0 +1,372 @@
+import json
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Iterable, List, Tuple
+import redis.asyncio
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.core.db_client import (
+    ADMIT_JOB, ANALYSIS_IN_FLIGHT, QUEUE_PENDING, QUEUE_WAITS, RELEASE_IN_FLIGHT, REPO_COST, REQUESTER_QUEUED, RESULT_READS, RESULTS_BYTES, REPO_GRAPH, REPO_INDEX, HISTORY_BY_NAME, HISTORY_BY_OWNER, HISTORY_BY_TIME, HISTORY_SORTS, HISTORY_SUMMARY,
+    RESULT_SIZES, decode_cursor, encode_cursor, hierarchy_fields, merge_sections, missing_sections, new_job_record,
+    encoded_graph, new_repo_record, pack_field, restore_fields, unpack_field, wanted_sections,
+)
+from app.core.admission import ANALYSIS_QUEUES, percentile
+from app.core.compact_graph import CompactGraph
+from app.core.graph_hierarchy import build_views, graph_slice
+from app.core.graph_index import GraphIndex
+from app.core.sql_store import SQLStore
+
+class AsyncDBClient:
+    """
+    The API's view of the store: the calls made while serving requests, on a
+    redis.asyncio client with a shared connection pool. Records have the same
+    layout as the ones DBClient (used by the worker) reads and writes, and
+    the same optional SQL store behind Redis; its blocking calls run in the
+    thread pool.
+    """
+    def __init__(self, redis_client: redis.asyncio.Redis, store: Optional[SQLStore] = None):
+        self.redis_client = redis_client
+        self.store = store
+        # Decoded query indexes by (repo_id, last_analyzed), least recently used first
+        self._indexes: "OrderedDict[Tuple[str, str], GraphIndex]" = OrderedDict()
+
+    async def _persist(self, method: str, *args):
+        if self.store is None:
+            return
+        try:
+            await run_in_threadpool(getattr(self.store, method), *args)
+        except Exception as e:
+            print(f"Could not write to the SQL store ({method}): {e}")
+
+    async def _cache_repo_record(self, repo_data: Dict[str, Any]):
+        pipe = self.redis_client.pipeline()
+        pipe.set(f"repo_id:{repo_data['id']}", json.dumps(repo_data))
+        pipe.set(f"repo:{repo_data['owner']}:{repo_data['name']}", repo_data["id"])
+        await pipe.execute()
+
+    async def close(self):
+        await self.redis_client.aclose()
+
+    async def get_repo_by_name(self, owner: str, name: str, fields: Optional[Iterable[str]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Retrieves a repository by its owner and name. See get_repo_by_id for `fields`.
+        """
+        repo_id = await self.redis_client.get(f"repo:{owner}:{name}")
+        if repo_id:
+            return await self.get_repo_by_id(repo_id.decode('utf-8'), fields)
+        if self.store is not None:
+            repo_data = await run_in_threadpool(self.store.load_repo, owner=owner, name=name)
+            if repo_data:
+                await self._cache_repo_record(repo_data)
+                return await self.get_repo_by_id(repo_data["id"], fields)
+        return None
+
+    async def create_repo(self, owner: str, name: str, is_public: bool) -> Dict[str, Any]:
+        """
+        Creates a new repository entry.
+        """
+        new_repo = new_repo_record(owner, name, is_public)
+        await self.redis_client.set(f"repo_id:{new_repo['id']}", json.dumps(new_repo))
+        if not await self.redis_client.set(f"repo:{owner}:{name}", new_repo["id"], nx=True):
+            # A concurrent request registered the repository first
+            await self.redis_client.delete(f"repo_id:{new_repo['id']}")
+            return await self.get_repo_by_name(owner, name, fields=[])
+        await self._persist("save_repo", new_repo)
+        return new_repo
+
+    async def create_job(self, repo_id: str, details: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Creates a new analysis job, with optional extra fields.
+        """
+        new_job = new_job_record(repo_id, details)
+        await self.redis_client.set(f"job:{new_job['id']}", json.dumps(new_job), ex=settings.JOB_TTL)
+        await self._persist("save_job", new_job)
+        return new_job
+
+    async def delete_job(self, job_id: str):
+        await self.redis_client.delete(f"job:{job_id}")
+        await self._persist("delete_job", job_id)
+
+    async def claim_analysis(
+        self, owner: str, name: str, job_id: str, force: bool = False, ttl: int = settings.ANALYSIS_IN_FLIGHT_TTL
+    ) -> Optional[str]:
+        """
+        Registers job_id as the analysis in flight for a repository. Returns
+        None if it was registered, or the id of the job already in flight.
+        With force=True job_id replaces whatever is in flight.
+        """
+        key = ANALYSIS_IN_FLIGHT.format(owner=owner, name=name)
+        if force:
+            await self.redis_client.set(key, job_id, ex=ttl)
+            return None
+        while True:
+            if await self.redis_client.set(key, job_id, nx=True, ex=ttl):
+                return None
+            in_flight = await self.redis_client.get(key)
+            # Otherwise the other job finished in between; try again
+            if in_flight is not None:
+                return in_flight.decode('utf-8')
+
+    async def release_analysis(self, owner: str, name: str, job_id: str):
+        """
+        Clears the repository's in-flight marker if it still belongs to job_id.
+        """
+        await self.redis_client.eval(RELEASE_IN_FLIGHT, 1, ANALYSIS_IN_FLIGHT.format(owner=owner, name=name), job_id)
+
+    async def get_repo_cost(self, repo_id: str) -> Optional[Dict[str, int]]:
+        """
+        The size of the repository's tree when it was last fetched, if ever.
+        """
+        cost = await self.redis_client.hgetall(REPO_COST.format(repo_id=repo_id))
+        return {key.decode('utf-8'): int(value) for key, value in cost.items()} or None
+
+    async def admit_job(self, job_id: str, queue: str, requester: str) -> Optional[int]:
+        """
+        Records job_id as waiting on `queue`. Returns how many of the
+        requester's jobs were already waiting, or None (nothing recorded) if
+        they have settings.REQUESTER_MAX_QUEUED waiting.
+        """
+        now = time.time()
+        waiting = await self.redis_client.eval(
+            ADMIT_JOB, 2, REQUESTER_QUEUED.format(requester=requester), QUEUE_PENDING.format(queue=queue),
+            job_id, now, now - settings.QUEUED_JOB_TTL, settings.REQUESTER_MAX_QUEUED, settings.QUEUED_JOB_TTL,
+        )
+        return None if waiting < 0 else waiting
+
+    async def unadmit_job(self, job_id: str, queue: str, requester: str):
+        """
+        Undoes admit_job, for a job that could not be sent to the broker.
+        """
+        pipe = self.redis_client.pipeline()
+        pipe.zrem(REQUESTER_QUEUED.format(requester=requester), job_id)
+        pipe.zrem(QUEUE_PENDING.format(queue=queue), job_id)
+        await pipe.execute()
+
+    async def get_queue_stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Per analysis queue: the jobs waiting to start, how long the oldest
+        has been waiting, and percentiles of the recent waits (seconds).
+        """
+        now = time.time()
+        pipe = self.redis_client.pipeline(transaction=False)
+        for queue in ANALYSIS_QUEUES:
+            pending = QUEUE_PENDING.format(queue=queue)
+            pipe.zremrangebyscore(pending, '-inf', now - settings.QUEUED_JOB_TTL)
+            pipe.zcard(pending)
+            pipe.zrange(pending, 0, 0, withscores=True)
+            pipe.lrange(QUEUE_WAITS.format(queue=queue), 0, -1)
+        results = await pipe.execute()
+
+        stats = {}
+        for i, queue in enumerate(ANALYSIS_QUEUES):
+            _, depth, oldest, waits = results[4 * i:4 * i + 4]
+            waits = [float(wait) for wait in waits]
+            stats[queue] = {
+                "depth": depth,
+                "oldest_wait": round(now - oldest[0][1], 3) if oldest else None,
+                "wait_p50": percentile(waits, 0.5),
+                "wait_p95": percentile(waits, 0.95),
+                "samples": len(waits),
+            }
+        return stats
+
+    async def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Retrieves a job by its ID.
+        """
+        job_data = await self.redis_client.get(f"job:{job_id}")
+        if job_data:
+            return json.loads(job_data)
+        if self.store is not None:
+            job = await run_in_threadpool(self.store.load_job, job_id)
+            if job:
+                await self.redis_client.set(f"job:{job_id}", json.dumps(job), ex=settings.JOB_TTL)
+            return job
+        return None
+
+    async def get_repo_by_id(self, repo_id: str, fields: Optional[Iterable[str]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Retrieves a repository by its ID. By default every section is loaded;
+        `fields` selects which of REPO_SECTIONS to load (an empty list loads
+        only the small repository record). Loading sections counts as a read
+        of the results (see DBClient.evict_results).
+        """
+        repo_data = await self.redis_client.get(f"repo_id:{repo_id}")
+        if repo_data:
+            repo_data = json.loads(repo_data)
+        elif self.store is not None:
+            repo_data = await run_in_threadpool(self.store.load_repo, repo_id=repo_id)
+            if repo_data:
+                await self._cache_repo_record(repo_data)
+        if not repo_data:
+            return None
+        wanted = wanted_sections(fields)
+        values = []
+        if wanted:
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.hmget(f"repo_data:{repo_id}", wanted)
+            pipe.zadd(RESULT_READS, {repo_id: time.time()}, xx=True)
+            values, _ = await pipe.execute()
+        missing = missing_sections(repo_data, wanted, values)
+        if missing and self.store is not None:
+            restored = await self._restore_sections(repo_id, missing)
+            values = [restored.get(section, value) for section, value in zip(wanted, values)]
+        return merge_sections(repo_data, wanted, values)
+
+    async def _restore_sections(self, repo_id: str, missing: List[str]) -> Dict[str, bytes]:
+        """
+        Loads sections Redis no longer has from the SQL store and caches
+        them again. Returns them encoded.
+        """
+        loaded = await run_in_threadpool(self.store.load_sections, repo_id, missing)
+        restored = restore_fields(loaded)
+        if restored:
+            pipe = self.redis_client.pipeline()
+            pipe.hset(f"repo_data:{repo_id}", mapping=restored)
+            pipe.zadd(RESULT_READS, {repo_id: time.time()})
+            size = sum(len(value) for value in restored.values())
+            pipe.zincrby(RESULT_SIZES, size, repo_id)
+            pipe.incrby(RESULTS_BYTES, size)
+            await pipe.execute()
+        return restored
+
+    async def _restore_graph_hierarchy(self, repo_id: str) -> bool:
+        """
+        Rebuilds an evicted level-of-detail graph from the graph and clusters
+        (read through from the SQL store). False if there is no graph.
+        """
+        stored = await self.get_repo_by_id(repo_id, ["graph", "clusters"])
+        if not stored or not stored.get("graph"):
+            return False
+        views = await run_in_threadpool(build_views, stored["graph"], stored.get("clusters") or {})
+        fields = hierarchy_fields(views)
+        pipe = self.redis_client.pipeline()
+        pipe.hset(REPO_GRAPH.format(repo_id=repo_id), mapping=fields)
+        size = sum(len(field) + len(value) for field, value in fields.items())
+        pipe.zincrby(RESULT_SIZES, size, repo_id)
+        pipe.incrby(RESULTS_BYTES, size)
+        await pipe.execute()
+        return True
+
+    async def get_graph_slice(self, repo_id: str, view: str, root: str, level: int) -> Optional[Dict[str, Any]]:
+        """
+        Reads one slice of a repository's level-of-detail graph (see
+        graph_slice), fetching only the groups it shows. None if the
+        repository has no such view or group.
+        """
+        key = REPO_GRAPH.format(repo_id=repo_id)
+
+        async def fetch_groups(group_ids: List[str]) -> List[Optional[Dict[str, Any]]]:
+            values = await self.redis_client.hmget(key, [f"{view}:{group_id}" for group_id in group_ids])
+            return [unpack_field(value) for value in values]
+
+        async def fetch_raw(group_ids: List[str]) -> List[Optional[List]]:
+            values = await self.redis_client.hmget(key, [f"{view}:{group_id}:raw" for group_id in group_ids])
+            return [unpack_field(value) for value in values]
+
+        # Only results still tracked (i.e. not evicted) have their read time updated
+        await self.redis_client.zadd(RESULT_READS, {repo_id: time.time()}, xx=True)
+        if self.store is not None and not await self.redis_client.exists(key):
+            await self._restore_graph_hierarchy(repo_id)
+        return await graph_slice(fetch_groups, fetch_raw, root, level)
+
+    async def get_encoded_graph(self, repo_id: str) -> Optional[bytes]:
+        """
+        The repository's graph in CompactGraph's binary format. The stored
+        section already is in that format, so it is only decompressed, never
+        decoded into nodes and links. None if there is no graph.
+        """
+        data = await self.redis_client.hget(f"repo_data:{repo_id}", "graph")
+        if data is None:
+            # Evicted, or stored inline by an old version; the usual read-through
+            stored = await self.get_repo_by_id(repo_id, ["graph"])
+            if not stored or not stored.get("graph"):
+                return None
+            return await run_in_threadpool(lambda: CompactGraph.from_graph(stored["graph"]).encode())
+        await self.redis_client.zadd(RESULT_READS, {repo_id: time.time()}, xx=True)
+        return await run_in_threadpool(encoded_graph, data)
+
+    async def get_graph_index(self, repo_id: str, version: str) -> Optional[GraphIndex]:
+        """
+        The repository's graph query index as of the analysis `version`
+        (its last_analyzed). Decoding a large index takes tens of
+        milliseconds, so the last settings.GRAPH_INDEX_CACHE_SIZE are kept
+        in memory. None if the repository has no index.
+        """
+        key = (repo_id, version)
+        index = self._indexes.get(key)
+        if index is not None:
+            self._indexes.move_to_end(key)
+            return index
+
+        data = await self.redis_client.get(REPO_INDEX.format(repo_id=repo_id))
+        await self.redis_client.zadd(RESULT_READS, {repo_id: time.time()}, xx=True)
+        if data is not None:
+            index = await run_in_threadpool(lambda: GraphIndex.load(unpack_field(data)))
+        elif self.store is not None:
+            # Evicted from Redis; rebuild it from the stored graph
+            stored = await self.get_repo_by_id(repo_id, ["graph"])
+            if stored and stored.get("graph"):
+                index = await run_in_threadpool(GraphIndex.from_graph, stored["graph"])
+                data = await run_in_threadpool(pack_field, index.dump())
+                pipe = self.redis_client.pipeline()
+                pipe.set(REPO_INDEX.format(repo_id=repo_id), data)
+                pipe.zincrby(RESULT_SIZES, len(data), repo_id)
+                pipe.incrby(RESULTS_BYTES, len(data))
+                await pipe.execute()
+        if index is None:
+            return None
+        self._indexes[key] = index
+        while len(self._indexes) > settings.GRAPH_INDEX_CACHE_SIZE:
+            self._indexes.popitem(last=False)
+        return index
+
+    async def get_results_by_job_id(self, job_id: str, fields: Optional[Iterable[str]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Retrieves the analysis results for a given job ID. See get_repo_by_id for `fields`.
+        """
+        job = await self.get_job(job_id)
+        if job and job.get("repo_id"):
+            return await self.get_repo_by_id(job["repo_id"], fields)
+        return None
+
+    async def get_analysis_history(
+        self,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        sort: str = "recent",
+        owner: Optional[str] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Returns one page of analyzed repositories and the cursor of the next
+        page (None on the last page). sort is "recent", "oldest" or "name";
+        owner restricts the page to one owner's repositories.
+        """
+        if sort not in HISTORY_SORTS:
+            raise ValueError(f"sort must be one of {', '.join(HISTORY_SORTS)}")
+
+        after = decode_cursor(cursor) if cursor else None
+        if sort == "name":
+            key = HISTORY_BY_NAME
+            low, high = (f"[{owner}/", f"[{owner}/\xff") if owner else ("-", "+")
+        else:
+            key = HISTORY_BY_OWNER.format(owner=owner) if owner else HISTORY_BY_TIME
+            low, high = "-", "+"
+
+        if sort == "recent":
+            members = await self.redis_client.zrevrangebylex(key, f"({after}" if after else high, low, start=0, num=limit + 1)
+        else:
+            members = await self.redis_client.zrangebylex(key, f"({after}" if after else low, high, start=0, num=limit + 1)
+        members = [member.decode('utf-8') for member in members]
+
+        page, rest = members[:limit], members[limit:]
+        pipe = self.redis_client.pipeline(transaction=False)
+        for member in page:
+            pipe.hgetall(HISTORY_SUMMARY.format(repo_id=member.rsplit('|', 1)[1]))
+        history = [
+            {field.decode('utf-8'): value.decode('utf-8') for field, value in summary.items()}
+            for summary in await pipe.execute() if summary
+        ]
+        next_cursor = encode_cursor(page[-1]) if rest else None
+        return history, next_cursor
@@ -0,0 +1,88 @@
+import asyncio
+from typing import Any, Dict, Optional
+
+import httpx
+import redis.asyncio
+
+from app.config import settings
+from app.core.github_client import MAX_RETRY_DELAY, retry_delay
+from app.core.http_cache import AsyncResponseCache
+from app.core.instrumentation import CACHE_LOOKUPS, GITHUB_BYTES, GITHUB_REQUESTS, github_endpoint
+from app.core.rate_limiter import AsyncRateLimiter
+
+class AsyncGitHubClient:
+    """
+    The API's GitHub client: the few calls made while serving a request, on a
+    pooled httpx.AsyncClient so a slow api.github.com does not tie up a
+    thread per request. Shares the response cache and rate limit budget with
+    the worker's GitHubClient.
+    """
+    def __init__(
+        self,
+        redis_client: redis.asyncio.Redis,
+        token: str = settings.GITHUB_TOKEN,
+        max_connections: int = settings.GITHUB_MAX_CONCURRENCY,
+        max_retries: int = settings.GITHUB_MAX_RETRIES,
+        backoff_factor: float = 0.5,
+    ):
+        self.api_url = "https://api.github.com"
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.client = httpx.AsyncClient(
+            headers={"Authorization": f"token {token}"},
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=httpx.Timeout(30.0),
+        )
+        self.response_cache = AsyncResponseCache(redis_client, token)
+        self.rate_limiter = AsyncRateLimiter(redis_client, token)
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    async def _get(self, url: str, params: Optional[Dict[str, Any]] = None, cache: bool = False) -> httpx.Response:
+        """
+        GET with the same retry, rate limit and conditional request handling
+        as GitHubClient._get.
+        """
+        endpoint = github_endpoint(url)
+        cached = await self.response_cache.get(url, params) if cache else None
+        headers = self.response_cache.conditional_headers(cached)
+
+        for attempt in range(self.max_retries + 1):
+            await self.rate_limiter.acquire()
+            try:
+                response = await self.client.get(url, params=params, headers=headers)
+            except (httpx.ConnectError, httpx.TimeoutException):
+                if attempt == self.max_retries:
+                    raise
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+
+            await self.rate_limiter.update(response.headers)
+            GITHUB_REQUESTS.labels(endpoint, str(response.status_code)).inc()
+
+            if response.status_code == 304 and cached:
+                CACHE_LOOKUPS.labels("github", "hit").inc()
+                await self.response_cache.touch(url, params)
+                return httpx.Response(200, content=cached[b"body"], request=response.request)
+
+            delay = retry_delay(response, self._backoff(attempt))
+            if delay is None or attempt == self.max_retries:
+                response.raise_for_status()
+                GITHUB_BYTES.labels(endpoint).inc(len(response.content))
+                if cache:
+                    CACHE_LOOKUPS.labels("github", "miss").inc()
+                    await self.response_cache.set(url, params, None, response.headers, response.content)
+                return response
+
+            await asyncio.sleep(delay)
+
+    def _backoff(self, attempt: int) -> float:
+        return min(self.backoff_factor * (2 ** attempt), MAX_RETRY_DELAY)
+
+    async def get_repo(self, owner: str, repo: str) -> Dict[str, Any]:
+        """
+        Retrieves repository information.
+        """
+        response = await self._get(f"{self.api_url}/repos/{owner}/{repo}", cache=True)
+        return response.json()
@@ -0,0 +1,150 @@
+import os
+import struct
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+# Media type of the binary encoding, for content negotiation
+GRAPH_MEDIA_TYPE = "application/vnd.synapse.graph"
+GRAPH_MAGIC = b"SYNG"
+GRAPH_FORMAT_VERSION = 1
+# Magic, version, then the node, edge and group counts
+_HEADER = struct.Struct("<4sIIII")
+
+class CompactGraph:
+    """
+    The dependency graph with every string stored once: a table of file
+    paths (a node's id is its position in it), a table of group names
+    (directories, or clusters once clustered) with an id per node, the churn
+    of every node, and the edges as two int32 arrays of node ids.
+
+    encode() lays it out as a little-endian binary:
+
+        header      "SYNG", u32 version, u32 nodes, u32 edges, u32 groups
+        paths       u32 byte length, the paths as NUL-separated UTF-8
+        groups      u32 byte length, the group names likewise
+        group       int32[nodes]
+        churn       int32[nodes]
+        sources     int32[edges]
+        targets     int32[edges]
+
+    Each string block is zero-padded to a multiple of 4 bytes so the arrays
+    can be viewed in place (an Int32Array in the browser). Git paths cannot
+    contain NUL, which makes it a safe separator.
+    """
+    def __init__(
+        self,
+        paths: List[str],
+        groups: List[str],
+        group: np.ndarray,
+        churn: np.ndarray,
+        sources: np.ndarray,
+        targets: np.ndarray,
+    ):
+        self.paths = paths
+        self.groups = groups
+        self.group = group
+        self.churn = churn
+        self.sources = sources
+        self.targets = targets
+
+    @classmethod
+    def build(
+        cls,
+        paths: Iterable[str],
+        group_of: Dict[str, str],
+        churn: Dict[str, int],
+        sources: Iterable[int],
+        targets: Iterable[int],
+    ) -> "CompactGraph":
+        """
+        Interns a graph over `paths`; files missing from `group_of` are
+        grouped by directory.
+        """
+        paths = list(paths)
+        names = [group_of.get(path, os.path.dirname(path)) for path in paths]
+        groups, group = np.unique(names, return_inverse=True) if paths else ([], np.zeros(0))
+        return cls(
+            paths,
+            [str(name) for name in groups],
+            np.asarray(group, dtype=np.int32),
+            np.fromiter((churn.get(path, 0) for path in paths), dtype=np.int32, count=len(paths)),
+            np.asarray(sources, dtype=np.int32),
+            np.asarray(targets, dtype=np.int32),
+        )
+
+    @classmethod
+    def from_graph(cls, graph: Dict[str, List]) -> "CompactGraph":
+        """
+        Interns a graph in the JSON shape ({"nodes", "links"}).
+        """
+        paths = [node["id"] for node in graph["nodes"]]
+        index = {path: i for i, path in enumerate(paths)}
+        links = graph["links"]
+        return cls.build(
+            paths,
+            {node["id"]: node.get("group", "") for node in graph["nodes"]},
+            {node["id"]: node.get("size", 0) for node in graph["nodes"]},
+            np.fromiter((index[link["source"]] for link in links), dtype=np.int32, count=len(links)),
+            np.fromiter((index[link["target"]] for link in links), dtype=np.int32, count=len(links)),
+        )
+
+    def to_graph(self) -> Dict[str, List]:
+        """
+        The graph in the JSON shape ({"nodes", "links"}).
+        """
+        groups = [self.groups[g] for g in self.group.tolist()]
+        return {
+            "nodes": [
+                {"id": path, "group": group, "size": size}
+                for path, group, size in zip(self.paths, groups, self.churn.tolist())
+            ],
+            "links": [
+                {"source": self.paths[source], "target": self.paths[target]}
+                for source, target in zip(self.sources.tolist(), self.targets.tolist())
+            ],
+        }
+
+    def sizes(self) -> Dict[str, int]:
+        """
+        Churn by path.
+        """
+        return dict(zip(self.paths, self.churn.tolist()))
+
+    def link_pairs(self) -> List[Tuple[str, str]]:
+        """
+        The edges as (source path, target path).
+        """
+        return [(self.paths[source], self.paths[target]) for source, target in zip(self.sources.tolist(), self.targets.tolist())]
+
+    def encode(self) -> bytes:
+        parts = [_HEADER.pack(GRAPH_MAGIC, GRAPH_FORMAT_VERSION, len(self.paths), len(self.sources), len(self.groups))]
+        for strings in (self.paths, self.groups):
+            block = "\0".join(strings).encode("utf-8")
+            parts.append(struct.pack("<I", len(block)))
+            parts.append(block + b"\0" * (-len(block) % 4))
+        for array in (self.group, self.churn, self.sources, self.targets):
+            parts.append(array.astype("<i4", copy=False).tobytes())
+        return b"".join(parts)
+
+    @classmethod
+    def decode(cls, data: bytes) -> "CompactGraph":
+        magic, version, nodes, edges, group_count = _HEADER.unpack_from(data, 0)
+        if magic != GRAPH_MAGIC or version != GRAPH_FORMAT_VERSION:
+            raise ValueError("Not an encoded graph, or an unsupported version of the format")
+        offset = _HEADER.size
+        tables = []
+        for count in (nodes, group_count):
+            (length,) = struct.unpack_from("<I", data, offset)
+            offset += 4
+            text = bytes(data[offset:offset + length]).decode("utf-8")
+            tables.append(text.split("\0") if count else [])
+            offset += length + (-length % 4)
+        arrays = []
+        for count in (nodes, nodes, edges, edges):
+            arrays.append(np.frombuffer(data, dtype="<i4", count=count, offset=offset).astype(np.int32))
+            offset += 4 * count
+        return cls(tables[0], tables[1], *arrays)
+
+def is_encoded_graph(data: bytes) -> bool:
+    return data[:len(GRAPH_MAGIC)] == GRAPH_MAGIC
@@ -1,62 +1,298 @@
 import uuid
 import json
+import base64
+import time
 from datetime import datetime
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, Iterable, List, Union
+import msgpack
 import redis
+import zstandard
+
+from app.core.compact_graph import CompactGraph, is_encoded_graph
+from app.core.instrumentation import instrument_redis
+from app.core.sql_store import SQLStore, open_store
 
 # In-memory storage to mock the database
 # _repos: Dict[uuid.UUID, Dict[str, Any]] = {}
 # _jobs: Dict[uuid.UUID, Dict[str, Any]] = {}
 
+# Secondary index of analyzed repositories. The sorted sets hold every
+# member at score 0 and are read in lexicographic order, which makes the
+# member itself an exact pagination cursor.
+HISTORY_BY_TIME = "history:by_time"          # "<last_analyzed>|<repo_id>"
+HISTORY_BY_OWNER = "history:by_time:{owner}"  # same, per owner
+HISTORY_BY_NAME = "history:by_name"          # "<owner>/<name>|<repo_id>"
+HISTORY_SUMMARY = "history:repo:{repo_id}"   # hash with the fields /history returns
+HISTORY_INDEXED = "history:indexed"
+HISTORY_SORTS = ("recent", "oldest", "name")
+
+# Pub/sub channel a job's record is published on whenever it changes
+JOB_EVENTS = "job_events:{job_id}"
+JOB_FINAL_STATUSES = ("completed", "failed", "TIMED_OUT")
+
+# Job id of the analysis queued or running for a repository, so concurrent
+# /analyze calls share one job instead of each starting their own
+ANALYSIS_IN_FLIGHT = "analysis:inflight:{owner}/{name}"
+# Clear / extend the marker only while it still belongs to the given job
+RELEASE_IN_FLIGHT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+EXTEND_IN_FLIGHT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('expire', KEYS[1], ARGV[2]) end return 0"
+
+# Sharded analyses: the tree being analyzed and the shard bookkeeping
+# ("shards", "files" and "parsed" totals, finished shard indices) of a job
+JOB_TREE = "job_tree:{job_id}"
+JOB_SHARDS = "job_shards:{job_id}"
+JOB_SHARDS_DONE = "job_shards:{job_id}:done"
+
+# Queued analyses (see app.core.admission): per queue, the ids of the jobs
+# waiting to start scored by when they were queued, and the recent waits in
+# seconds; per requester, the ids of their waiting jobs. The analyze task's
+# cost estimate is kept per repository ("files", "bytes" of its last tree).
+QUEUE_PENDING = "queue:{queue}:pending"
+QUEUE_WAITS = "queue:{queue}:waits"
+REQUESTER_QUEUED = "requester:{requester}:queued"
+REPO_COST = "repo_cost:{repo_id}"
+# Queues job ARGV[1] at time ARGV[2] unless its requester already has ARGV[4]
+# jobs waiting (entries older than ARGV[3] are dropped first); returns how
+# many were waiting, or -1
+ADMIT_JOB = """
+redis.call('zremrangebyscore', KEYS[1], '-inf', ARGV[3])
+local waiting = redis.call('zcard', KEYS[1])
+if waiting >= tonumber(ARGV[4]) then return -1 end
+redis.call('zadd', KEYS[1], ARGV[2], ARGV[1])
+redis.call('expire', KEYS[1], ARGV[5])
+redis.call('zadd', KEYS[2], ARGV[2], ARGV[1])
+return waiting
+"""
+
+# The large parts of an analysis. They are kept out of the repository record
+# (`repo_id:{id}`, small JSON) in a hash of msgpack+zstd encoded fields
+# (`repo_data:{id}`), so each can be read or written on its own.
+REPO_SECTIONS = ("graph", "metrics", "clusters", "narrative")
+ZSTD_LEVEL = 3
+
+# Retention of the stored sections and graph: when each repository's were
+# last read (or written) and their size in bytes, both as sorted sets
+RESULT_READS = "results:read_at"
+RESULT_SIZES = "results:bytes"
+RESULTS_TRACKED = "results:tracked"
+# Running total of RESULT_SIZES, so evict_results need not add it up
+RESULTS_BYTES = "results:total_bytes"
+RESULTS_COUNTED = "results:total_counted"
+# Sets repository ARGV[1]'s size to ARGV[2] (no ARGV[2] removes it) and
+# moves the total by the difference; returns the old size
+SET_RESULT_SIZE = """
+local old = tonumber(redis.call('zscore', KEYS[1], ARGV[1]) or 0)
+if ARGV[2] then
+    redis.call('zadd', KEYS[1], ARGV[2], ARGV[1])
+else
+    redis.call('zrem', KEYS[1], ARGV[1])
+end
+redis.call('incrby', KEYS[2], (tonumber(ARGV[2]) or 0) - old)
+return old
+"""
+# Starts the total from the sizes tracked so far, once
+COUNT_RESULT_BYTES = """
+if redis.call('exists', KEYS[3]) == 1 then return 0 end
+local total = 0
+local sizes = redis.call('zrange', KEYS[1], 0, -1, 'WITHSCORES')
+for i = 2, #sizes, 2 do total = total + tonumber(sizes[i]) end
+redis.call('set', KEYS[2], total)
+redis.call('set', KEYS[3], 1)
+return 1
+"""
+# Repositories evict_results looks at per round trip
+EVICTION_BATCH = 100
+
+# Level-of-detail graph (see GraphHierarchy): one hash per repository with a
+# field per group, "{view}:{group_id}", and its raw edges, "{view}:{group_id}:raw"
+REPO_GRAPH = "repo_graph:{repo_id}"
+# Query index of the dependency graph (GraphIndex.dump(), msgpack+zstd)
+REPO_INDEX = "repo_index:{repo_id}"
+# Imports of each file that resolved to no file (GraphBuilder.unresolved,
+# msgpack+zstd), re-resolved by incremental analyses against added files
+REPO_UNRESOLVED = "repo_unresolved:{repo_id}"
+
+def _pack(value: Any) -> bytes:
+    return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(msgpack.packb(value, use_bin_type=True))
+
+def _unpack(data: bytes) -> Any:
+    return msgpack.unpackb(zstandard.ZstdDecompressor().decompress(data), raw=False, strict_map_key=False)
+
+def _pack_section(section: str, value: Any) -> bytes:
+    """
+    Encodes a section. The graph is stored in CompactGraph's binary format,
+    which the API can serve without decoding it; the rest as msgpack.
+    """
+    if section == "graph":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(as_compact_graph(value).encode())
+    return _pack(value)
+
+def _unpack_section(section: str, data: bytes) -> Any:
+    if section == "graph":
+        raw = zstandard.ZstdDecompressor().decompress(data)
+        if is_encoded_graph(raw):
+            return CompactGraph.decode(raw).to_graph()
+        # Stored as msgpack before the binary format
+        return msgpack.unpackb(raw, raw=False, strict_map_key=False)
+    return _unpack(data)
+
+def as_compact_graph(graph: Union[Dict[str, List], CompactGraph]) -> CompactGraph:
+    return graph if isinstance(graph, CompactGraph) else CompactGraph.from_graph(graph)
+
+def encoded_graph(data: bytes) -> bytes:
+    """
+    The binary encoding (CompactGraph.encode()) of a stored graph section.
+    """
+    raw = zstandard.ZstdDecompressor().decompress(data)
+    if is_encoded_graph(raw):
+        return raw
+    return CompactGraph.from_graph(msgpack.unpackb(raw, raw=False, strict_map_key=False)).encode()
+
+# Record shapes and decoding shared with AsyncDBClient (the API's client)
+
+def new_repo_record(owner: str, name: str, is_public: bool) -> Dict[str, Any]:
+    return {
+        "id": str(uuid.uuid4()),
+        "owner": owner,
+        "name": name,
+        "is_public": is_public,
+        "last_analyzed": None,
+        "branch": None,
+        "commit_sha": None,
+        "tree_sha": None,
+    }
+
+def new_job_record(repo_id: str, details: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    return {
+        "id": str(uuid.uuid4()),
+        "repo_id": repo_id,
+        "status": "pending",
+        "created_at": str(datetime.utcnow()),
+        "updated_at": str(datetime.utcnow()),
+        **(details or {}),
+    }
+
+def is_stale(repo_data: Dict[str, Any]) -> bool:
+    """
+    Whether an analyzed repository's results are older than
+    settings.RESULT_MAX_AGE (never, when that is 0).
+    """
+    if not settings.RESULT_MAX_AGE or not repo_data.get("last_analyzed"):
+        return False
+    age = datetime.utcnow() - datetime.fromisoformat(repo_data["last_analyzed"])
+    return age.total_seconds() > settings.RESULT_MAX_AGE
+
+def hierarchy_fields(hierarchy: Dict[str, Dict[str, Dict[str, Any]]]) -> Dict[str, bytes]:
+    """
+    Encodes GraphHierarchy.build() output of every view as REPO_GRAPH fields.
+    """
+    fields = {}
+    for view, groups in hierarchy.items():
+        for group_id, group in groups.items():
+            fields[f"{view}:{group_id}"] = _pack({key: value for key, value in group.items() if key != "raw"})
+            fields[f"{view}:{group_id}:raw"] = _pack(group["raw"])
+    return fields
+
+def pack_field(value: Any) -> bytes:
+    return _pack(value)
+
+def unpack_field(value: Optional[bytes]) -> Any:
+    return _unpack(value) if value is not None else None
+
+def wanted_sections(fields: Optional[Iterable[str]]) -> List[str]:
+    """
+    Returns the sections to load for `fields` (all of them for None).
+    """
+    return list(REPO_SECTIONS) if fields is None else [field for field in fields if field in REPO_SECTIONS]
+
+def missing_sections(repo_data: Dict[str, Any], wanted: List[str], values: List[Optional[bytes]]) -> List[str]:
+    """
+    The wanted sections of an analyzed repository absent from Redis (e.g.
+    evicted), which a SQL store may still have.
+    """
+    if not repo_data.get("last_analyzed"):
+        return []
+    return [section for section, value in zip(wanted, values) if value is None and section not in repo_data]
+
+def restore_fields(loaded: Dict[str, Any]) -> Dict[str, bytes]:
+    """
+    Encodes sections loaded from a SQL store as Redis holds them (the graph
+    comes back decoded, the others still encoded).
+    """
+    return {section: _pack_section(section, value) if section == "graph" else value for section, value in loaded.items()}
+
+def merge_sections(repo_data: Dict[str, Any], wanted: List[str], values: List[Optional[bytes]]) -> Dict[str, Any]:
+    """
+    Adds the decoded sections to a repository record. Records written before
+    sections were split out carry them inline; those are used as a fallback
+    and dropped from the record otherwise.
+    """
+    legacy = {section: repo_data.pop(section) for section in REPO_SECTIONS if section in repo_data}
+    for section, value in zip(wanted, values):
+        repo_data[section] = _unpack_section(section, value) if value is not None else legacy.get(section)
+    return repo_data
+
 class DBClient:
-    def __init__(self, db_url: str):
+    """
+    The worker's store. With a SQLStore, repositories, jobs and results are
+    also written there, and Redis becomes a read-through cache in front of
+    it: records and sections Redis no longer has are loaded from it.
+    """
+    def __init__(self, db_url: str, store: Optional[SQLStore] = None):
         self.db_url = db_url
-        self.redis_client = redis.from_url(self.db_url)
+        self.redis_client = instrument_redis(redis.from_url(self.db_url))
+        self.store = store
+
+    def _persist(self, method: str, *args):
+        """
+        Writes through to the SQL store, if any. Redis keeps serving when the
+        store is unavailable, so failures are only logged.
+        """
+        if self.store is None:
+            return
+        try:
+            getattr(self.store, method)(*args)
+        except Exception as e:
+            print(f"Could not write to the SQL store ({method}): {e}")
 
-    def get_repo_by_name(self, owner: str, name: str) -> Optional[Dict[str, Any]]:
+    def get_repo_by_name(self, owner: str, name: str, fields: Optional[Iterable[str]] = None) -> Optional[Dict[str, Any]]:
         """
-        Retrieves a repository by its owner and name.
+        Retrieves a repository by its owner and name. See get_repo_by_id for `fields`.
         """
         repo_id = self.redis_client.get(f"repo:{owner}:{name}")
         if repo_id:
-            repo_data = self.redis_client.get(f"repo_id:{repo_id.decode('utf-8')}")
+            return self.get_repo_by_id(repo_id.decode('utf-8'), fields)
+        if self.store is not None:
+            repo_data = self.store.load_repo(owner=owner, name=name)
             if repo_data:
-                return json.loads(repo_data)
+                self._cache_repo_record(repo_data)
+                return self.get_repo_by_id(repo_data["id"], fields)
         return None
 
+    def _cache_repo_record(self, repo_data: Dict[str, Any]):
+        pipe = self.redis_client.pipeline()
+        pipe.set(f"repo_id:{repo_data['id']}", json.dumps(repo_data))
+        pipe.set(f"repo:{repo_data['owner']}:{repo_data['name']}", repo_data["id"])
+        pipe.execute()
+
     def create_repo(self, owner: str, name: str, is_public: bool) -> Dict[str, Any]:
         """
         Creates a new repository entry.
         """
-        repo_id = str(uuid.uuid4())
-        new_repo = {
-            "id": repo_id,
-            "owner": owner,
-            "name": name,
-            "is_public": is_public,
-            "last_analyzed": None,
-            "graph": None,
-            "metrics": None,
-            "narrative": None,
-            "clusters": None,
-        }
+        new_repo = new_repo_record(owner, name, is_public)
+        repo_id = new_repo["id"]
         self.redis_client.set(f"repo:{owner}:{name}", repo_id)
         self.redis_client.set(f"repo_id:{repo_id}", json.dumps(new_repo))
-        return new_repo
+        self._persist("save_repo", new_repo)
+        return {**new_repo, **dict.fromkeys(REPO_SECTIONS)}
     
-    def create_job(self, repo_id: str) -> Dict[str, Any]:
-        """
-        Creates a new analysis job.
-        """
-        job_id = str(uuid.uuid4())
-        new_job = {
-            "id": job_id,
-            "repo_id": repo_id,
-            "status": "pending",
-            "created_at": str(datetime.utcnow()),
-            "updated_at": str(datetime.utcnow()),
-        }
-        self.redis_client.set(f"job:{job_id}", json.dumps(new_job))
+    def create_job(self, repo_id: str, details: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Creates a new analysis job, with optional extra fields.
+        """
+        new_job = new_job_record(repo_id, details)
+        self.redis_client.set(f"job:{new_job['id']}", json.dumps(new_job), ex=settings.JOB_TTL)
+        self._persist("save_job", new_job)
         return new_job
 
     def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
@@ -66,89 +302,413 @@ class DBClient:
         job_data = self.redis_client.get(f"job:{job_id}")
         if job_data:
             return json.loads(job_data)
+        if self.store is not None:
+            job = self.store.load_job(job_id)
+            if job:
+                self.redis_client.set(f"job:{job_id}", json.dumps(job), ex=settings.JOB_TTL)
+            return job
         return None
 
     def update_job_status(self, job_id: str, status: str) -> Optional[Dict[str, Any]]:
         """
         Updates the status of a job.
         """
+        return self.update_job(job_id, {"status": status})
+
+    def update_job(self, job_id: str, updates: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Merges the given fields into a job record, which then expires
+        settings.JOB_TTL seconds later.
+        """
         job_data = self.get_job(job_id)
         if job_data:
-            job_data['status'] = status
+            job_data.update(updates)
             job_data['updated_at'] = str(datetime.utcnow())
-            self.redis_client.set(f"job:{job_id}", json.dumps(job_data))
+            payload = json.dumps(job_data)
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.set(f"job:{job_id}", payload, ex=settings.JOB_TTL)
+            pipe.publish(JOB_EVENTS.format(job_id=job_id), payload)
+            pipe.execute()
+            # Progress updates stay in Redis; status changes are kept for good
+            if "status" in updates:
+                self._persist("save_job", job_data)
             return job_data
         return None
 
+    def release_analysis(self, owner: str, name: str, job_id: str):
+        """
+        Clears the repository's in-flight marker if it still belongs to job_id.
+        """
+        self.redis_client.eval(RELEASE_IN_FLIGHT, 1, ANALYSIS_IN_FLIGHT.format(owner=owner, name=name), job_id)
+
+    def extend_analysis(self, owner: str, name: str, job_id: str, ttl: int):
+        """
+        Keeps the repository's in-flight marker for another ttl seconds, e.g.
+        while job_id waits to be retried.
+        """
+        self.redis_client.eval(EXTEND_IN_FLIGHT, 1, ANALYSIS_IN_FLIGHT.format(owner=owner, name=name), job_id, ttl)
+
+    def start_queued_job(self, job_id: str, queue: str, requester: Optional[str]) -> Optional[float]:
+        """
+        Takes a job that starts running off the queued sets and returns how
+        long it waited, or None if it was not queued (e.g. a retry).
+        """
+        pipe = self.redis_client.pipeline()
+        pipe.zscore(QUEUE_PENDING.format(queue=queue), job_id)
+        pipe.zrem(QUEUE_PENDING.format(queue=queue), job_id)
+        if requester:
+            pipe.zrem(REQUESTER_QUEUED.format(requester=requester), job_id)
+        queued_at = pipe.execute()[0]
+        if queued_at is None:
+            return None
+        waited = max(0.0, time.time() - queued_at)
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.lpush(QUEUE_WAITS.format(queue=queue), round(waited, 3))
+        pipe.ltrim(QUEUE_WAITS.format(queue=queue), 0, settings.QUEUE_WAIT_SAMPLES - 1)
+        pipe.execute()
+        return waited
+
+    def requeue_job(self, job_id: str, queue: str):
+        """
+        Counts a job moved to another queue as waiting there.
+        """
+        self.redis_client.zadd(QUEUE_PENDING.format(queue=queue), {job_id: time.time()})
+
+    def set_repo_cost(self, repo_id: str, cost: Dict[str, int]):
+        self.redis_client.hset(REPO_COST.format(repo_id=repo_id), mapping=cost)
+
+    def start_shards(self, job_id: str, tree: Dict[str, Any], shards: int, files: int, parsed: int, ttl: int):
+        """
+        Checkpoints the tree of a sharded analysis (read back by the reduce
+        step instead of passing it through the broker) and its shard totals.
+        """
+        pipe = self.redis_client.pipeline()
+        pipe.set(JOB_TREE.format(job_id=job_id), _pack(tree), ex=ttl)
+        pipe.delete(JOB_SHARDS_DONE.format(job_id=job_id))
+        pipe.hset(JOB_SHARDS.format(job_id=job_id), mapping={"shards": shards, "files": files, "parsed": parsed})
+        pipe.expire(JOB_SHARDS.format(job_id=job_id), ttl)
+        pipe.execute()
+
+    def get_job_tree(self, job_id: str) -> Optional[Dict[str, Any]]:
+        data = self.redis_client.get(JOB_TREE.format(job_id=job_id))
+        return _unpack(data) if data is not None else None
+
+    def is_shard_done(self, job_id: str, index: int) -> bool:
+        return bool(self.redis_client.sismember(JOB_SHARDS_DONE.format(job_id=job_id), index))
+
+    def finish_shard(self, job_id: str, index: int, parsed: int, ttl: int) -> Dict[str, int]:
+        """
+        Marks a shard as done, counting its files only the first time (a
+        shard may run twice after a worker is lost), and returns the job's
+        shard totals with "done", the number of finished shards.
+        """
+        done_key = JOB_SHARDS_DONE.format(job_id=job_id)
+        if self.redis_client.sadd(done_key, index):
+            self.redis_client.hincrby(JOB_SHARDS.format(job_id=job_id), "parsed", parsed)
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.expire(done_key, ttl)
+        pipe.hgetall(JOB_SHARDS.format(job_id=job_id))
+        pipe.scard(done_key)
+        _, totals, done = pipe.execute()
+        return {**{key.decode('utf-8'): int(value) for key, value in totals.items()}, "done": done}
+
+    def clear_shards(self, job_id: str):
+        self.redis_client.delete(JOB_TREE.format(job_id=job_id), JOB_SHARDS.format(job_id=job_id), JOB_SHARDS_DONE.format(job_id=job_id))
+
     def store_analysis_result(self, repo_id: str, analysis_data: Dict[str, Any]):
         """
-        Stores the final analysis result for a repository.
-        """
-        repo_data_str = self.redis_client.get(f"repo_id:{repo_id}")
-        if repo_data_str:
-            repo_data = json.loads(repo_data_str)
-            repo_data.update({
-                "last_analyzed": str(datetime.utcnow()),
-                "graph": analysis_data.get("graph"),
-                "metrics": analysis_data.get("metrics"),
-                "narrative": analysis_data.get("narrative"),
-                "clusters": analysis_data.get("clusters"),
-            })
-            self.redis_client.set(f"repo_id:{repo_id}", json.dumps(repo_data))
-            job_id = analysis_data.get("job_id")
-            if job_id:
-                self.update_job_status(job_id, "completed")
-            return repo_data
-        return None
+        Stores the final analysis result for a repository. Only the sections
+        present in analysis_data are rewritten; the others are kept. A
+        "hierarchy" entry (GraphHierarchy views) and an "index" entry
+        (GraphIndex.dump()) and an "unresolved" entry (GraphBuilder.unresolved)
+        replace the stored ones. Storing counts as a read for evict_results.
+        """
+        repo_data = self._get_repo_record(repo_id)
+        if repo_data is None:
+            return None
+
+        sections = {section: analysis_data[section] for section in REPO_SECTIONS if section in analysis_data}
+        # Records written before sections were split out carry them inline
+        legacy = {section: repo_data.pop(section) for section in REPO_SECTIONS if section in repo_data}
+        legacy.update(sections)
+        packed = {section: _pack_section(section, value) for section, value in legacy.items()}
+        graph = hierarchy_fields(analysis_data["hierarchy"]) if analysis_data.get("hierarchy") else None
+        sizes = repo_data.get("payload_bytes") or {}
+        sizes.update({section: len(value) for section, value in packed.items()})
+        if graph is not None:
+            sizes["hierarchy"] = sum(len(field) + len(value) for field, value in graph.items())
+        index = _pack(analysis_data["index"]) if analysis_data.get("index") else None
+        if index is not None:
+            sizes["index"] = len(index)
+        unresolved = _pack(analysis_data["unresolved"]) if analysis_data.get("unresolved") is not None else None
+        if unresolved is not None:
+            sizes["unresolved"] = len(unresolved)
+        if packed:
+            repo_data.pop("evicted", None)
+        repo_data["payload_bytes"] = sizes
+        repo_data.update({
+            "last_analyzed": str(datetime.utcnow()),
+            "branch": analysis_data.get("branch"),
+            "commit_sha": analysis_data.get("commit_sha"),
+            "tree_sha": analysis_data.get("tree_sha"),
+        })
+
+        pipe = self.redis_client.pipeline()
+        pipe.set(f"repo_id:{repo_id}", json.dumps(repo_data))
+        if packed:
+            pipe.hset(f"repo_data:{repo_id}", mapping=packed)
+        if graph is not None:
+            pipe.delete(REPO_GRAPH.format(repo_id=repo_id))
+            pipe.hset(REPO_GRAPH.format(repo_id=repo_id), mapping=graph)
+        if index is not None:
+            pipe.set(REPO_INDEX.format(repo_id=repo_id), index)
+        if unresolved is not None:
+            pipe.set(REPO_UNRESOLVED.format(repo_id=repo_id), unresolved)
+        pipe.zadd(RESULT_READS, {repo_id: time.time()})
+        pipe.eval(SET_RESULT_SIZE, 2, RESULT_SIZES, RESULTS_BYTES, repo_id, sum(sizes.values()))
+        pipe.execute()
+        self._persist("save_analysis", repo_data, packed, as_compact_graph(legacy["graph"]) if legacy.get("graph") else None)
+        self._index_history(repo_data)
+
+        job_id = analysis_data.get("job_id")
+        if job_id:
+            self.update_job_status(job_id, "completed")
+        return {**repo_data, **sections}
+
+    def evict_results(self, keep: Optional[str] = None) -> List[str]:
+        """
+        Drops the sections and graph of the repositories nobody has read for
+        settings.RESULT_IDLE_TTL seconds, then of the least recently read
+        ones while they all take more than settings.RESULT_PAYLOAD_BUDGET
+        bytes. Repository records and history summaries are kept. With a SQL
+        store the results are read back from it when next asked for;
+        otherwise the records are marked "evicted" and the next analysis
+        rebuilds them. `keep` is never evicted. Returns the evicted
+        repository ids.
+        """
+        cutoff = time.time() - settings.RESULT_IDLE_TTL
+        evicted = []
+        # Least recently read first, so the idle ones come before the rest;
+        # those left in place are skipped over
+        skipped = 0
+        done = False
+        while not done:
+            batch = self.redis_client.zrange(RESULT_READS, skipped, skipped + EVICTION_BATCH - 1, withscores=True)
+            done = len(batch) < EVICTION_BATCH
+            for member, read_at in batch:
+                repo_id = member.decode('utf-8')
+                if self._within_budget(read_at, cutoff):
+                    done = True
+                    break
+                if repo_id != keep and self._evict_result(repo_id, read_at):
+                    evicted.append(repo_id)
+                else:
+                    skipped += 1
+        if evicted:
+            print(f"Evicted the stored results of {len(evicted)} repositories")
+        return evicted
+
+    def _within_budget(self, read_at: float, cutoff: float) -> bool:
+        """
+        Whether a result last read at `read_at` is kept: it is not idle and
+        the results all fit settings.RESULT_PAYLOAD_BUDGET.
+        """
+        if read_at <= cutoff:
+            return False
+        return int(self.redis_client.get(RESULTS_BYTES) or 0) <= settings.RESULT_PAYLOAD_BUDGET
+
+    def _evict_result(self, repo_id: str, read_at: float) -> bool:
+        """
+        Drops one repository's result, unless it was read or stored again
+        since it was last read at `read_at`. The record is watched, so a
+        result stored meanwhile (which rewrites the record) makes the
+        eviction back off rather than overwrite it. Returns whether the
+        result was evicted.
+        """
+        record_key = f"repo_id:{repo_id}"
+        with self.redis_client.pipeline() as pipe:
+            try:
+                pipe.watch(record_key)
+                if pipe.zscore(RESULT_READS, repo_id) != read_at:
+                    return False
+                repo_data = pipe.get(record_key)
+                pipe.multi()
+                pipe.delete(
+                    f"repo_data:{repo_id}", REPO_GRAPH.format(repo_id=repo_id),
+                    REPO_INDEX.format(repo_id=repo_id), REPO_UNRESOLVED.format(repo_id=repo_id),
+                )
+                pipe.zrem(RESULT_READS, repo_id)
+                pipe.eval(SET_RESULT_SIZE, 2, RESULT_SIZES, RESULTS_BYTES, repo_id)
+                if repo_data is not None and self.store is None:
+                    repo_data = json.loads(repo_data)
+                    repo_data.pop("payload_bytes", None)
+                    repo_data["evicted"] = str(datetime.utcnow())
+                    pipe.set(record_key, json.dumps(repo_data))
+                pipe.execute()
+            except redis.WatchError:
+                return False
+        return True
+
+    def has_graph_hierarchy(self, repo_id: str) -> bool:
+        return bool(self.redis_client.exists(REPO_GRAPH.format(repo_id=repo_id)))
+
+    def has_graph_index(self, repo_id: str) -> bool:
+        return bool(self.redis_client.exists(REPO_INDEX.format(repo_id=repo_id)))
 
-    def get_repo_by_id(self, repo_id: str) -> Optional[Dict[str, Any]]:
+    def get_unresolved_imports(self, repo_id: str) -> Optional[Dict[str, List[str]]]:
         """
-        Retrieves a repository by its ID.
+        The unresolved imports stored with the repository's result, or None
+        if it was stored without them (or they were evicted).
         """
+        data = self.redis_client.get(REPO_UNRESOLVED.format(repo_id=repo_id))
+        return _unpack(data) if data is not None else None
+
+    def _get_repo_record(self, repo_id: str) -> Optional[Dict[str, Any]]:
         repo_data = self.redis_client.get(f"repo_id:{repo_id}")
         if repo_data:
             return json.loads(repo_data)
+        if self.store is not None:
+            record = self.store.load_repo(repo_id=repo_id)
+            if record:
+                self._cache_repo_record(record)
+            return record
         return None
 
-    def get_results_by_job_id(self, job_id: str) -> Optional[Dict[str, Any]]:
+    def _restore_sections(self, repo_id: str, missing: List[str]) -> Dict[str, bytes]:
+        """
+        Loads sections Redis no longer has from the SQL store and caches
+        them again. Returns them encoded.
+        """
+        restored = restore_fields(self.store.load_sections(repo_id, missing))
+        if restored:
+            pipe = self.redis_client.pipeline()
+            pipe.hset(f"repo_data:{repo_id}", mapping=restored)
+            pipe.zadd(RESULT_READS, {repo_id: time.time()})
+            size = sum(len(value) for value in restored.values())
+            pipe.zincrby(RESULT_SIZES, size, repo_id)
+            pipe.incrby(RESULTS_BYTES, size)
+            pipe.execute()
+        return restored
+
+    def get_repo_by_id(self, repo_id: str, fields: Optional[Iterable[str]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Retrieves a repository by its ID. By default every section is loaded;
+        `fields` selects which of REPO_SECTIONS to load (an empty list loads
+        only the small repository record).
+        """
+        repo_data = self._get_repo_record(repo_id)
+        if repo_data is None:
+            return None
+
+        wanted = wanted_sections(fields)
+        values = self.redis_client.hmget(f"repo_data:{repo_id}", wanted) if wanted else []
+        missing = missing_sections(repo_data, wanted, values)
+        if missing and self.store is not None:
+            restored = self._restore_sections(repo_id, missing)
+            values = [restored.get(section, value) for section, value in zip(wanted, values)]
+        return merge_sections(repo_data, wanted, values)
+
+    def get_results_by_job_id(self, job_id: str, fields: Optional[Iterable[str]] = None) -> Optional[Dict[str, Any]]:
         """
-        Retrieves the analysis results for a given job ID.
+        Retrieves the analysis results for a given job ID. See get_repo_by_id for `fields`.
         """
         job = self.get_job(job_id)
         if job:
             repo_id = job.get("repo_id")
             if repo_id:
-                repo_data = self.redis_client.get(f"repo_id:{repo_id}")
-                if repo_data:
-                    return json.loads(repo_data)
+                return self.get_repo_by_id(repo_id, fields)
         return None
 
-    async def get_analysis_history(self) -> List[Dict[str, Any]]:
+    def _index_history(self, repo_data: Dict[str, Any]):
+        """
+        Adds an analyzed repository to the history index, replacing the entry
+        of its previous analysis.
+        """
+        repo_id, owner, name = repo_data["id"], repo_data["owner"], repo_data["name"]
+        summary_key = HISTORY_SUMMARY.format(repo_id=repo_id)
+        previous = self.redis_client.hget(summary_key, "last_analyzed")
+
+        pipe = self.redis_client.pipeline()
+        if previous is not None:
+            old_member = f"{previous.decode('utf-8')}|{repo_id}"
+            pipe.zrem(HISTORY_BY_TIME, old_member)
+            pipe.zrem(HISTORY_BY_OWNER.format(owner=owner), old_member)
+        member = f"{repo_data['last_analyzed']}|{repo_id}"
+        pipe.zadd(HISTORY_BY_TIME, {member: 0})
+        pipe.zadd(HISTORY_BY_OWNER.format(owner=owner), {member: 0})
+        pipe.zadd(HISTORY_BY_NAME, {f"{owner}/{name}|{repo_id}": 0})
+        pipe.hset(summary_key, mapping={
+            "id": repo_id,
+            "owner": owner,
+            "name": name,
+            "last_analyzed": repo_data["last_analyzed"],
+            "branch": repo_data.get("branch") or "",
+            "commit_sha": repo_data.get("commit_sha") or "",
+        })
+        pipe.execute()
+
+    def ensure_history_index(self):
         """
-        Retrieves a list of all analyzed repositories.
+        Builds the history index from the stored repositories if it has never
+        been built. Run once at API startup; this is the only place that scans
+        every repository.
         """
-        print("Fetching analysis history...")
-        history = []
+        if self.redis_client.exists(HISTORY_INDEXED):
+            return
         for key in self.redis_client.scan_iter("repo_id:*"):
-            print(f"Processing key: {key}")
             repo_data_str = self.redis_client.get(key)
-            print(f"Raw data from Redis: {repo_data_str}")
-            if repo_data_str:
-                try:
-                    repo_data = json.loads(repo_data_str)
-                    print(f"Parsed repo data: {repo_data}")
-                    if repo_data.get("last_analyzed"):
-                        print(f"Repo {repo_data.get('name')} has been analyzed, adding to history.")
-                        history.append({
-                            "id": repo_data.get("id"),
-                            "owner": repo_data.get("owner"),
-                            "name": repo_data.get("name"),
-                        })
-                except json.JSONDecodeError:
-                    print(f"Could not decode JSON for key {key}")
-        print(f"Found {len(history)} analyzed repositories.")
-        return history
+            if not repo_data_str:
+                continue
+            try:
+                repo_data = json.loads(repo_data_str)
+            except json.JSONDecodeError:
+                print(f"Could not decode JSON for key {key}")
+                continue
+            if repo_data.get("last_analyzed"):
+                self._index_history(repo_data)
+        self.redis_client.set(HISTORY_INDEXED, 1)
+
+    def ensure_retention_index(self):
+        """
+        Starts tracking the results stored before evict_results existed, as
+        if they had just been read, and their total size. Like
+        ensure_history_index, it runs once.
+        """
+        self.redis_client.eval(COUNT_RESULT_BYTES, 3, RESULT_SIZES, RESULTS_BYTES, RESULTS_COUNTED)
+        if self.redis_client.exists(RESULTS_TRACKED):
+            return
+        for key in self.redis_client.scan_iter("repo_id:*"):
+            repo_id = key.decode('utf-8').split(':', 1)[1]
+            if self.redis_client.zscore(RESULT_SIZES, repo_id) is not None:
+                continue
+            repo_data = self._get_repo_record(repo_id)
+            if not repo_data or not repo_data.get("last_analyzed") or repo_data.get("evicted"):
+                continue
+            size = sum(self.redis_client.hstrlen(f"repo_data:{repo_id}", section) for section in REPO_SECTIONS)
+            size += sum(
+                len(field) + len(value)
+                for field, value in self.redis_client.hscan_iter(REPO_GRAPH.format(repo_id=repo_id))
+            )
+            size += self.redis_client.strlen(REPO_INDEX.format(repo_id=repo_id))
+            size += self.redis_client.strlen(REPO_UNRESOLVED.format(repo_id=repo_id))
+            pipe = self.redis_client.pipeline()
+            pipe.zadd(RESULT_READS, {repo_id: time.time()})
+            pipe.eval(SET_RESULT_SIZE, 2, RESULT_SIZES, RESULTS_BYTES, repo_id, size)
+            pipe.execute()
+        self.redis_client.set(RESULTS_TRACKED, 1)
+
+def encode_cursor(member: str) -> str:
+    return base64.urlsafe_b64encode(member.encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor: str) -> str:
+    try:
+        member = base64.b64decode(cursor.encode('ascii'), altchars=b'-_', validate=True).decode('utf-8')
+    except (ValueError, UnicodeError):
+        member = None
+    if not member or '|' not in member:
+        raise ValueError("Invalid cursor")
+    return member
 
 # Instantiate a single client for the app to use
 from app.config import settings
-db_client = DBClient(db_url=settings.REDIS_URL)
\ No newline at end of file
+db_client = DBClient(db_url=settings.REDIS_URL, store=open_store(settings.DATABASE_URL, settings.DATABASE_POOL_SIZE))
\ No newline at end of file
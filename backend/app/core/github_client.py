@@ -1,81 +1,320 @@
+import itertools
 import os
 import sys
+import time
+import redis
 import requests
-from typing import List, Dict, Any
+from urllib.parse import urlparse, parse_qs
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from requests.adapters import HTTPAdapter
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
 
 # Add the project root to the python path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
 
 from app.config import settings
+from app.core.http_cache import ResponseCache
+from app.core.instrumentation import CACHE_LOOKUPS, GITHUB_BYTES, GITHUB_REQUESTS, github_endpoint
+from app.core.rate_limiter import RateLimiter
+from app.core.repo_source import RepositorySource
 
-class GitHubClient:
-    def __init__(self, token: str = settings.GITHUB_TOKEN):
+# Statuses that are retried with backoff. 403 is only retried when GitHub
+# marks it as a rate limit (see _retry_delay).
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_RETRY_DELAY = 60
+
+def retry_delay(response, backoff: float) -> Optional[float]:
+    """
+    Returns how long to wait before retrying a response (requests or httpx),
+    or None if it should not be retried. `backoff` is used when GitHub does
+    not say how long to wait.
+    """
+    status = response.status_code
+    rate_limited = status == 403 and (
+        "Retry-After" in response.headers
+        or response.headers.get("X-RateLimit-Remaining") == "0"
+    )
+    if status not in RETRY_STATUSES and not rate_limited:
+        return None
+
+    retry_after = response.headers.get("Retry-After")
+    if retry_after and retry_after.isdigit():
+        return min(float(retry_after), MAX_RETRY_DELAY)
+
+    reset = response.headers.get("X-RateLimit-Reset")
+    if response.headers.get("X-RateLimit-Remaining") == "0" and reset and reset.isdigit():
+        return min(max(float(reset) - time.time(), 1), MAX_RETRY_DELAY)
+
+    return backoff
+
+class _CountingReader:
+    """
+    Wraps the body of a streamed response and counts the bytes read from it
+    in github_downloaded_bytes_total.
+    """
+    def __init__(self, raw, endpoint: str):
+        self._raw = raw
+        self.endpoint = endpoint
+
+    def read(self, *args, **kwargs) -> bytes:
+        data = self._raw.read(*args, **kwargs)
+        GITHUB_BYTES.labels(self.endpoint).inc(len(data))
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+class GitHubClient(RepositorySource):
+    def __init__(
+        self,
+        token: str = settings.GITHUB_TOKEN,
+        max_concurrency: int = settings.GITHUB_MAX_CONCURRENCY,
+        max_retries: int = settings.GITHUB_MAX_RETRIES,
+        backoff_factor: float = 0.5,
+        redis_client: Optional[redis.Redis] = None,
+    ):
         self.token = token
         self.headers = {"Authorization": f"token {self.token}"}
         self.api_url = "https://api.github.com"
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+
+        # One keep-alive pool shared by every request, sized for the fan-out
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max_concurrency)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        # Conditional requests and the shared rate limit need Redis; without it
+        # (e.g. in the telemetry script) the client talks to GitHub directly.
+        self.response_cache = ResponseCache(redis_client, token) if redis_client else None
+        self.rate_limiter = RateLimiter(redis_client, token) if redis_client else None
+
+    def _get(
+        self,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, str]] = None,
+        stream: bool = False,
+        cache: bool = False,
+    ) -> requests.Response:
+        """
+        Performs a GET through the pooled session, retrying 5xx responses,
+        secondary rate limits and connection errors with exponential backoff.
+        With cache=True the request is made conditional on the cached ETag /
+        Last-Modified, and a 304 is answered from the cache.
+        """
+        headers = dict(headers or {})
+        accept = headers.get("Accept")
+        endpoint = github_endpoint(url)
+        cached = None
+        if cache and self.response_cache:
+            cached = self.response_cache.get(url, params, accept)
+            headers.update(self.response_cache.conditional_headers(cached))
+
+        for attempt in range(self.max_retries + 1):
+            if self.rate_limiter:
+                self.rate_limiter.acquire()
+            try:
+                response = self.session.get(url, params=params, headers=headers, stream=stream)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(self._backoff(attempt))
+                continue
+
+            if self.rate_limiter:
+                self.rate_limiter.update(response.headers)
+            GITHUB_REQUESTS.labels(endpoint, str(response.status_code)).inc()
+
+            if response.status_code == 304 and cached:
+                CACHE_LOOKUPS.labels("github", "hit").inc()
+                self.response_cache.touch(url, params, accept)
+                response.status_code = 200
+                response._content = cached[b"body"]
+                if cached.get(b"link") and "Link" not in response.headers:
+                    response.headers["Link"] = cached[b"link"].decode('utf-8')
+                response.from_cache = True
+                return response
+
+            delay = self._retry_delay(response, attempt)
+            if delay is None or attempt == self.max_retries:
+                response.raise_for_status()
+                response.from_cache = False
+                if stream:
+                    response.raw.decode_content = True
+                    response.raw = _CountingReader(response.raw, endpoint)
+                else:
+                    GITHUB_BYTES.labels(endpoint).inc(len(response.content))
+                if cache and self.response_cache:
+                    CACHE_LOOKUPS.labels("github", "miss").inc()
+                    self.response_cache.set(url, params, accept, response.headers, response.content)
+                return response
+
+            response.close()
+            time.sleep(delay)
+
+    def _backoff(self, attempt: int) -> float:
+        return min(self.backoff_factor * (2 ** attempt), MAX_RETRY_DELAY)
+
+    def _retry_delay(self, response: requests.Response, attempt: int) -> Optional[float]:
+        return retry_delay(response, self._backoff(attempt))
+
+    def _map(self, func, items: Iterable) -> Iterator[Tuple[Any, Any, Optional[Exception]]]:
+        """
+        Runs func over items on at most max_concurrency threads and yields
+        (item, result, error) tuples as they complete. Only about twice
+        max_concurrency calls are submitted ahead of the caller, and results
+        are dropped once yielded, so a slow consumer bounds the memory held.
+        """
+        executor = ThreadPoolExecutor(max_workers=self.max_concurrency)
+        pending = iter(items)
+        futures = {}
+        try:
+            for item in itertools.islice(pending, 2 * self.max_concurrency):
+                futures[executor.submit(func, item)] = item
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    item = futures.pop(future)
+                    for refill in itertools.islice(pending, 1):
+                        futures[executor.submit(func, refill)] = refill
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        yield item, None, e
+                    else:
+                        yield item, result, None
+        finally:
+            # Drops the queued calls when the caller stops early, e.g. on an error
+            executor.shutdown(wait=True, cancel_futures=True)
 
     def get_repo(self, owner: str, repo: str) -> Dict[str, Any]:
         """
         Retrieves repository information.
         """
         url = f"{self.api_url}/repos/{owner}/{repo}"
-        response = requests.get(url, headers=self.headers)
-        response.raise_for_status()
+        response = self._get(url, cache=True)
         return response.json()
 
+    def get_pages(self, url: str, params: Dict[str, Any], first: int, last: int) -> List[List[Dict[str, Any]]]:
+        """
+        Fetches pages first..last of a paginated endpoint concurrently and
+        returns them in page order.
+        """
+        def fetch(page: int) -> List[Dict[str, Any]]:
+            return self._get(url, params={**params, "page": page}, cache=True).json()
+
+        pages = {}
+        for page, data, error in self._map(fetch, range(first, last + 1)):
+            if error:
+                raise error
+            pages[page] = data
+        return [pages[page] for page in sorted(pages)]
+
+    def _get_paginated(self, url: str, params: Dict[str, Any], max_chunks: int) -> List[Dict[str, Any]]:
+        """
+        Fetches the first page, reads the last page number from the Link header
+        and fans out over the remaining pages up to max_chunks.
+        """
+        response = self._get(url, params={**params, "page": 1}, cache=True)
+        items = response.json()
+        last_url = response.links.get("last", {}).get("url")
+        if not items or not last_url:
+            return items
+
+        last_page = int(parse_qs(urlparse(last_url).query)["page"][0])
+        for data in self.get_pages(url, params, 2, min(last_page, max_chunks)):
+            items.extend(data)
+        return items
+
     def get_commits(self, owner: str, repo: str, per_page: int = 100, max_chunks: int = 10) -> List[Dict[str, Any]]:
         """
         Fetches commits for a repository with pagination.
         """
         url = f"{self.api_url}/repos/{owner}/{repo}/commits"
-        commits = []
-        for page in range(1, max_chunks + 1):
-            params = {"per_page": per_page, "page": page}
-            response = requests.get(url, headers=self.headers, params=params)
-            response.raise_for_status()
-            data = response.json()
-            if not data:
-                break
-            commits.extend(data)
-        return commits
+        return self._get_paginated(url, {"per_page": per_page}, max_chunks)
 
     def get_pull_requests(self, owner: str, repo: str, per_page: int = 100, max_chunks: int = 4) -> List[Dict[str, Any]]:
         """
         Fetches pull requests for a repository with pagination.
         """
         url = f"{self.api_url}/repos/{owner}/{repo}/pulls"
-        pull_requests = []
-        for page in range(1, max_chunks + 1):
-            params = {"per_page": per_page, "page": page, "state": "all"}
-            response = requests.get(url, headers=self.headers, params=params)
-            response.raise_for_status()
-            data = response.json()
-            if not data:
-                break
-            pull_requests.extend(data)
-        return pull_requests
+        return self._get_paginated(url, {"per_page": per_page, "state": "all"}, max_chunks)
 
-    def get_file_tree(self, owner: str, repo: str) -> List[Dict[str, Any]]:
+    def get_head(self, owner: str, repo: str) -> Dict[str, str]:
         """
-        Fetches the file tree for a repository's default branch.
+        Resolves the default branch to its current commit and root tree SHAs.
         """
         repo_info = self.get_repo(owner, repo)
         default_branch = repo_info.get("default_branch", "main")
-        url = f"{self.api_url}/repos/{owner}/{repo}/git/trees/{default_branch}?recursive=1"
-        response = requests.get(url, headers=self.headers)
-        response.raise_for_status()
+        url = f"{self.api_url}/repos/{owner}/{repo}/branches/{default_branch}"
+        commit = self._get(url, cache=True).json()["commit"]
+        return {
+            "branch": default_branch,
+            "commit_sha": commit["sha"],
+            "tree_sha": commit["commit"]["tree"]["sha"],
+        }
+
+    def get_file_tree(self, owner: str, repo: str, ref: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Fetches the file tree for a branch, commit or tree SHA, defaulting to the
+        repository's default branch.
+        """
+        if ref is None:
+            repo_info = self.get_repo(owner, repo)
+            ref = repo_info.get("default_branch", "main")
+        url = f"{self.api_url}/repos/{owner}/{repo}/git/trees/{ref}"
+        response = self._get(url, params={"recursive": 1}, cache=True)
         data = response.json()
         return data.get("tree", [])
 
-    def get_file_content(self, owner: str, repo: str, file_path: str) -> str:
+    def get_file_content(self, owner: str, repo: str, file_path: str, ref: Optional[str] = None) -> str:
         """
         Fetches the raw content of a specific file from the repository.
         """
         url = f"{self.api_url}/repos/{owner}/{repo}/contents/{file_path}"
-        headers = self.headers.copy()
-        headers["Accept"] = "application/vnd.github.raw" # Request raw content
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
+        headers = {"Accept": "application/vnd.github.raw"} # Request raw content
+        params = {"ref": ref} if ref else None
+        response = self._get(url, headers=headers, params=params)
         return response.text
 
-github_client = GitHubClient()
\ No newline at end of file
+    def iter_file_contents(self, owner: str, repo: str, file_paths: Iterable[str], ref: Optional[str] = None) -> Iterator[Tuple[str, Optional[str]]]:
+        """
+        Fetches many files concurrently and yields (path, content) as each one
+        arrives. Content is None for files that could not be fetched (missing,
+        too large, blocked); anything that stops the whole fetch, such as an
+        exhausted rate limit, is raised.
+        """
+        fetch = lambda path: self.get_file_content(owner, repo, path, ref)
+        for path, content, error in self._map(fetch, file_paths):
+            if error:
+                if not _is_file_error(error):
+                    raise error
+                print(f"Error fetching {path}: {error}")
+            yield path, content
+
+    def get_archive_stream(self, owner: str, repo: str, ref: str = None):
+        """
+        Opens a streaming download of the repository tarball for the given ref
+        (the default branch if omitted). The caller is responsible for closing it.
+        """
+        url = f"{self.api_url}/repos/{owner}/{repo}/tarball"
+        if ref:
+            url = f"{url}/{ref}"
+        return self._get(url, stream=True)
+
+def _is_file_error(error: Exception) -> bool:
+    """
+    Whether a failed contents request concerns only that file, rather than
+    the quota, the credentials or the connection every other request shares.
+    """
+    if not isinstance(error, requests.HTTPError) or error.response is None:
+        return False
+    response = error.response
+    if response.status_code == 403:
+        # Rate limits that outlasted the retries also come back as 403
+        return "retry-after" not in response.headers and response.headers.get("x-ratelimit-remaining") != "0"
+    return response.status_code in (404, 410, 451)
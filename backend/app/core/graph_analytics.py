@@ -0,0 +1,233 @@
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse import csgraph
+
+from app.config import settings
+
+class GraphAnalytics:
+    """
+    Structural metrics of the dependency graph, computed on a CSR adjacency
+    matrix (A[i, j] = 1 when file i imports file j) so every pass is a sparse
+    matrix-vector product rather than a Python loop over edges.
+    """
+    def __init__(self, node_ids: Iterable[str], edges: List[Dict[str, str]]):
+        self.nodes = list(node_ids)
+        self.index = {node: i for i, node in enumerate(self.nodes)}
+        sources = np.fromiter((self.index[edge['source']] for edge in edges), dtype=np.int32, count=len(edges))
+        targets = np.fromiter((self.index[edge['target']] for edge in edges), dtype=np.int32, count=len(edges))
+        self._set_edges(sources, targets)
+
+    @classmethod
+    def from_edges(cls, node_ids: Iterable[str], sources: Iterable[int], targets: Iterable[int]) -> "GraphAnalytics":
+        """
+        Same as the constructor, with the edges as arrays of positions in
+        node_ids (GraphBuilder.sources and .targets).
+        """
+        analytics = cls.__new__(cls)
+        analytics.nodes = list(node_ids)
+        analytics.index = {node: i for i, node in enumerate(analytics.nodes)}
+        analytics._set_edges(np.asarray(sources, dtype=np.int32), np.asarray(targets, dtype=np.int32))
+        return analytics
+
+    def _set_edges(self, sources: np.ndarray, targets: np.ndarray):
+        n = len(self.nodes)
+        self.adjacency = sparse.csr_matrix(
+            (np.ones(len(sources), dtype=np.float64), (sources, targets)), shape=(n, n),
+        )
+        # Edges are de-duplicated by GraphBuilder; clamp in case they are not
+        self.adjacency.data[:] = 1.0
+
+    def degrees(self):
+        """
+        Returns (in-degree, out-degree): how many files import each file, and
+        how many files each file imports.
+        """
+        in_degree = np.asarray(self.adjacency.sum(axis=0)).ravel().astype(np.int64)
+        out_degree = np.asarray(self.adjacency.sum(axis=1)).ravel().astype(np.int64)
+        return in_degree, out_degree
+
+    def pagerank(self, damping: float = 0.85, tol: float = 1e-8, max_iter: int = 100) -> np.ndarray:
+        """
+        PageRank by power iteration. Rank flows from importers to the files
+        they import, so widely (and transitively) imported files score high.
+        Files importing nothing spread their rank evenly.
+        """
+        n = self.adjacency.shape[0]
+        if n == 0:
+            return np.zeros(0)
+        out_degree = np.asarray(self.adjacency.sum(axis=1)).ravel()
+        dangling = out_degree == 0
+        inv_out = np.divide(1.0, out_degree, out=np.zeros(n), where=~dangling)
+        transposed = self.adjacency.T.tocsr()
+
+        rank = np.full(n, 1.0 / n)
+        for _ in range(max_iter):
+            spread = damping * rank[dangling].sum() / n + (1.0 - damping) / n
+            updated = damping * (transposed @ (rank * inv_out)) + spread
+            if np.abs(updated - rank).sum() < tol:
+                return updated
+            rank = updated
+        return rank
+
+    def betweenness(self, samples: int = settings.GRAPH_BETWEENNESS_SAMPLES, batch: int = 32, seed: int = 0) -> np.ndarray:
+        """
+        Approximate betweenness centrality (Brandes' algorithm from `samples`
+        randomly chosen source files, exact when the graph has fewer files).
+        Sources are processed in batches; each BFS level is one sparse product
+        over that level's files only, so a batch costs O(edges) however deep
+        the graph is. Normalized to [0, 1]. The fixed seed keeps repeated
+        analyses of the same graph identical.
+        """
+        n = self.adjacency.shape[0]
+        if n < 3:
+            return np.zeros(n)
+        rng = np.random.default_rng(seed)
+        pivots = np.arange(n) if n <= samples else np.sort(rng.choice(n, size=samples, replace=False))
+        transposed = self.adjacency.T.tocsr()
+
+        centrality = np.zeros(n)
+        for start in range(0, len(pivots), batch):
+            chunk = pivots[start:start + batch]
+            width = len(chunk)
+            # (file, source) state, indexed flat as file * width + source
+            dist = np.full(n * width, -1, dtype=np.int32)
+            sigma = np.zeros(n * width)
+            delta = np.zeros(n * width)
+            entries = chunk * width + np.arange(width)
+            dist[entries] = 0
+            sigma[entries] = 1.0
+
+            # Forward: count shortest paths level by level
+            levels = [entries]
+            while len(entries):
+                reached, paths = propagate(transposed, entries, sigma[entries], width)
+                new = dist[reached] < 0
+                entries = reached[new]
+                dist[entries] = len(levels)
+                sigma[entries] = paths[new]
+                levels.append(entries)
+
+            # Backward: accumulate dependencies from the deepest level up
+            for depth in range(len(levels) - 2, 1, -1):
+                entries = levels[depth]
+                pulled, share = propagate(self.adjacency, entries, (1.0 + delta[entries]) / sigma[entries], width)
+                parents = dist[pulled] == depth - 1
+                pulled = pulled[parents]
+                delta[pulled] += sigma[pulled] * share[parents]
+
+            # Sources accumulate nothing for themselves
+            delta[levels[0]] = 0.0
+            centrality += delta.reshape(n, width).sum(axis=1)
+
+        centrality *= n / len(pivots)
+        return centrality / ((n - 1) * (n - 2))
+
+    def components(self):
+        """
+        Returns (component count, label per file) of the strongly connected
+        components. A component of more than one file is an import cycle.
+        """
+        return csgraph.connected_components(self.adjacency, directed=True, connection='strong')
+
+    def cycles(self, labels: np.ndarray) -> List[List[str]]:
+        """
+        The import cycles, largest first.
+        """
+        sizes = np.bincount(labels)
+        cyclic = np.flatnonzero(sizes > 1)
+        cyclic = cyclic[np.argsort(-sizes[cyclic], kind='stable')]
+        return [[self.nodes[i] for i in np.flatnonzero(labels == label)] for label in cyclic]
+
+    def layers(self, count: int, labels: np.ndarray) -> np.ndarray:
+        """
+        Topological layer of every file: 0 for files importing nothing, else
+        one more than the highest layer among their imports. Files of a cycle
+        are collapsed into one node first, so they share a layer.
+        """
+        n = len(labels)
+        if n == 0:
+            return np.zeros(0, dtype=np.int64)
+        membership = sparse.csr_matrix((np.ones(n), (np.arange(n), labels)), shape=(n, count))
+        condensed = (membership.T @ self.adjacency @ membership).tocsr()
+        condensed.setdiag(0)
+        condensed.eliminate_zeros()
+        condensed.data[:] = 1.0
+
+        remaining = np.asarray(condensed.sum(axis=1)).ravel().astype(np.int64)
+        importers = condensed.T.tocsr()
+        layer = np.full(count, -1, dtype=np.int64)
+        level = 0
+        frontier = np.flatnonzero(remaining == 0)
+        while len(frontier):
+            layer[frontier] = level
+            # Each importer of this layer has that many fewer imports left
+            touched = importers[frontier].indices
+            np.subtract.at(remaining, touched, 1)
+            touched = np.unique(touched)
+            frontier = touched[remaining[touched] == 0]
+            level += 1
+        return layer[labels]
+
+    def analyze(self) -> Dict[str, Any]:
+        """
+        Runs every metric. Returns per-file values keyed by path, the import
+        cycles, and a summary of the whole graph.
+        """
+        in_degree, out_degree = self.degrees()
+        pagerank = self.pagerank()
+        betweenness = self.betweenness()
+        count, labels = self.components()
+        layers = self.layers(count, labels)
+        cycles = self.cycles(labels)
+
+        files = {
+            node: {
+                "in_degree": int(in_degree[i]),
+                "out_degree": int(out_degree[i]),
+                "pagerank": round(float(pagerank[i]), 8),
+                "betweenness": round(float(betweenness[i]), 8),
+                "layer": int(layers[i]),
+            }
+            for i, node in enumerate(self.nodes)
+        }
+        return {
+            "files": files,
+            "cycles": cycles,
+            "summary": {
+                "nodes": len(self.nodes),
+                "edges": int(self.adjacency.nnz),
+                "cycles": len(cycles),
+                "largest_cycle": len(cycles[0]) if cycles else 0,
+                "layers": int(layers.max()) + 1 if len(layers) else 0,
+            },
+        }
+
+def propagate(matrix: sparse.csr_matrix, entries: np.ndarray, values: np.ndarray, width: int):
+    """
+    Multiplies `matrix` by the (n x width) block holding `values` at the flat
+    indices `entries` and returns the product's non-zero entries as (flat
+    indices, values). Wide blocks go through a dense product, which is much
+    faster than sparse x sparse once a sizeable share of the files is in it.
+    """
+    n = matrix.shape[0]
+    if len(entries) * 16 > n * width:
+        block = np.zeros(n * width)
+        block[entries] = values
+        product = (matrix @ block.reshape(n, width)).ravel()
+        found = np.flatnonzero(product)
+        return found, product[found]
+    block = sparse.csr_matrix((values, (entries // width, entries % width)), shape=(n, width))
+    product = (matrix @ block).tocoo()
+    return product.row.astype(np.int64) * width + product.col, product.data
+
+def centrality_scores(files: Dict[str, Dict[str, Any]]) -> Optional[Dict[str, float]]:
+    """
+    Relative centrality of each file from its analytics: PageRank scaled so
+    the average file scores 1.0. None for an empty graph.
+    """
+    if not files:
+        return None
+    n = len(files)
+    return {path: values["pagerank"] * n for path, values in files.items()}
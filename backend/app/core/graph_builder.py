@@ -1,5 +1,15 @@
 import os
-from typing import List, Dict, Any
+from array import array
+from collections import Counter
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from app.config import settings
+from .communities import Louvain
+from .compact_graph import CompactGraph
+from .graph_analytics import GraphAnalytics
 
 IGNORE_DIRS = [
     'node_modules/',
@@ -19,13 +29,93 @@ IGNORE_FILES = [
 ]
 
 class GraphBuilder:
+    """
+    Collects the dependency graph of a file tree. Paths are interned: files
+    are numbered in tree order (node_ids maps each path to its number) and
+    edges are kept as two int32 arrays of those numbers, so a large graph
+    costs a few bytes per edge rather than a dict per edge. Duplicate edges
+    are dropped in bulk, whenever the arrays have doubled and when they are
+    read, instead of checking every edge against a set.
+    """
     def __init__(self, file_tree: List[Dict[str, Any]], churn_data: Dict[str, int], dependencies: List[Dict[str, str]]):
         self.file_tree = file_tree
         self.churn_data = churn_data
-        self.dependencies = dependencies
         self.nodes = []
-        self.edges = []
         self.clusters = {}
+        self.community_stats = {}
+        # Cluster name of each clustered file; the others are grouped by directory
+        self.group_of: Dict[str, str] = {}
+        paths = [item['path'] for item in file_tree if item['type'] == 'blob' and not self._is_ignored(item['path'])]
+        # Ordered like the tree, with constant-time membership checks
+        self.node_ids = {path: i for i, path in enumerate(dict.fromkeys(paths))}
+        self._sources = array('i')
+        self._targets = array('i')
+        # Number of leading edges known to be distinct
+        self._distinct = 0
+        # Imports of each file that resolved to no file in the tree, kept with
+        # the result so a refresh can re-resolve just those against new
+        # files; None when they are not known for every file
+        self.unresolved: Optional[Dict[str, List[str]]] = {}
+        self.add_dependencies(dependencies)
+
+    def add_dependencies(self, dependencies: List[Dict[str, str]]):
+        """
+        Adds dependency edges between known files, skipping duplicates and
+        files importing themselves (`from . import x` in an __init__.py). Can
+        be called repeatedly while dependencies are still being resolved.
+        """
+        for dep in dependencies:
+            source = self.node_ids.get(dep['source'])
+            target = self.node_ids.get(dep['target'])
+            if source is not None and target is not None and source != target:
+                self._sources.append(source)
+                self._targets.append(target)
+        if len(self._sources) > 2 * self._distinct + 65536:
+            self._drop_duplicate_edges()
+
+    def set_unresolved(self, file_path: str, imports: List[str]):
+        """
+        Records the imports of file_path that did not resolve (replacing any
+        recorded before).
+        """
+        if self.unresolved is None or file_path not in self.node_ids:
+            return
+        if imports:
+            self.unresolved[file_path] = imports
+        else:
+            self.unresolved.pop(file_path, None)
+
+    def _drop_duplicate_edges(self):
+        """
+        Keeps the first occurrence of every edge, in order.
+        """
+        if self._distinct == len(self._sources):
+            return
+        sources = np.frombuffer(self._sources, dtype=np.int32)
+        targets = np.frombuffer(self._targets, dtype=np.int32)
+        keys = sources.astype(np.int64) * len(self.node_ids) + targets
+        first = np.sort(np.unique(keys, return_index=True)[1])
+        # Copies, so the views above release the old arrays
+        self._sources = array('i', sources[first].tobytes())
+        self._targets = array('i', targets[first].tobytes())
+        self._distinct = len(first)
+
+    def edge_arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        The distinct edges as (sources, targets) arrays of positions in
+        node_ids, in the order they were added.
+        """
+        self._drop_duplicate_edges()
+        return np.array(self._sources, dtype=np.int32), np.array(self._targets, dtype=np.int32)
+
+    @property
+    def edges(self) -> List[Dict[str, str]]:
+        """
+        The edges as {"source", "target"} dicts of paths.
+        """
+        paths = list(self.node_ids)
+        sources, targets = self.edge_arrays()
+        return [{"source": paths[source], "target": paths[target]} for source, target in zip(sources.tolist(), targets.tolist())]
 
     def _is_ignored(self, path: str) -> bool:
         if any(path.startswith(d) for d in IGNORE_DIRS):
@@ -39,44 +129,86 @@ class GraphBuilder:
         Builds a dependency graph from the file tree, churn data, and dependencies.
         Nodes represent files, and edges represent dependencies between files.
         """
-        files = [item for item in self.file_tree if item['type'] == 'blob' and not self._is_ignored(item['path'])]
-        node_ids = {item['path'] for item in files}
-
         # Create nodes for all files
-        for file_path in node_ids:
+        self.nodes = []
+        for file_path in self.node_ids:
             churn = self.churn_data.get(file_path, 0)
             self.nodes.append({
                 "id": file_path,
-                "group": os.path.dirname(file_path),
+                "group": self.group_of.get(file_path, os.path.dirname(file_path)),
                 "size": churn,  # Use churn to determine node size
             })
 
-        # Create edges based on dependencies
-        for dep in self.dependencies:
-            source = dep['source']
-            target = dep['target']
-            if source in node_ids and target in node_ids:
-                self.edges.append({
-                    "source": source,
-                    "target": target,
-                })
-
         return {"nodes": self.nodes, "links": self.edges}
 
-    def generate_clusters(self, min_size: int = 3, max_depth: int = 3) -> Dict[str, List[str]]:
+    def compact_graph(self) -> CompactGraph:
+        """
+        The graph build_synapse_graph() returns, interned (see CompactGraph).
+        """
+        return CompactGraph.build(self.node_ids, self.group_of, self.churn_data, *self.edge_arrays())
+
+    def adjacency(self) -> sparse.csr_matrix:
         """
-        Generates clusters of files based on their parent directory, with filtering.
+        The adjacency matrix over node_ids (A[i, j] = 1 when file i imports
+        file j), as GraphAnalytics.adjacency.
         """
+        return GraphAnalytics.from_edges(self.node_ids, *self.edge_arrays()).adjacency
+
+    def generate_clusters(
+        self,
+        adjacency: Optional[sparse.csr_matrix] = None,
+        min_size: int = 3,
+        seed_directories: bool = settings.CLUSTER_SEED_DIRECTORIES,
+        resolution: float = settings.CLUSTER_RESOLUTION,
+        seed: int = 0,
+    ) -> Dict[str, List[str]]:
+        """
+        Generates clusters of files from the import graph with Louvain
+        community detection. Starting from the directory layout can only merge
+        directories, never split one, so with seed_directories a run from the
+        directories is only a tie-break: it is kept when its modularity is at
+        least that of a run from single files. Each cluster is named after the directory most of its files live in,
+        and the graph nodes of a cluster take its name as their group.
+        Clusters smaller than min_size are left out. `adjacency` is the graph's
+        adjacency matrix over node_ids, if already built.
+        """
+        if adjacency is None:
+            adjacency = self.adjacency()
+        paths = list(self.node_ids)
+        directories = [os.path.dirname(path) for path in paths]
+        louvain = Louvain(adjacency, resolution=resolution, seed=seed)
+        labels = louvain.run()
+        modularity = louvain.modularity(labels) if len(labels) else 0.0
+        seeded = False
+        if seed_directories and paths:
+            from_directories = louvain.run(np.unique(directories, return_inverse=True)[1])
+            if louvain.modularity(from_directories) >= modularity:
+                labels, modularity, seeded = from_directories, louvain.modularity(from_directories), True
+        members: Dict[int, List[int]] = {}
+        for i, label in enumerate(labels.tolist()):
+            members.setdefault(label, []).append(i)
+
+        self.clusters = {}
+        for files in sorted(members.values(), key=len, reverse=True):
+            if len(files) < min_size:
+                continue
+            home = Counter(directories[i] for i in files).most_common(1)[0][0] or "(root)"
+            name, suffix = home, 2
+            while name in self.clusters:
+                name, suffix = f"{home} ({suffix})", suffix + 1
+            self.clusters[name] = [paths[i] for i in files]
+
+        self.group_of = {path: name for name, files in self.clusters.items() for path in files}
         for node in self.nodes:
-            dir_name = os.path.dirname(node['id'])
-            if dir_name not in self.clusters:
-                self.clusters[dir_name] = []
-            self.clusters[dir_name].append(node['id'])
-        
-        filtered_clusters = {}
-        for dir_name, files in self.clusters.items():
-            depth = len(dir_name.split('/'))
-            if len(files) >= min_size and depth <= max_depth:
-                filtered_clusters[dir_name] = files
-        
-        return filtered_clusters
\ No newline at end of file
+            node["group"] = self.group_of.get(node["id"], node["group"])
+
+        self.community_stats = {
+            "algorithm": "louvain",
+            "resolution": resolution,
+            "seeded_from_directories": seeded,
+            "communities": int(labels.max()) + 1 if len(labels) else 0,
+            "clusters": len(self.clusters),
+            "modularity": round(modularity, 4),
+            "directory_modularity": round(louvain.modularity(np.unique(directories, return_inverse=True)[1]), 4) if paths else 0.0,
+        }
+        return self.clusters
@@ -0,0 +1,164 @@
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+from app.core.compact_graph import CompactGraph
+
+GRAPH_VIEWS = ("directory", "cluster")
+ROOT = ""
+UNCLUSTERED = "(unclustered)"
+
+class GraphHierarchy:
+    """
+    Precomputes a level-of-detail version of the dependency graph: files are
+    grouped in a tree (directories, or clusters), and every group keeps its
+    direct children with their file counts and summed churn, plus the edges
+    between those children with aggregated weights. A slice of the graph
+    (one group, expanded a few levels) can then be served by reading only
+    the groups it shows.
+
+    Every edge is stored once, at the lowest group containing both its files:
+    aggregated between that group's children, and as the two ancestor chains
+    below that group ("raw"), which is what expanding deeper levels needs.
+    """
+    def __init__(self, graph: Union[Dict[str, List], CompactGraph], clusters: Dict[str, List[str]]):
+        if isinstance(graph, CompactGraph):
+            self.sizes = graph.sizes()
+            self.links = graph.link_pairs()
+        else:
+            self.sizes = {node["id"]: node.get("size", 0) for node in graph["nodes"]}
+            self.links = [(link["source"], link["target"]) for link in graph["links"]]
+        self.clusters = clusters
+
+    def _chains(self, view: str) -> Dict[str, List[str]]:
+        """
+        The groups each file sits in, outermost first (the root excluded).
+        """
+        if view == "directory":
+            chains = {}
+            for path in self.sizes:
+                parts = path.split('/')[:-1]
+                chains[path] = ['/'.join(parts[:i + 1]) for i in range(len(parts))]
+            return chains
+        cluster_of = {path: name for name, files in self.clusters.items() for path in files}
+        return {path: [cluster_of.get(path, UNCLUSTERED)] for path in self.sizes}
+
+    def build(self, view: str) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns the view's groups keyed by group id ("" is the root).
+        """
+        chains = self._chains(view)
+        groups = {ROOT: _new_group(ROOT, ROOT, None, 0)}
+        for path, chain in chains.items():
+            parent = ROOT
+            for depth, group_id in enumerate(chain, start=1):
+                if group_id not in groups:
+                    name = group_id.rsplit('/', 1)[-1] if view == "directory" else group_id
+                    groups[group_id] = _new_group(group_id, name, parent, depth)
+                    groups[parent]["groups"][group_id] = None
+                parent = group_id
+            groups[parent]["files"].append([path, self.sizes[path]])
+            for group_id in [ROOT] + chain:
+                groups[group_id]["file_count"] += 1
+                groups[group_id]["churn"] += self.sizes[path]
+
+        for source_path, target_path in self.links:
+            # Self-imports (kept in graphs stored before they were dropped)
+            if source_path == target_path:
+                continue
+            source = chains[source_path] + [source_path]
+            target = chains[target_path] + [target_path]
+            shared = 0
+            while source[shared] == target[shared]:
+                shared += 1
+            group = groups[source[shared - 1] if shared else ROOT]
+            key = (source[shared], target[shared])
+            group["links"][key] = group["links"].get(key, 0) + 1
+            group["raw"].append([source[shared:], target[shared:]])
+
+        for group in groups.values():
+            group["groups"] = [
+                [child, groups[child]["name"], groups[child]["file_count"], groups[child]["churn"]]
+                for child in group["groups"]
+            ]
+            group["links"] = [[source, target, weight] for (source, target), weight in group["links"].items()]
+        return groups
+
+def build_views(graph: Union[Dict[str, List], CompactGraph], clusters: Dict[str, List[str]]) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """
+    Builds every view in GRAPH_VIEWS, as stored with an analysis.
+    """
+    hierarchy = GraphHierarchy(graph, clusters)
+    return {view: hierarchy.build(view) for view in GRAPH_VIEWS}
+
+def _new_group(group_id: str, name: str, parent: Optional[str], depth: int) -> Dict[str, Any]:
+    return {
+        "id": group_id,
+        "name": name,
+        "parent": parent,
+        "depth": depth,
+        "file_count": 0,
+        "churn": 0,
+        "groups": {},
+        "files": [],
+        "links": {},
+        "raw": [],
+    }
+
+async def graph_slice(
+    fetch_groups: Callable[[List[str]], Awaitable[List[Optional[Dict[str, Any]]]]],
+    fetch_raw: Callable[[List[str]], Awaitable[List[Optional[List]]]],
+    root: str = ROOT,
+    level: int = 1,
+) -> Optional[Dict[str, Any]]:
+    """
+    Assembles the part of a view below `root`, expanded `level` levels deep:
+    groups at the last level are returned collapsed, as super-nodes with
+    their file count and summed churn, and edges are aggregated onto the
+    visible nodes. Reads one batch of groups per level, plus the raw edges
+    of the groups whose edges have to be resolved deeper than their
+    children. Returns None if the root group does not exist.
+    """
+    (root_group,) = await fetch_groups([root])
+    if root_group is None:
+        return None
+
+    nodes: List[Dict[str, Any]] = []
+    expanded: List[Tuple[int, Dict[str, Any]]] = []
+    current = [root_group]
+    for depth in range(level):
+        expanded.extend((depth, group) for group in current)
+        below = []
+        for group in current:
+            for path, churn in group["files"]:
+                nodes.append({"id": path, "type": "file", "group": group["id"], "size": churn})
+            for child, name, file_count, churn in group["groups"]:
+                if depth + 1 == level:
+                    nodes.append({
+                        "id": child, "name": name, "type": "group", "group": group["id"],
+                        "size": churn, "files": file_count,
+                    })
+                else:
+                    below.append(child)
+        current = [group for group in (await fetch_groups(below) if below else []) if group is not None]
+
+    weights: Dict[Tuple[str, str], int] = {}
+    deep = [group["id"] for depth, group in expanded if depth + 1 < level]
+    raws = dict(zip(deep, await fetch_raw(deep))) if deep else {}
+    for depth, group in expanded:
+        if depth + 1 == level:
+            for source, target, weight in group["links"]:
+                weights[(source, target)] = weights.get((source, target), 0) + weight
+            continue
+        # Chains start at this group's children; pick the visible ancestor
+        visible = level - depth - 1
+        for source, target in raws.get(group["id"]) or []:
+            key = (source[min(visible, len(source) - 1)], target[min(visible, len(target) - 1)])
+            if key[0] != key[1]:
+                weights[key] = weights.get(key, 0) + 1
+
+    return {
+        "root": root,
+        "parent": root_group["parent"],
+        "level": level,
+        "nodes": nodes,
+        "links": [{"source": source, "target": target, "weight": weight} for (source, target), weight in weights.items()],
+    }
@@ -0,0 +1,235 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse import csgraph
+
+from app.core.graph_analytics import GraphAnalytics
+
+class GraphIndex:
+    """
+    Query index of a dependency graph, built once per analysis: the imports
+    and importers of every file as CSR arrays, the strongly connected
+    components, and reachability labels on the condensed (acyclic) graph.
+
+    The labels are GRAIL-style intervals: for a few randomized DFS
+    traversals of the condensed graph, each component gets its post-order
+    number and the smallest post-order number below it. A component can
+    only reach another whose interval it contains in every traversal and
+    whose level (longest import chain below it) is lower, which rules out
+    most unreachable pairs in O(1) and prunes traversals towards a target.
+    """
+    def __init__(
+        self,
+        files: List[str],
+        imports: Tuple[np.ndarray, np.ndarray],
+        importers: Tuple[np.ndarray, np.ndarray],
+        component: np.ndarray,
+        level: np.ndarray,
+        low: np.ndarray,
+        post: np.ndarray,
+    ):
+        self.files = files
+        self.index = {path: i for i, path in enumerate(files)}
+        self.imports = imports
+        self.importers = importers
+        self.component = component
+        self.level = level
+        self.low = low
+        self.post = post
+
+    @classmethod
+    def build(cls, files: Sequence[str], adjacency: sparse.csr_matrix, labelings: int = 2, seed: int = 0) -> "GraphIndex":
+        """
+        Indexes the graph with adjacency A[i, j] = 1 when files[i] imports
+        files[j] (GraphAnalytics.adjacency).
+        """
+        n = len(files)
+        forward = adjacency.tocsr()
+        backward = forward.T.tocsr()
+        count, component = csgraph.connected_components(forward, directed=True, connection='strong')
+        membership = sparse.csr_matrix((np.ones(n), (np.arange(n), component)), shape=(n, count))
+        condensed = (membership.T @ forward @ membership).tocsr()
+        condensed.setdiag(0)
+        condensed.eliminate_zeros()
+
+        rng = np.random.default_rng(seed)
+        level = np.zeros(count, dtype=np.int32)
+        low = np.zeros((labelings, count), dtype=np.int32)
+        post = np.zeros((labelings, count), dtype=np.int32)
+        for k in range(labelings):
+            low[k], post[k], levels = _interval_labels(condensed, rng)
+            if k == 0:
+                level = levels
+        return cls(
+            list(files),
+            (forward.indptr.astype(np.int32), forward.indices.astype(np.int32)),
+            (backward.indptr.astype(np.int32), backward.indices.astype(np.int32)),
+            component.astype(np.int32), level, low, post,
+        )
+
+    @classmethod
+    def from_graph(cls, graph: Dict[str, List]) -> "GraphIndex":
+        """
+        Indexes a stored graph ({"nodes", "links"}).
+        """
+        files = [node["id"] for node in graph["nodes"]]
+        return cls.build(files, GraphAnalytics(files, graph["links"]).adjacency)
+
+    def dump(self) -> Dict[str, Any]:
+        """
+        The index as plain values (arrays as int32 bytes), for storage.
+        """
+        return {
+            "files": self.files,
+            "imports": [self.imports[0].tobytes(), self.imports[1].tobytes()],
+            "importers": [self.importers[0].tobytes(), self.importers[1].tobytes()],
+            "component": self.component.tobytes(),
+            "level": self.level.tobytes(),
+            "labelings": len(self.low),
+            "low": self.low.tobytes(),
+            "post": self.post.tobytes(),
+        }
+
+    @classmethod
+    def load(cls, data: Dict[str, Any]) -> "GraphIndex":
+        def array(raw: bytes) -> np.ndarray:
+            return np.frombuffer(raw, dtype=np.int32)
+        labelings = data["labelings"]
+        return cls(
+            data["files"],
+            (array(data["imports"][0]), array(data["imports"][1])),
+            (array(data["importers"][0]), array(data["importers"][1])),
+            array(data["component"]),
+            array(data["level"]),
+            array(data["low"]).reshape(labelings, -1),
+            array(data["post"]).reshape(labelings, -1),
+        )
+
+    def can_reach(self, sources: np.ndarray, target: int) -> np.ndarray:
+        """
+        For each source component, False if it certainly cannot reach the
+        target component (True means it may).
+        """
+        possible = self.level[sources] > self.level[target]
+        for k in range(len(self.low)):
+            possible &= (self.low[k][sources] <= self.low[k][target]) & (self.post[k][target] <= self.post[k][sources])
+        return possible | (sources == target)
+
+    def traverse(self, path: str, dependents: bool, depth: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Breadth-first walk from a file over importers (dependents=True: what
+        is affected by changing it) or imports (what it depends on), up to
+        `depth` steps. Returns the files reached and their distances.
+        """
+        indptr, indices = self.importers if dependents else self.imports
+        start = self.index[path]
+        distance = np.full(len(self.files), -1, dtype=np.int32)
+        distance[start] = 0
+        frontier = np.array([start], dtype=np.int32)
+        steps = 0
+        while len(frontier) and (depth is None or steps < depth):
+            _, reached = _expand(indptr, indices, frontier)
+            reached = np.unique(reached[distance[reached] < 0])
+            steps += 1
+            distance[reached] = steps
+            frontier = reached
+        found = np.flatnonzero(distance > 0)
+        return found, distance[found]
+
+    def shortest_path(self, source: str, target: str) -> Optional[List[str]]:
+        """
+        The shortest import chain from source to target (source imports ...
+        imports target), or None. Files whose component cannot reach the
+        target's are never expanded.
+        """
+        start, goal = self.index[source], self.index[target]
+        if start == goal:
+            return [source]
+        goal_component = self.component[goal]
+        if not self.can_reach(self.component[[start]], goal_component)[0]:
+            return None
+        indptr, indices = self.imports
+        parent = np.full(len(self.files), -1, dtype=np.int32)
+        parent[start] = start
+        frontier = np.array([start], dtype=np.int32)
+        while len(frontier) and parent[goal] < 0:
+            parents, reached = _expand(indptr, indices, frontier)
+            new = parent[reached] < 0
+            parents, reached = parents[new], reached[new]
+            reached, first = np.unique(reached, return_index=True)
+            parents = parents[first]
+            keep = self.can_reach(self.component[reached], goal_component)
+            reached, parents = reached[keep], parents[keep]
+            parent[reached] = parents
+            frontier = reached
+        if parent[goal] < 0:
+            return None
+        chain = [goal]
+        while chain[-1] != start:
+            chain.append(int(parent[chain[-1]]))
+        return [self.files[i] for i in reversed(chain)]
+
+    def cycle(self, path: str) -> List[str]:
+        """
+        The other files in an import cycle with `path`.
+        """
+        i = self.index[path]
+        members = np.flatnonzero(self.component == self.component[i])
+        return [self.files[j] for j in members if j != i]
+
+def _expand(indptr: np.ndarray, indices: np.ndarray, frontier: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Every edge leaving the frontier, as (from, to) arrays.
+    """
+    starts = indptr[frontier]
+    counts = indptr[frontier + 1] - starts
+    total = int(counts.sum())
+    if not total:
+        return frontier[:0], frontier[:0]
+    offsets = np.repeat(starts - (np.cumsum(counts) - counts), counts) + np.arange(total)
+    return np.repeat(frontier, counts), indices[offsets]
+
+def _interval_labels(dag: sparse.csr_matrix, rng: np.random.Generator):
+    """
+    One randomized DFS of a DAG from its sources. Returns per node the
+    smallest post-order number below it (itself included), its post-order
+    number, and its level (0 for nodes without out-edges).
+    """
+    count = dag.shape[0]
+    # Visit children in a random order; shuffling within rows via a sort key
+    rows = np.repeat(np.arange(count), np.diff(dag.indptr))
+    order = np.lexsort((rng.random(len(dag.indices)), rows))
+    indptr, indices = dag.indptr.tolist(), dag.indices[order].tolist()
+    roots = np.flatnonzero(np.diff(dag.tocsc().indptr) == 0)
+    roots = rng.permutation(roots).tolist()
+
+    low, post, level = [0] * count, [0] * count, [0] * count
+    visited = bytearray(count)
+    counter = 0
+    for root in roots:
+        visited[root] = 1
+        # Frames: node, next edge position, smallest post below, deepest level below
+        stack = [[root, indptr[root], count, -1]]
+        while stack:
+            frame = stack[-1]
+            node, position = frame[0], frame[1]
+            if position < indptr[node + 1]:
+                frame[1] = position + 1
+                child = indices[position]
+                if visited[child]:
+                    frame[2] = min(frame[2], low[child])
+                    frame[3] = max(frame[3], level[child])
+                else:
+                    visited[child] = 1
+                    stack.append([child, indptr[child], count, -1])
+                continue
+            stack.pop()
+            post[node] = counter
+            low[node] = min(frame[2], counter)
+            level[node] = frame[3] + 1
+            counter += 1
+            if stack:
+                stack[-1][2] = min(stack[-1][2], low[node])
+                stack[-1][3] = max(stack[-1][3], level[node])
+    return np.array(low, dtype=np.int32), np.array(post, dtype=np.int32), np.array(level, dtype=np.int32)
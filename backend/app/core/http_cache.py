@@ -0,0 +1,92 @@
+import hashlib
+from typing import Dict, Mapping, Optional
+import redis
+
+class ResponseCache:
+    """
+    Stores GitHub response bodies with their validators (ETag and
+    Last-Modified) so requests can be made conditional. A 304 answer is then
+    served from here and does not count against the rate limit.
+    """
+    KEY_PREFIX = "gh:cache:"
+
+    def __init__(self, redis_client: redis.Redis, scope: str, ttl: int = 86400):
+        self.redis_client = redis_client
+        # Responses can depend on the credentials, so keys are scoped per token
+        self.scope = hashlib.sha1(scope.encode('utf-8')).hexdigest()[:12]
+        self.ttl = ttl
+
+    def _key(self, url: str, params: Optional[Dict], accept: Optional[str]) -> str:
+        query = "&".join(f"{k}={v}" for k, v in sorted((params or {}).items()))
+        digest = hashlib.sha1(f"{url}?{query}|{accept or ''}".encode('utf-8')).hexdigest()
+        return f"{self.KEY_PREFIX}{self.scope}:{digest}"
+
+    def get(self, url: str, params: Optional[Dict] = None, accept: Optional[str] = None) -> Optional[Dict[bytes, bytes]]:
+        """
+        Returns the cached entry (etag, last_modified, link, body) for a request, if any.
+        """
+        entry = self.redis_client.hgetall(self._key(url, params, accept))
+        return entry or None
+
+    def conditional_headers(self, entry: Optional[Dict[bytes, bytes]]) -> Dict[str, str]:
+        headers = {}
+        if entry:
+            if entry.get(b"etag"):
+                headers["If-None-Match"] = entry[b"etag"].decode('utf-8')
+            if entry.get(b"last_modified"):
+                headers["If-Modified-Since"] = entry[b"last_modified"].decode('utf-8')
+        return headers
+
+    def set(self, url: str, params: Optional[Dict], accept: Optional[str], headers: Mapping[str, str], body: bytes):
+        """
+        Stores a 200 response body along with its validators and pagination links.
+        """
+        etag = headers.get("ETag")
+        last_modified = headers.get("Last-Modified")
+        if not etag and not last_modified:
+            return
+        key = self._key(url, params, accept)
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.delete(key)
+        pipe.hset(key, mapping={
+            "etag": etag or "",
+            "last_modified": last_modified or "",
+            "link": headers.get("Link", ""),
+            "body": body,
+        })
+        pipe.expire(key, self.ttl)
+        pipe.execute()
+
+    def touch(self, url: str, params: Optional[Dict] = None, accept: Optional[str] = None):
+        """
+        Extends the lifetime of an entry that was just revalidated.
+        """
+        self.redis_client.expire(self._key(url, params, accept), self.ttl)
+
+class AsyncResponseCache(ResponseCache):
+    """
+    ResponseCache over a redis.asyncio client, for the API's async GitHub client.
+    """
+    async def get(self, url: str, params: Optional[Dict] = None, accept: Optional[str] = None) -> Optional[Dict[bytes, bytes]]:
+        entry = await self.redis_client.hgetall(self._key(url, params, accept))
+        return entry or None
+
+    async def set(self, url: str, params: Optional[Dict], accept: Optional[str], headers: Mapping[str, str], body: bytes):
+        etag = headers.get("ETag")
+        last_modified = headers.get("Last-Modified")
+        if not etag and not last_modified:
+            return
+        key = self._key(url, params, accept)
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.delete(key)
+        pipe.hset(key, mapping={
+            "etag": etag or "",
+            "last_modified": last_modified or "",
+            "link": headers.get("Link", ""),
+            "body": body,
+        })
+        pipe.expire(key, self.ttl)
+        await pipe.execute()
+
+    async def touch(self, url: str, params: Optional[Dict] = None, accept: Optional[str] = None):
+        await self.redis_client.expire(self._key(url, params, accept), self.ttl)
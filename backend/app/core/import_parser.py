@@ -1,143 +1,405 @@
-import os
+import ast
 import re
-from typing import List, Dict, Any
-from .github_client import GitHubClient
+import tarfile
+import time
+from collections import deque
+from typing import List, Dict, Any, Callable, Deque, Iterable, Iterator, Optional, Set, Tuple
+
+import billiard
+from app.config import settings
+from .module_resolver import ModuleResolver
+from .parse_cache import ParseCache
+from .repo_source import RepositorySource
+
+PARSEABLE_EXTENSIONS = ('.py', '.js', '.jsx', '.ts', '.tsx')
+
+# `from x import y` / `import x, y` at the start of a line
+_PY_IMPORT = re.compile(r"^[ \t]*(?:from[ \t]+([.\w]+)[ \t]+import\b|import[ \t]+([.\w, \t]+))", re.M)
+# `import ... from 'x'` / `export ... from 'x'`, `import 'x'`, `import('x')` and `require('x')`
+_JS_IMPORT = re.compile(
+    r"""\b(?:import|export)\s+(?:type\s+)?[\w*{}\s,$]*?\s*from\s*['"]([^'"\n]+)['"]"""
+    r"""|\bimport\s*['"]([^'"\n]+)['"]"""
+    r"""|\b(?:import|require)\s*\(\s*['"]([^'"\n]+)['"]\s*\)"""
+)
+
+class _PoolExecutor:
+    """
+    The part of the Executor interface _ParseBatcher uses, over a billiard
+    pool. Celery's prefork workers are daemonic processes, which the stdlib's
+    ProcessPoolExecutor refuses to start children from; billiard, Celery's
+    fork of multiprocessing, does not.
+    """
+    def __init__(self, processes: int):
+        # Fetch threads may be running, so fork from a clean server process
+        self.pool = billiard.get_context("forkserver").Pool(processes)
+
+    def submit(self, fn: Callable, *args) -> "_PoolFuture":
+        return _PoolFuture(self.pool.apply_async(fn, args))
+
+    def shutdown(self, cancel_futures: bool = False):
+        if cancel_futures:
+            self.pool.terminate()
+        else:
+            self.pool.close()
+        self.pool.join()
+
+class _PoolFuture:
+    def __init__(self, result):
+        self._result = result
+
+    def done(self) -> bool:
+        return self._result.ready()
+
+    def result(self) -> Any:
+        return self._result.get()
+
+class _ParseBatcher:
+    """
+    Groups files into batches of roughly batch_bytes and parses each full
+    batch on the process pool while the caller keeps reading input. The pool
+    is only started once a first batch fills up, so small repositories are
+    parsed in-process without paying for worker start-up. At most
+    max_in_flight batches are queued on the pool at a time.
+    """
+    def __init__(self, executor_factory: Callable[[], Optional[_PoolExecutor]], batch_bytes: int, max_in_flight: int):
+        self.executor_factory = executor_factory
+        self.executor: Optional[_PoolExecutor] = None
+        self.batch_bytes = batch_bytes
+        self.max_in_flight = max_in_flight
+        self.batch: List[Tuple[str, str]] = []
+        self.batch_size = 0
+        self.futures: Deque[_PoolFuture] = deque()
+        self.parsed: Dict[str, List[str]] = {}
+        self.files = 0
+        self.bytes = 0
+
+    def add(self, file_path: str, content: str):
+        self.batch.append((file_path, content))
+        self.batch_size += len(content)
+        self.files += 1
+        self.bytes += len(content)
+        if self.batch_size >= self.batch_bytes:
+            if self.executor is None and self.executor_factory:
+                self.executor = self.executor_factory()
+                self.executor_factory = None
+            self.flush()
+
+    def flush(self):
+        if not self.batch:
+            return
+        if self.executor:
+            try:
+                self.futures.append(self.executor.submit(parse_batch, self.batch))
+            except (AssertionError, OSError, RuntimeError) as e:
+                print(f"WARNING: could not start the parse pool, parsing on a single core from now on: {e!r}")
+                self.executor = None
+        if not self.executor:
+            self.parsed.update(parse_batch(self.batch))
+        self.batch = []
+        self.batch_size = 0
+
+    def ready(self) -> Iterator[Tuple[str, List[str]]]:
+        """
+        Yields the results that are available without waiting, blocking only
+        when too many batches are in flight.
+        """
+        while self.futures and (self.futures[0].done() or len(self.futures) > self.max_in_flight):
+            yield from self.futures.popleft().result().items()
+        if self.parsed:
+            parsed, self.parsed = self.parsed, {}
+            yield from parsed.items()
+
+    def drain(self) -> Iterator[Tuple[str, List[str]]]:
+        self.flush()
+        while self.futures:
+            yield from self.futures.popleft().result().items()
+        yield from self.ready()
+
+    def close(self):
+        if self.executor:
+            self.executor.shutdown(cancel_futures=True)
 
 class ImportParser:
-    def __init__(self, github_client: GitHubClient):
+    def __init__(
+        self,
+        github_client: RepositorySource,
+        parse_cache: Optional[ParseCache] = None,
+        parse_workers: int = settings.PARSE_WORKERS,
+        batch_bytes: int = settings.PARSE_BATCH_BYTES,
+    ):
         self.github_client = github_client
+        self.parse_cache = parse_cache
+        self.parse_workers = parse_workers
+        self.batch_bytes = batch_bytes
+        self.stats = {"files": 0, "bytes": 0, "seconds": 0.0}
+
+    def throughput(self) -> Dict[str, float]:
+        """
+        Returns the fetch+parse throughput over all get_dependencies calls.
+        """
+        seconds = self.stats["seconds"]
+        return {
+            "files": self.stats["files"],
+            "megabytes": round(self.stats["bytes"] / 1e6, 3),
+            "seconds": round(seconds, 3),
+            "files_per_sec": round(self.stats["files"] / seconds, 1) if seconds else None,
+            "mb_per_sec": round(self.stats["bytes"] / 1e6 / seconds, 3) if seconds else None,
+        }
 
-    def get_dependencies(self, owner: str, repo: str, file_tree: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    def _open_executor(self) -> Optional[_PoolExecutor]:
+        if self.parse_workers <= 1:
+            return None
+        try:
+            return _PoolExecutor(self.parse_workers)
+        except (AssertionError, OSError, RuntimeError) as e:
+            print(f"WARNING: could not start the parse pool, parsing on a single core: {e!r}")
+            return None
+
+    def plan(
+        self, file_tree: List[Dict[str, Any]], only: Optional[Set[str]] = None
+    ) -> Tuple[Dict[str, List[str]], List[str], Dict[str, str]]:
+        """
+        Splits the parseable files of a tree (or of `only`) into those whose
+        imports are in the parse cache and those that still have to be fetched.
+        Returns (cached imports by path, pending paths, blob SHA by path).
+        """
+        files = [
+            item['path'] for item in file_tree
+            if item['type'] == 'blob' and self._is_parseable(item['path'])
+            and (only is None or item['path'] in only)
+        ]
+        blob_shas = {
+            item['path']: item['sha'] for item in file_tree
+            if item['type'] == 'blob' and item.get('sha') and self._is_parseable(item['path'])
+            and (only is None or item['path'] in only)
+        }
+        cached = self._get_cached_imports(blob_shas)
+        pending = [file_path for file_path in files if file_path not in cached]
+        return cached, pending, blob_shas
+
+    def iter_source(self, owner: str, repo: str, file_paths: List[str], source: str = "archive", ref: Optional[str] = None) -> Iterator[Tuple[str, Optional[str]]]:
+        """
+        Yields (path, content) for the given files as they are read, either from
+        the streamed archive or through concurrent contents API requests.
+        """
+        if source != "archive":
+            yield from self.github_client.iter_file_contents(owner, repo, file_paths, ref)
+            return
+
+        # The archive is streamed; nothing is written to disk, and entries that
+        # are not wanted are skipped without being extracted.
+        wanted = set(file_paths)
+        response = self.github_client.get_archive_stream(owner, repo, ref)
+        try:
+            with tarfile.open(fileobj=response.raw, mode="r|*") as archive:
+                for member in archive:
+                    if not member.isfile():
+                        continue
+                    # Archives prefix every entry with a top-level directory
+                    # (GitHub uses "<owner>-<repo>-<sha>/")
+                    file_path = member.name.split('/', 1)[-1]
+                    if file_path not in wanted:
+                        continue
+                    try:
+                        extracted = archive.extractfile(member)
+                        content = extracted.read().decode('utf-8', errors='replace')
+                    except Exception as e:
+                        print(f"Error reading {file_path} from the archive: {e}")
+                        continue
+                    yield file_path, content
+        finally:
+            response.close()
+
+    def iter_parsed(self, files: Iterable[Tuple[str, Optional[str]]]) -> Iterator[Tuple[str, List[str]]]:
+        """
+        Parses (path, content) pairs as they are produced, in byte-sized
+        batches on a process pool, yielding (path, imports) as batches finish.
+        Throughput is recorded in self.stats.
+        """
+        started = time.monotonic()
+        batcher = _ParseBatcher(self._open_executor, self.batch_bytes, max(self.parse_workers, 1) * 2)
+        try:
+            for file_path, content in files:
+                if content is not None:
+                    batcher.add(file_path, content)
+                    yield from batcher.ready()
+            yield from batcher.drain()
+        finally:
+            batcher.close()
+            self.stats["files"] += batcher.files
+            self.stats["bytes"] += batcher.bytes
+            self.stats["seconds"] += time.monotonic() - started
+
+    def store_parsed(self, parsed: Dict[str, List[str]], blob_shas: Dict[str, str]):
+        """
+        Adds freshly parsed files to the parse cache.
+        """
+        if self.parse_cache:
+            self.parse_cache.set_many({
+                blob_shas[file_path]: imports for file_path, imports in parsed.items() if file_path in blob_shas
+            })
+
+    def get_dependencies(
+        self,
+        owner: str,
+        repo: str,
+        file_tree: List[Dict[str, Any]],
+        source: str = "archive",
+        ref: Optional[str] = None,
+        only: Optional[Set[str]] = None,
+        fetch: bool = True,
+        resolver: Optional[ModuleResolver] = None,
+    ) -> List[Dict[str, str]]:
         """
         Parses the imports for each file in the file tree and returns a list of dependencies.
+        With source="archive" the repository tarball is streamed once; with source="api"
+        every file is fetched through the contents API. Files whose blob SHA is in the
+        parse cache are neither fetched nor parsed.
+        If `only` is given, just those files are parsed, but their imports are still
+        resolved against the whole tree. With fetch=False only cached files are resolved.
+        A resolver built by build_resolver() can be passed in to share it between calls.
         """
+        if resolver is None:
+            resolver = self.build_resolver(owner, repo, file_tree, ref)
+
+        parsed, pending, blob_shas = self.plan(file_tree, only)
+        if pending and fetch:
+            fresh = dict(self.iter_parsed(self.iter_source(owner, repo, pending, source, ref)))
+            parsed.update(fresh)
+            self.store_parsed(fresh, blob_shas)
+
         dependencies = []
-        files = [item['path'] for item in file_tree if item['type'] == 'blob']
-        file_set = set(files)
+        for file_path, imports in parsed.items():
+            dependencies.extend(self.resolve_dependencies(file_path, imports, resolver))
+        return dependencies
 
-        for file_path in files:
-            try:
-                content = self.github_client.get_file_content(owner, repo, file_path)
-                imports = self._parse_imports(file_path, content)
-                
-                for imp in imports:
-                    candidates = []
-                    
-                    if imp.startswith('.'):
-                        base_dir = os.path.dirname(file_path)
-                        resolved = os.path.normpath(os.path.join(base_dir, imp))
-                        candidates.append(resolved)
-                    elif imp.startswith('@/'):
-                        # Try common alias mappings
-                        candidates.append(imp.replace('@/', 'src/'))
-                        candidates.append(imp.replace('@/', 'frontend/src/'))
-                        candidates.append(imp.replace('@/', 'backend/src/'))
-                    else:
-                        candidates.append(imp)
-                    
-                    # Find the target file in the file tree
-                    target_file = None
-                    
-                    for candidate in candidates:
-                        possible_targets = [
-                            f"{candidate}.py",
-                            f"{candidate}.js",
-                            f"{candidate}.jsx",
-                            f"{candidate}.ts",
-                            f"{candidate}.tsx",
-                            f"{candidate}/__init__.py",
-                            f"{candidate}/index.js",
-                            f"{candidate}/index.ts",
-                            f"{candidate}/index.tsx",
-                            candidate # For direct matches (e.g., dir/file without extension)
-                        ]
-                        
-                        for target in possible_targets:
-                            if target in file_set:
-                                target_file = target
-                                break
-                        
-                        if target_file:
-                            break
-                    
-                    if target_file:
-                        dependencies.append({"source": file_path, "target": target_file})
-
-            except Exception as e:
-                print(f"Error parsing imports for {file_path}: {e}")
+    def build_resolver(self, owner: str, repo: str, file_tree: List[Dict[str, Any]], ref: Optional[str] = None) -> ModuleResolver:
+        """
+        Builds the module resolution index for a tree, fetching the
+        tsconfig/jsconfig/package.json files it reads aliases from.
+        """
+        config_paths = ModuleResolver.config_paths(file_tree)
+        config_contents = {}
+        if config_paths:
+            for file_path, content in self.github_client.iter_file_contents(owner, repo, config_paths, ref):
+                if content is not None:
+                    config_contents[file_path] = content
+        return ModuleResolver(file_tree, config_contents)
 
+    def _get_cached_imports(self, blob_shas: Dict[str, str]) -> Dict[str, List[str]]:
+        """
+        Looks up the import lists of the given files in the parse cache.
+        """
+        if not self.parse_cache or not blob_shas:
+            return {}
+        cached = self.parse_cache.get_many(blob_shas.values())
+        return {file_path: cached[sha] for file_path, sha in blob_shas.items() if sha in cached}
+
+    def _is_parseable(self, file_path: str) -> bool:
+        return file_path.endswith(PARSEABLE_EXTENSIONS)
+
+    def resolve_dependencies(
+        self, file_path: str, imports: List[str], resolver: ModuleResolver, unresolved: Optional[List[str]] = None,
+    ) -> List[Dict[str, str]]:
+        """
+        Resolves the parsed imports of a single file against the file tree.
+        Imports resolving to no file are appended to `unresolved`, if given.
+        """
+        dependencies = []
+        for imp in imports:
+            target_file = resolver.resolve(file_path, imp)
+            if target_file:
+                dependencies.append({"source": file_path, "target": target_file})
+            elif unresolved is not None:
+                unresolved.append(imp)
         return dependencies
 
     def _parse_imports(self, file_path: str, content: str) -> List[str]:
         """
         Parses the import statements from the content of a file.
         """
-        if file_path.endswith('.py'):
-            return self._parse_python_imports(content)
-        elif file_path.endswith(('.js', '.jsx', '.ts', '.tsx')):
-            return self._parse_js_imports(content)
-        return []
-
-    def _parse_python_imports(self, content: str) -> List[str]:
-        """
-        Parses imports from a Python file.
-        """
-        imports = []
-        # Improved regex for `from . import`, `from .module import`, `import .module`
-        regex = r"^\s*(?:from\s+([\.\w*]+)\s+import\s+([\w\s,()*]+)|import\s+([\.\w, ]+))"
-        for line in content.splitlines():
-            match = re.match(regex, line)
-            if match:
-                module = match.group(1) or match.group(3)
-                if module:
-                    # Handle multiple modules in one import statement
-                    # And handle relative imports correctly
-                    raw_modules = [m.strip() for m in module.split(',')]
-                    
-                    for m in raw_modules:
-                        if m.startswith('.'):
-                            # Count leading dots
-                            dots = 0
-                            for char in m:
-                                if char == '.':
-                                    dots += 1
-                                else:
-                                    break
-                            
-                            remainder = m[dots:]
-                            path_part = remainder.replace('.', '/')
-                            
-                            if dots == 1:
-                                normalized = f"./{path_part}"
-                            else:
-                                normalized = "../" * (dots - 1) + path_part
-                            
-                            # Clean up trailing slashes if import was just dots (e.g. "from . import")
-                            if normalized.endswith('/'):
-                                normalized = normalized.rstrip('/')
-                            
-                            imports.append(normalized)
-                        else:
-                            # Absolute import
-                            imports.append(m.replace('.', '/'))
-                            
-        return imports
-
-    def _parse_js_imports(self, content: str) -> List[str]:
-        """
-        Parses imports from a JavaScript/TypeScript file.
-        """
-        imports = []
-        # Regex for `import ... from '...'`, `import '...'`, and dynamic `import('...')`
-        regex = r"import\s+(?:(?:\*\s+as\s+\w+)|(?:\{[^}]+\})|\w+)\s+from\s+['\"]([^'\"]+)['\"]|import\s+['\"]([^'\"]+)['\"]|import\((['\"])(.*?)\3\)"
-        for match in re.finditer(regex, content):
-            module = match.group(1) or match.group(2) or match.group(4)
-            if module:
-                if module.startswith('@/'):
-                     # Basic alias handling: treat @/ as relative to a potential src directory
-                     # We can't know for sure without tsconfig, but we can return it as is
-                     # and let the resolver try to match it against 'src/' + remainder
-                     imports.append(module)
-                else:
-                    imports.append(module)
-        return imports
+        return parse_imports(file_path, content)
+
+def parse_imports(file_path: str, content: str) -> List[str]:
+    """
+    Parses the import statements from the content of a file.
+    """
+    if file_path.endswith('.py'):
+        return _parse_python_imports(content)
+    elif file_path.endswith(PARSEABLE_EXTENSIONS[1:]):
+        return _parse_js_imports(content)
+    return []
+
+def parse_batch(batch: List[Tuple[str, str]]) -> Dict[str, List[str]]:
+    """
+    Parses a batch of (path, content) pairs. Runs in the parse process pool.
+    """
+    parsed = {}
+    for file_path, content in batch:
+        try:
+            parsed[file_path] = parse_imports(file_path, content)
+        except Exception as e:
+            print(f"Error parsing imports for {file_path}: {e}")
+    return parsed
+
+def _python_module_path(level: int, module: Optional[str]) -> str:
+    """
+    Turns an import target into the path form the resolver expects:
+    "pkg/mod" for absolute imports, "./mod" or "../mod" for relative ones.
+    """
+    path_part = (module or '').replace('.', '/')
+    if level == 0:
+        return path_part
+    prefix = "./" if level == 1 else "../" * (level - 1)
+    return (prefix + path_part).rstrip('/') or '.'
+
+def _parse_python_imports(content: str) -> List[str]:
+    """
+    Parses imports from a Python file with the ast module. For `from x import y`
+    both x/y (in case y is a submodule) and x are returned. Files that do not
+    parse fall back to a line-based regex.
+    """
+    try:
+        tree = ast.parse(content)
+    except (SyntaxError, ValueError):
+        return _parse_python_imports_fallback(content)
+
+    imports = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            imports.extend(alias.name.replace('.', '/') for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            base = _python_module_path(node.level, node.module)
+            for alias in node.names:
+                if alias.name != '*':
+                    imports.append(f"{base}/{alias.name}" if base != '.' else f"./{alias.name}")
+            imports.append(base)
+    return list(dict.fromkeys(imports))
+
+def _parse_python_imports_fallback(content: str) -> List[str]:
+    """
+    Parses imports from a Python file line by line.
+    """
+    imports = []
+    for match in _PY_IMPORT.finditer(content):
+        module = match.group(1) or match.group(2)
+        # Handle multiple modules in one import statement
+        for m in (m.strip() for m in module.split(',')):
+            if not m:
+                continue
+            remainder = m.lstrip('.')
+            imports.append(_python_module_path(len(m) - len(remainder), remainder))
+    return list(dict.fromkeys(imports))
+
+def _parse_js_imports(content: str) -> List[str]:
+    """
+    Parses imports from a JavaScript/TypeScript file: static imports and
+    re-exports (including ones spanning several lines), side-effect imports,
+    dynamic import() and require().
+    """
+    imports = []
+    for match in _JS_IMPORT.finditer(content):
+        module = match.group(1) or match.group(2) or match.group(3)
+        if module:
+            imports.append(module)
+    return list(dict.fromkeys(imports))
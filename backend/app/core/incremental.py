@@ -0,0 +1,85 @@
+from typing import List, Dict, Any, Optional, Set
+
+class IncrementalAnalysis:
+    """
+    Diffs the tree a repository was last analyzed at against its current tree
+    and carries over everything from the stored result that the diff leaves
+    untouched.
+    """
+    def __init__(
+        self,
+        previous: Dict[str, Any],
+        old_tree: List[Dict[str, Any]],
+        new_tree: List[Dict[str, Any]],
+        unresolved: Optional[Dict[str, List[str]]] = None,
+    ):
+        self.previous = previous
+        self.unresolved = unresolved
+        old_blobs = {item['path']: item.get('sha') for item in old_tree if item['type'] == 'blob'}
+        new_blobs = {item['path']: item.get('sha') for item in new_tree if item['type'] == 'blob'}
+
+        self.new_tree = new_tree
+        self.added = set(new_blobs) - set(old_blobs)
+        self.deleted = set(old_blobs) - set(new_blobs)
+        self.modified = {path for path in set(new_blobs) & set(old_blobs) if new_blobs[path] != old_blobs[path]}
+
+    def changed_files(self) -> Set[str]:
+        """
+        Returns the files that have to be fetched and parsed again.
+        """
+        return self.added | self.modified
+
+    def changed_items(self) -> List[Dict[str, Any]]:
+        """
+        Returns the new tree entries of the changed files.
+        """
+        changed = self.changed_files()
+        return [item for item in self.new_tree if item['type'] == 'blob' and item['path'] in changed]
+
+    def summary(self) -> Dict[str, int]:
+        return {"added": len(self.added), "modified": len(self.modified), "deleted": len(self.deleted)}
+
+    def carried_dependencies(self) -> List[Dict[str, str]]:
+        """
+        Returns the stored edges that are still valid: edges out of changed or
+        deleted files are dropped (changed files are re-parsed), as are edges
+        into deleted files.
+        """
+        graph = self.previous.get("graph") or {}
+        stale_sources = self.changed_files() | self.deleted
+        return [
+            {"source": link['source'], "target": link['target']}
+            for link in graph.get("links", [])
+            if link['source'] not in stale_sources and link['target'] not in self.deleted
+        ]
+
+    def orphaned_files(self) -> Set[str]:
+        """
+        Returns the unchanged files that imported a deleted file. The import
+        no longer resolves, or resolves elsewhere, so they are resolved again.
+        """
+        graph = self.previous.get("graph") or {}
+        changed = self.changed_files()
+        return {
+            link['source'] for link in graph.get("links", [])
+            if link['target'] in self.deleted and link['source'] not in changed and link['source'] not in self.deleted
+        }
+
+    def carried_churn(self) -> Dict[str, int]:
+        """
+        Returns the stored churn of files that are unchanged.
+        """
+        churn = (self.previous.get("metrics") or {}).get("churn") or {}
+        dropped = self.changed_files() | self.deleted
+        return {path: value for path, value in churn.items() if path not in dropped}
+
+    def carried_unresolved(self) -> Optional[Dict[str, List[str]]]:
+        """
+        Returns the stored unresolved imports of the files that are unchanged,
+        or None if the previous result was stored without them. Only these
+        imports can resolve to an added file.
+        """
+        if self.unresolved is None:
+            return None
+        dropped = self.changed_files() | self.deleted | self.orphaned_files()
+        return {path: imports for path, imports in self.unresolved.items() if path not in dropped}
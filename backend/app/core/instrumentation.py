@@ -0,0 +1,129 @@
+import inspect
+import os
+import time
+from typing import Optional
+from urllib.parse import urlparse
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram,
+    generate_latest, multiprocess, start_http_server,
+)
+
+# Seconds; analyses are bounded by the 300s Celery soft time limit
+STAGE_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+STAGE_SECONDS = Histogram(
+    "analysis_stage_seconds", "Time spent in each stage of an analysis",
+    ["stage"], buckets=STAGE_BUCKETS,
+)
+ANALYSES = Counter("analyses_total", "Finished analyses by outcome", ["outcome"])
+GITHUB_REQUESTS = Counter("github_requests_total", "GitHub API responses by endpoint and status", ["endpoint", "status"])
+GITHUB_BYTES = Counter("github_downloaded_bytes_total", "Bytes downloaded from GitHub by endpoint", ["endpoint"])
+CACHE_LOOKUPS = Counter("cache_lookups_total", "Cache lookups by cache and result (hit/miss)", ["cache", "result"])
+LLM_SECONDS = Histogram("llm_request_seconds", "Latency of narrative generation requests", ["outcome"], buckets=STAGE_BUCKETS)
+REDIS_SECONDS = Histogram(
+    "redis_command_seconds", "Latency of Redis commands", ["command"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1),
+)
+QUEUE_WAIT_SECONDS = Histogram(
+    "analysis_queue_wait_seconds", "Time analyses wait in their queue before starting", ["queue"],
+    buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800),
+)
+HTTP_SECONDS = Histogram("http_request_seconds", "API request latency", ["method", "route", "status"])
+
+def github_endpoint(url: str) -> str:
+    """
+    Reduces a GitHub API URL to a low-cardinality label, e.g.
+    /repos/o/r/git/trees/abc -> "repos/git/trees".
+    """
+    parts = [part for part in urlparse(url).path.split('/') if part]
+    if len(parts) < 3 or parts[0] != "repos":
+        return '/'.join(parts[:1]) or "root"
+    rest = parts[3:]
+    if not rest:
+        return "repos"
+    return '/'.join(["repos"] + rest[:2 if rest[0] == "git" else 1])
+
+def _timed(func, command):
+    """
+    Wraps a Redis call (sync, or a coroutine function for redis.asyncio) so
+    its latency is recorded under `command`, or the call's first argument.
+    """
+    if inspect.iscoroutinefunction(func):
+        async def timed_async(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                REDIS_SECONDS.labels(command or str(args[0]).lower()).observe(time.perf_counter() - started)
+        return timed_async
+
+    def timed(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            REDIS_SECONDS.labels(command or str(args[0]).lower()).observe(time.perf_counter() - started)
+    return timed
+
+def instrument_redis(client):
+    """
+    Records the latency of every command the client (redis.Redis or
+    redis.asyncio.Redis) sends in redis_command_seconds. Pipelines are timed
+    as a single "pipeline" command.
+    """
+    pipeline = client.pipeline
+
+    def timed_pipeline(*args, **kwargs):
+        pipe = pipeline(*args, **kwargs)
+        pipe.execute = _timed(pipe.execute, "pipeline")
+        return pipe
+
+    client.execute_command = _timed(client.execute_command, None)
+    client.pipeline = timed_pipeline
+    return client
+
+def metrics_registry() -> CollectorRegistry:
+    """
+    Returns the registry to export. With PROMETHEUS_MULTIPROC_DIR set (uvicorn
+    or Celery running several processes), the samples written by every
+    process are aggregated; otherwise this process's own registry is used.
+    """
+    if not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+def clear_multiprocess_dir() -> Optional[str]:
+    """
+    Prepares PROMETHEUS_MULTIPROC_DIR for a new run: creates it, and removes
+    the samples other processes (of an earlier run) left there, which would
+    otherwise be exported along with the live ones. Returns the directory,
+    or None when multiprocess mode is off.
+    """
+    directory = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if not directory:
+        return None
+    os.makedirs(directory, exist_ok=True)
+    own = f"_{os.getpid()}.db"
+    for name in os.listdir(directory):
+        if name.endswith(".db") and not name.endswith(own):
+            os.remove(os.path.join(directory, name))
+    return directory
+
+def render_metrics() -> tuple:
+    """
+    Returns (body, content type) in the Prometheus text format.
+    """
+    return generate_latest(metrics_registry()), CONTENT_TYPE_LATEST
+
+def start_exporter(port: int) -> Optional[int]:
+    """
+    Serves /metrics on a separate port, for processes without an HTTP server
+    of their own (the Celery worker). A port of 0 disables the exporter.
+    """
+    if not port:
+        return None
+    start_http_server(port, registry=metrics_registry())
+    return port
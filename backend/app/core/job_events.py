@@ -0,0 +1,75 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional, Set
+import redis.asyncio
+
+from app.core.db_client import JOB_EVENTS
+
+class JobEventBroker:
+    """
+    Fans job updates published by the worker out to the API's streaming
+    clients. One pattern subscription serves every stream in the process, so
+    open streams do not each hold a Redis connection.
+    """
+    def __init__(self, redis_client: redis.asyncio.Redis, queue_size: int = 64):
+        self.redis_client = redis_client
+        self.queue_size = queue_size
+        self.prefix = JOB_EVENTS.format(job_id="")
+        self.subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        """
+        Reads the pattern subscription, reconnecting after Redis errors.
+        """
+        while True:
+            pubsub = self.redis_client.pubsub()
+            try:
+                await pubsub.psubscribe(f"{self.prefix}*")
+                async for message in pubsub.listen():
+                    if message["type"] == "pmessage":
+                        self._dispatch(message["channel"].decode('utf-8')[len(self.prefix):], message["data"])
+            except redis.RedisError as e:
+                print(f"Job event subscription lost, reconnecting: {e}")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+    def _dispatch(self, job_id: str, data: bytes):
+        queues = self.subscribers.get(job_id)
+        if not queues:
+            return
+        job = json.loads(data)
+        for queue in queues:
+            if queue.full():
+                # A slow client only needs the latest state
+                queue.get_nowait()
+            queue.put_nowait(job)
+
+    @asynccontextmanager
+    async def subscribe(self, job_id: str) -> AsyncIterator[asyncio.Queue]:
+        """
+        Yields a queue that receives the job's record each time it changes.
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self.subscribers.setdefault(job_id, set()).add(queue)
+        try:
+            yield queue
+        finally:
+            queues = self.subscribers.get(job_id)
+            if queues is not None:
+                queues.discard(queue)
+                if not queues:
+                    del self.subscribers[job_id]
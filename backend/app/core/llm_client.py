@@ -1,11 +1,13 @@
 import os
 import sys
+import time
 import google.generativeai as genai
 
 # Add the project root to the python path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
 
 from app.config import settings
+from app.core.instrumentation import LLM_SECONDS
 
 class LLMClient:
     def __init__(self, api_key: str):
@@ -25,10 +27,13 @@ class LLMClient:
         )
         full_prompt = system_prompt + prompt
 
+        started = time.perf_counter()
         try:
             model = genai.GenerativeModel('gemini-2.5-flash')
             response = model.generate_content(full_prompt)
+            LLM_SECONDS.labels("ok").observe(time.perf_counter() - started)
             return response.text
         except Exception as e:
+            LLM_SECONDS.labels("error").observe(time.perf_counter() - started)
             print(f"Error generating narrative: {e}")
             return "There was an error generating the narrative."
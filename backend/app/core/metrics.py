@@ -1,26 +1,44 @@
 import random
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 class Metrics:
-    def __init__(self, file_tree: List[Dict[str, Any]]):
+    def __init__(self, file_tree: List[Dict[str, Any]], file_history: Optional[Dict[str, Dict[str, int]]] = None):
         self.file_tree = file_tree
+        self.file_history = file_history
         self.files = [item['path'] for item in self.file_tree if item['type'] == 'blob']
 
     def calculate_churn(self) -> Dict[str, int]:
         """
-        Calculates a mock code churn for each file.
-        In a real implementation, this would involve analyzing commit history.
+        Calculates the code churn (lines added + deleted) for each file from the
+        source's file history. Sources without history fall back to a mock churn.
         """
+        if self.file_history is not None:
+            return {file_path: self.file_history.get(file_path, {}).get("churn", 0) for file_path in self.files}
+
         churn_data = {}
         for file_path in self.files:
             # Mock churn: random number of lines changed
             churn_data[file_path] = random.randint(10, 500)
         return churn_data
 
-    def identify_hotspots(self, churn_data: Dict[str, int], top_n: int = 10) -> List[str]:
+    def identify_hotspots(
+        self,
+        churn_data: Dict[str, int],
+        top_n: int = 10,
+        centrality: Optional[Dict[str, float]] = None,
+    ) -> List[str]:
         """
-        Identifies hotspots based on churn data.
+        Identifies hotspots: the files with the most churn or, given each
+        file's centrality, the highest churn x centrality, i.e. files that
+        change often and that much of the codebase depends on.
         """
-        sorted_files = sorted(churn_data.items(), key=lambda item: item[1], reverse=True)
+        if centrality is None:
+            sorted_files = sorted(churn_data.items(), key=lambda item: item[1], reverse=True)
+        else:
+            sorted_files = sorted(
+                churn_data.items(),
+                key=lambda item: (item[1] * centrality.get(item[0], 0.0), centrality.get(item[0], 0.0)),
+                reverse=True,
+            )
         hotspots = [file for file, churn in sorted_files[:top_n]]
-        return hotspots
\ No newline at end of file
+        return hotspots
@@ -0,0 +1,220 @@
+import fnmatch
+import json
+import os
+import re
+from typing import List, Dict, Any, Optional, Tuple
+
+# Suffixes tried for an extensionless import, in order of preference
+RESOLUTION_SUFFIXES = [
+    ".py", ".js", ".jsx", ".ts", ".tsx",
+    "/__init__.py", "/index.js", "/index.ts", "/index.tsx",
+]
+CONFIG_FILES = ('tsconfig.json', 'jsconfig.json', 'package.json')
+
+# Fallback aliases for "@/..." when no tsconfig/jsconfig declares one
+DEFAULT_ALIAS_ROOTS = ['src/', 'frontend/src/', 'backend/src/']
+
+_JSON_COMMENTS = re.compile(r'"(?:\\.|[^"\\])*"|//[^\n]*|/\*.*?\*/', re.S)
+_TRAILING_COMMAS = re.compile(r',(\s*[}\]])')
+
+def _load_jsonc(content: str) -> Dict[str, Any]:
+    """
+    Parses JSON with comments and trailing commas, as used by tsconfig files.
+    """
+    stripped = _JSON_COMMENTS.sub(lambda m: m.group(0) if m.group(0).startswith('"') else '', content)
+    data = json.loads(_TRAILING_COMMAS.sub(r'\1', stripped))
+    return data if isinstance(data, dict) else {}
+
+def _join(*parts: str) -> str:
+    path = os.path.normpath(os.path.join(*parts))
+    return '' if path == '.' else path
+
+class ModuleResolver:
+    """
+    Resolution index built once per file tree. It maps extensionless paths,
+    dotted Python module names, tsconfig/jsconfig path aliases and workspace
+    package names to files, so resolving an import is a handful of dictionary
+    lookups. Results, including misses, are memoized per import context.
+    """
+    def __init__(self, file_tree: List[Dict[str, Any]], config_contents: Optional[Dict[str, str]] = None):
+        files = [item['path'] for item in file_tree if item['type'] == 'blob']
+        self.paths: Dict[str, str] = {}
+        self.modules: Dict[str, List[str]] = {}
+        self.python_roots: Dict[str, str] = {}
+        self.ts_configs: Dict[str, Dict[str, Any]] = {}
+        self.packages: Dict[str, Tuple[str, Optional[str]]] = {}
+        self._memo: Dict[Tuple, Optional[str]] = {}
+        self._scope_memo: Dict[str, Optional[str]] = {}
+
+        self._index_paths(files)
+        self._index_python_modules(files)
+        self._index_configs(config_contents or {})
+
+    @staticmethod
+    def config_paths(file_tree: List[Dict[str, Any]]) -> List[str]:
+        """
+        Returns the tsconfig/jsconfig/package.json files the index needs to read.
+        """
+        return [
+            item['path'] for item in file_tree
+            if item['type'] == 'blob'
+            and os.path.basename(item['path']) in CONFIG_FILES
+            and 'node_modules/' not in item['path']
+        ]
+
+    def _index_paths(self, files: List[str]):
+        ranked: Dict[str, int] = {}
+        for file_path in files:
+            keys = [(file_path, len(RESOLUTION_SUFFIXES))]
+            for rank, suffix in enumerate(RESOLUTION_SUFFIXES):
+                if file_path.endswith(suffix):
+                    keys.append((file_path[:-len(suffix)], rank))
+            for key, rank in keys:
+                if key and rank < ranked.get(key, len(RESOLUTION_SUFFIXES) + 1):
+                    ranked[key] = rank
+                    self.paths[key] = file_path
+
+    def _index_python_modules(self, files: List[str]):
+        """
+        Registers every Python file under its dotted name relative to its
+        package root: the closest ancestor directory without an __init__.py.
+        This makes src/ layouts and nested projects (backend/app/...) resolve.
+        """
+        packages = {os.path.dirname(f) for f in files if f.endswith('__init__.py')}
+        for file_path in files:
+            if not file_path.endswith('.py'):
+                continue
+            module_path = file_path[:-3]
+            if module_path.endswith('/__init__') or module_path == '__init__':
+                module_path = os.path.dirname(module_path)
+            root = os.path.dirname(file_path)
+            while root in packages:
+                root = os.path.dirname(root)
+            self.python_roots[file_path] = root
+            relative = module_path[len(root) + 1:] if root else module_path
+            if relative:
+                self.modules.setdefault(relative.replace('/', '.'), []).append(file_path)
+
+    def _index_configs(self, config_contents: Dict[str, str]):
+        workspace_patterns = []
+        package_dirs = {}
+        for config_path, content in config_contents.items():
+            try:
+                data = _load_jsonc(content)
+            except ValueError:
+                print(f"Could not parse {config_path}")
+                continue
+            config_dir = os.path.dirname(config_path)
+
+            if os.path.basename(config_path) == 'package.json':
+                workspaces = data.get('workspaces') or []
+                if isinstance(workspaces, dict):
+                    workspaces = workspaces.get('packages') or []
+                workspace_patterns.extend(_join(config_dir, pattern) for pattern in workspaces)
+                if isinstance(data.get('name'), str):
+                    entry = data.get('source') or data.get('module') or data.get('main')
+                    package_dirs[config_dir] = (data['name'], entry)
+                continue
+
+            options = data.get('compilerOptions') or {}
+            if 'baseUrl' not in options and 'paths' not in options:
+                continue
+            base = _join(config_dir, options.get('baseUrl', '.'))
+            aliases = []
+            for pattern, targets in (options.get('paths') or {}).items():
+                aliases.append((pattern.rstrip('*'), pattern.endswith('*'), [_join(base, t.rstrip('*')) + ('/' if t.endswith('/*') else '') for t in targets]))
+            # Longest prefixes win, as in TypeScript
+            aliases.sort(key=lambda alias: len(alias[0]), reverse=True)
+            # A tsconfig wins over a jsconfig in the same directory
+            if config_dir not in self.ts_configs or config_path.endswith('tsconfig.json'):
+                self.ts_configs[config_dir] = {"base": base if 'baseUrl' in options else None, "aliases": aliases}
+
+        for package_dir, (name, entry) in package_dirs.items():
+            if any(fnmatch.fnmatch(package_dir, pattern) for pattern in workspace_patterns):
+                self.packages[name] = (package_dir, _join(package_dir, entry) if entry else None)
+
+    def _scope(self, importer_dir: str) -> Optional[str]:
+        """
+        Returns the directory of the tsconfig/jsconfig that governs files in
+        importer_dir (or None).
+        """
+        if importer_dir not in self._scope_memo:
+            directory = importer_dir
+            while directory not in self.ts_configs and directory:
+                directory = os.path.dirname(directory)
+            self._scope_memo[importer_dir] = directory if directory in self.ts_configs else None
+        return self._scope_memo[importer_dir]
+
+    def _lookup_path(self, candidate: str) -> Optional[str]:
+        candidate = candidate.rstrip('/')
+        return self.paths.get(candidate) or self.paths.get(os.path.normpath(candidate))
+
+    def resolve(self, importer: str, imp: str) -> Optional[str]:
+        """
+        Resolves an import string, as produced by ImportParser, of the file
+        `importer` to a file in the tree, or None.
+        """
+        importer_dir = os.path.dirname(importer)
+        if imp.startswith('.'):
+            key = ('', _join(importer_dir, imp))
+            if key not in self._memo:
+                self._memo[key] = self._lookup_path(key[1])
+            return self._memo[key]
+
+        if importer.endswith('.py'):
+            key = ('py', self.python_roots.get(importer, ''), imp)
+        else:
+            key = ('js', self._scope(importer_dir), imp)
+        if key not in self._memo:
+            if key[0] == 'py':
+                self._memo[key] = self._resolve_python(key[1], imp)
+            else:
+                self._memo[key] = self._resolve_js(key[1], imp)
+        return self._memo[key]
+
+    def _resolve_python(self, root: str, imp: str) -> Optional[str]:
+        candidates = self.modules.get(imp.replace('/', '.'))
+        if candidates:
+            # Prefer a module from the importer's own project
+            for candidate in candidates:
+                if self.python_roots.get(candidate) == root:
+                    return candidate
+            return candidates[0]
+        return self._lookup_path(imp)
+
+    def _resolve_js(self, scope: Optional[str], imp: str) -> Optional[str]:
+        config = self.ts_configs.get(scope) if scope is not None else None
+        if config:
+            for prefix, wildcard, targets in config["aliases"]:
+                if imp == prefix or (wildcard and imp.startswith(prefix)):
+                    rest = imp[len(prefix):] if wildcard else ''
+                    for target in targets:
+                        resolved = self._lookup_path(target + rest)
+                        if resolved:
+                            return resolved
+            if config["base"] is not None:
+                resolved = self._lookup_path(_join(config["base"], imp))
+                if resolved:
+                    return resolved
+
+        segments = imp.split('/')
+        name_length = 2 if imp.startswith('@') else 1
+        package = self.packages.get('/'.join(segments[:name_length]))
+        if package:
+            package_dir, entry = package
+            rest = '/'.join(segments[name_length:])
+            if rest:
+                resolved = self._lookup_path(_join(package_dir, rest))
+            else:
+                resolved = (entry and self._lookup_path(entry)) or self._lookup_path(package_dir)
+            if resolved:
+                return resolved
+
+        if imp.startswith('@/'):
+            for alias_root in DEFAULT_ALIAS_ROOTS:
+                resolved = self._lookup_path(imp.replace('@/', alias_root, 1))
+                if resolved:
+                    return resolved
+            return None
+
+        return self._lookup_path(imp)
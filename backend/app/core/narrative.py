@@ -1,3 +1,5 @@
+import os
+
 from .llm_client import LLMClient
 
 class Narrative:
@@ -20,15 +22,24 @@ class Narrative:
             "Based on the following summary, write a brief, insightful narrative (2-3 paragraphs) about the repository's architecture, potential risks, and areas of interest. "
             "Your tone should be technical, objective, and slightly informal, like you're talking to your team.\n\n"
             "**Codebase Analysis Summary:**\n"
-            "- **Identified Hotspots (Top 10 most active files):**\n"
+            "- **Identified Hotspots (Top 10 by churn x dependency centrality):**\n"
         )
 
         for hotspot in self.summary.get('hotspots', []):
             prompt += f"  - `{hotspot}`\n"
 
-        prompt += "\n- **Key Architectural Clusters (by directory):**\n"
-        for cluster, files in self.summary.get('clusters', {}).items():
-            prompt += f"  - **Cluster:** `{cluster}` ({len(files)} files)\n"
+        cycles = self.summary.get('cycles', [])
+        if cycles:
+            prompt += f"\n- **Import Cycles:** {len(cycles)} (largest spans {len(cycles[0])} files)\n"
+            for cycle in cycles[:5]:
+                prompt += f"  - {', '.join(f'`{path}`' for path in cycle[:8])}{' ...' if len(cycle) > 8 else ''}\n"
+
+        prompt += "\n- **Key Architectural Clusters (modules detected from the import graph, named after their main directory):**\n"
+        if self.summary.get('modularity') is not None:
+            prompt += f"  - Modularity: {self.summary['modularity']} (above ~0.3 means clearly separated modules)\n"
+        for cluster, files in list(self.summary.get('clusters', {}).items())[:15]:
+            directories = sorted({os.path.dirname(path) or '(root)' for path in files})
+            prompt += f"  - **Cluster:** `{cluster}` ({len(files)} files across {', '.join(f'`{d}`' for d in directories[:4])}{' ...' if len(directories) > 4 else ''})\n"
         
         prompt += (
             "\n**Your Task:**\n"
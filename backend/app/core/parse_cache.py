@@ -0,0 +1,80 @@
+import json
+import time
+from typing import List, Dict, Iterable, Optional
+import redis
+
+from app.config import settings
+from app.core.instrumentation import CACHE_LOOKUPS
+
+class ParseCache:
+    """
+    Content-addressed cache of parsed imports, keyed by git blob SHA.
+
+    Blob SHAs are immutable, so an entry never has to be invalidated; it is
+    only evicted once the cache grows past max_entries, least recently used
+    first. Recency is tracked in a sorted set scored by last access time.
+    """
+    # Bump the version whenever the parser's output format changes
+    KEY_PREFIX = "parse:v2:"
+    LRU_KEY = "parse_cache:v2:lru"
+
+    def __init__(self, redis_client: redis.Redis, max_entries: int = settings.PARSE_CACHE_MAX_ENTRIES):
+        self.redis_client = redis_client
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, shas: Iterable[str]) -> Dict[str, List[str]]:
+        """
+        Returns the cached import lists for the given SHAs. SHAs that are not
+        cached are missing from the result.
+        """
+        shas = list(dict.fromkeys(shas))
+        if not shas:
+            return {}
+
+        values = self.redis_client.mget([f"{self.KEY_PREFIX}{sha}" for sha in shas])
+        found = {sha: json.loads(value) for sha, value in zip(shas, values) if value is not None}
+
+        if found:
+            now = time.time()
+            self.redis_client.zadd(self.LRU_KEY, {sha: now for sha in found})
+
+        self.hits += len(found)
+        self.misses += len(shas) - len(found)
+        CACHE_LOOKUPS.labels("parse", "hit").inc(len(found))
+        CACHE_LOOKUPS.labels("parse", "miss").inc(len(shas) - len(found))
+        return found
+
+    def set_many(self, entries: Dict[str, List[str]]):
+        """
+        Stores import lists by SHA and evicts the least recently used entries
+        if the cache is over budget.
+        """
+        if not entries:
+            return
+
+        now = time.time()
+        pipe = self.redis_client.pipeline(transaction=False)
+        for sha, imports in entries.items():
+            pipe.set(f"{self.KEY_PREFIX}{sha}", json.dumps(imports))
+        pipe.zadd(self.LRU_KEY, {sha: now for sha in entries})
+        pipe.zcard(self.LRU_KEY)
+        size = pipe.execute()[-1]
+
+        overflow = size - self.max_entries
+        if overflow > 0:
+            evicted = [sha for sha, _ in self.redis_client.zpopmin(self.LRU_KEY, overflow)]
+            if evicted:
+                self.redis_client.delete(*[f"{self.KEY_PREFIX}{sha.decode('utf-8')}" for sha in evicted])
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        """
+        Returns the hit/miss counts seen by this instance.
+        """
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else None,
+        }
@@ -0,0 +1,241 @@
+import queue
+import threading
+import time
+from typing import List, Dict, Any, Callable, Iterable, Iterator, Optional, Set
+
+from app.config import settings
+from .graph_builder import GraphBuilder
+from .instrumentation import STAGE_SECONDS
+from .import_parser import ImportParser
+from .module_resolver import ModuleResolver
+
+_DONE = object()
+
+class PipelineAborted(Exception):
+    pass
+
+class PipelineProgress:
+    """
+    Per-stage counters and timings of an analysis. Each counter has a single
+    writer (the stage that owns it), so no locking is needed. Snapshots are
+    reported through on_progress at most every `interval` seconds, and each
+    stage's duration is recorded in analysis_stage_seconds when it ends.
+    """
+    def __init__(self, on_progress: Optional[Callable[[Dict[str, Any]], None]] = None, interval: float = 1.0):
+        self.on_progress = on_progress
+        self.interval = interval
+        self.stage = "pending"
+        self.total = 0
+        self.fetched = 0
+        self.parsed = 0
+        self.resolved = 0
+        self.timings: Dict[str, float] = {}
+        self.started = time.monotonic()
+        self._stage_started: Optional[float] = None
+        self._last_report = 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "stage": self.stage,
+            "progress": {
+                "total": self.total,
+                "fetched": self.fetched,
+                "parsed": self.parsed,
+                "resolved": self.resolved,
+            },
+        }
+
+    def set_stage(self, stage: str):
+        if stage == self.stage:
+            return
+        self._end_stage()
+        self.stage = stage
+        self._stage_started = time.monotonic()
+        self.report(force=True)
+
+    def _end_stage(self):
+        if self._stage_started is None:
+            return
+        seconds = time.monotonic() - self._stage_started
+        self._stage_started = None
+        self.timings[self.stage] = round(self.timings.get(self.stage, 0.0) + seconds, 3)
+        STAGE_SECONDS.labels(self.stage).observe(seconds)
+
+    def finish(self) -> Dict[str, Any]:
+        """
+        Ends the current stage and returns a trace summary for the job record:
+        seconds per stage, the total, and the slowest stage.
+        """
+        self._end_stage()
+        return {
+            "stages": dict(self.timings),
+            "total": round(time.monotonic() - self.started, 3),
+            "slowest": max(self.timings, key=self.timings.get) if self.timings else None,
+        }
+
+    def report(self, force: bool = False):
+        now = time.monotonic()
+        if self.on_progress and (force or now - self._last_report >= self.interval):
+            self._last_report = now
+            self.on_progress(self.snapshot())
+
+class AnalysisPipeline:
+    """
+    Runs fetch -> parse -> resolve as concurrent stages connected by bounded
+    queues: parsing starts while fetches are still in flight, and edges are
+    added to the graph builder as soon as a file's imports resolve. The
+    bounded queues keep a fast fetcher from buffering the whole repository.
+    """
+    def __init__(
+        self,
+        import_parser: ImportParser,
+        resolver: ModuleResolver,
+        graph_builder: GraphBuilder,
+        progress: PipelineProgress,
+        queue_size: int = settings.PIPELINE_QUEUE_SIZE,
+    ):
+        self.import_parser = import_parser
+        self.resolver = resolver
+        self.graph_builder = graph_builder
+        self.progress = progress
+        self.queue_size = queue_size
+        self._stop = threading.Event()
+        self._errors: List[BaseException] = []
+
+    def run(
+        self,
+        owner: str,
+        repo: str,
+        file_tree: List[Dict[str, Any]],
+        source: str = "archive",
+        ref: Optional[str] = None,
+        only: Optional[Set[str]] = None,
+        fetch: bool = True,
+    ):
+        """
+        Fetches, parses and resolves the parseable files of the tree (or of
+        `only`). Cached files skip straight to the resolve stage. With
+        fetch=False nothing is fetched and only cached files are resolved.
+        """
+        cached, pending, blob_shas = self.import_parser.plan(file_tree, only)
+        if not fetch:
+            pending = []
+        self.progress.total += len(cached) + len(pending)
+        self.progress.fetched += len(cached)
+        self.progress.parsed += len(cached)
+        self.progress.set_stage("parsing")
+
+        for file_path, imports in cached.items():
+            self._resolve(file_path, imports)
+        if not pending:
+            return
+
+        self._stop = threading.Event()
+        self._errors = []
+        fetched: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        parsed: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        threads = [
+            threading.Thread(
+                target=self._stage, name="fetch", daemon=True,
+                args=(self._fetch_stage(owner, repo, pending, source, ref), fetched),
+            ),
+            threading.Thread(
+                target=self._stage, name="parse", daemon=True,
+                args=(self._parse_stage(fetched), parsed),
+            ),
+        ]
+        for thread in threads:
+            thread.start()
+
+        fresh = {}
+        try:
+            for file_path, imports in self._drain(parsed, report=True):
+                fresh[file_path] = imports
+                self._resolve(file_path, imports)
+        except PipelineAborted:
+            # A stage failed; its error is re-raised below
+            pass
+        finally:
+            self._stop.set()
+            for thread in threads:
+                thread.join(timeout=5)
+
+        if self._errors:
+            raise self._errors[0]
+        self.import_parser.store_parsed(fresh, blob_shas)
+
+    def resolve(self, parsed: Dict[str, List[str]]):
+        """
+        Resolves imports that are already known, e.g. kept from an earlier
+        analysis, without fetching anything or counting them as progress.
+        """
+        for file_path, imports in parsed.items():
+            self._add_dependencies(file_path, imports)
+
+    def _add_dependencies(self, file_path: str, imports: List[str]):
+        unresolved: List[str] = []
+        self.graph_builder.add_dependencies(self.import_parser.resolve_dependencies(file_path, imports, self.resolver, unresolved))
+        self.graph_builder.set_unresolved(file_path, unresolved)
+
+    def _resolve(self, file_path: str, imports: List[str]):
+        self._add_dependencies(file_path, imports)
+        self.progress.resolved += 1
+        self.progress.report()
+
+    def _fetch_stage(self, owner: str, repo: str, pending: List[str], source: str, ref: Optional[str]) -> Iterator:
+        for item in self.import_parser.iter_source(owner, repo, pending, source, ref):
+            self.progress.fetched += 1
+            yield item
+
+    def _parse_stage(self, fetched: queue.Queue) -> Iterator:
+        for item in self.import_parser.iter_parsed(self._drain(fetched)):
+            self.progress.parsed += 1
+            yield item
+
+    def _stage(self, items: Iterable, output: queue.Queue):
+        """
+        Thread body: pushes every item of a stage into its output queue, then
+        an end marker. Errors are recorded for run() to re-raise.
+        """
+        try:
+            for item in items:
+                self._put(output, item)
+        except PipelineAborted:
+            pass
+        except BaseException as e:
+            self._errors.append(e)
+            self._stop.set()
+        finally:
+            try:
+                self._put(output, _DONE)
+            except PipelineAborted:
+                pass
+
+    def _put(self, output: queue.Queue, item):
+        while True:
+            if self._stop.is_set() and item is not _DONE:
+                raise PipelineAborted()
+            try:
+                output.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                if self._stop.is_set():
+                    raise PipelineAborted()
+
+    def _drain(self, source: queue.Queue, report: bool = False) -> Iterator:
+        """
+        Yields items from a stage's queue until its end marker. Only the
+        resolving (calling) thread reports progress, so job updates never race.
+        """
+        while True:
+            try:
+                item = source.get(timeout=0.5)
+            except queue.Empty:
+                if self._stop.is_set():
+                    raise PipelineAborted()
+                if report:
+                    self.progress.report()
+                continue
+            if item is _DONE:
+                return
+            yield item
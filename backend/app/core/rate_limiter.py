@@ -0,0 +1,106 @@
+import asyncio
+import hashlib
+import time
+from typing import Mapping
+import redis
+
+class RateLimitExceeded(Exception):
+    """
+    Raised when the shared quota is exhausted for longer than a caller should
+    block. retry_after is the number of seconds until the quota resets.
+    """
+    def __init__(self, retry_after: float):
+        super().__init__(f"GitHub rate limit exhausted, resets in {int(retry_after)}s")
+        self.retry_after = retry_after
+
+class RateLimiter:
+    """
+    Tracks the primary GitHub rate limit of a token in Redis, so every API
+    process and worker sharing that token paces itself against the same
+    budget. The budget is refreshed from X-RateLimit-* response headers and
+    decremented optimistically before each request.
+    """
+    KEY_PREFIX = "gh:ratelimit:"
+
+    def __init__(self, redis_client: redis.Redis, token: str, reserve: int = 50, max_wait: float = 30):
+        self.redis_client = redis_client
+        self.key = f"{self.KEY_PREFIX}{hashlib.sha1(token.encode('utf-8')).hexdigest()[:12]}"
+        self.reserve = reserve
+        self.max_wait = max_wait
+
+    def acquire(self):
+        """
+        Waits for quota before a request. Sleeps through short waits and raises
+        RateLimitExceeded when the reset is further away than max_wait.
+        """
+        while True:
+            state = self.redis_client.hmget(self.key, "remaining", "reset")
+            if state[0] is None or state[1] is None:
+                return
+
+            remaining, reset = int(state[0]), float(state[1])
+            wait = reset - time.time()
+            if wait <= 0:
+                self.redis_client.delete(self.key)
+                return
+
+            if remaining > self.reserve:
+                self.redis_client.hincrby(self.key, "remaining", -1)
+                # Spread the last part of the budget evenly over the window
+                if remaining < self.reserve * 4:
+                    time.sleep(min(wait / (remaining - self.reserve), self.max_wait))
+                return
+
+            if wait > self.max_wait:
+                raise RateLimitExceeded(wait)
+            time.sleep(wait)
+
+    def update(self, headers: Mapping[str, str]):
+        """
+        Records the rate limit state reported by a response.
+        """
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset = headers.get("X-RateLimit-Reset")
+        if remaining is None or reset is None or headers.get("X-RateLimit-Resource", "core") != "core":
+            return
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.hset(self.key, mapping={"remaining": remaining, "reset": reset})
+        pipe.expireat(self.key, int(reset) + 1)
+        pipe.execute()
+
+class AsyncRateLimiter(RateLimiter):
+    """
+    RateLimiter over a redis.asyncio client. Waits with asyncio.sleep so the
+    API's event loop keeps serving other requests meanwhile.
+    """
+    async def acquire(self):
+        while True:
+            state = await self.redis_client.hmget(self.key, "remaining", "reset")
+            if state[0] is None or state[1] is None:
+                return
+
+            remaining, reset = int(state[0]), float(state[1])
+            wait = reset - time.time()
+            if wait <= 0:
+                await self.redis_client.delete(self.key)
+                return
+
+            if remaining > self.reserve:
+                await self.redis_client.hincrby(self.key, "remaining", -1)
+                if remaining < self.reserve * 4:
+                    await asyncio.sleep(min(wait / (remaining - self.reserve), self.max_wait))
+                return
+
+            if wait > self.max_wait:
+                raise RateLimitExceeded(wait)
+            await asyncio.sleep(wait)
+
+    async def update(self, headers: Mapping[str, str]):
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset = headers.get("X-RateLimit-Reset")
+        if remaining is None or reset is None or headers.get("X-RateLimit-Resource", "core") != "core":
+            return
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.hset(self.key, mapping={"remaining": remaining, "reset": reset})
+        pipe.expireat(self.key, int(reset) + 1)
+        await pipe.execute()
@@ -0,0 +1,271 @@
+import fcntl
+import os
+import subprocess
+from abc import ABC, abstractmethod
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
+
+from app.config import settings
+
+class RepositorySource(ABC):
+    """
+    Where the analysis reads a repository from. GitHubClient talks to the REST
+    API; GitCloneSource reads from a local partial clone. ImportParser, Metrics
+    and the worker only rely on the methods below.
+    """
+    @abstractmethod
+    def get_head(self, owner: str, repo: str) -> Dict[str, str]:
+        """
+        The default branch with its current commit and root tree SHAs.
+        """
+
+    @abstractmethod
+    def get_file_tree(self, owner: str, repo: str, ref: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        The recursive tree at a branch, commit or tree SHA, as GitHub's git
+        trees API returns it (path, type, sha, size).
+        """
+
+    @abstractmethod
+    def get_file_content(self, owner: str, repo: str, file_path: str, ref: Optional[str] = None) -> str:
+        """
+        The content of one file.
+        """
+
+    def iter_file_contents(self, owner: str, repo: str, file_paths: Iterable[str], ref: Optional[str] = None) -> Iterator[Tuple[str, Optional[str]]]:
+        for file_path in file_paths:
+            try:
+                yield file_path, self.get_file_content(owner, repo, file_path, ref)
+            except Exception as e:
+                print(f"Error fetching {file_path}: {e}")
+                yield file_path, None
+
+    @abstractmethod
+    def get_archive_stream(self, owner: str, repo: str, ref: Optional[str] = None):
+        """
+        A streamed tarball of the tree, with a `raw` file object and `close()`.
+        """
+
+    def get_file_history(self, owner: str, repo: str) -> Optional[Dict[str, Dict[str, int]]]:
+        """
+        Returns per-file churn, commit count, author count and last change
+        timestamp, or None if the source cannot provide history cheaply.
+        """
+        return None
+
+class _ProcessStream:
+    """
+    Adapts a subprocess to the streamed-response interface ImportParser
+    expects from get_archive_stream (a `raw` file object and `close()`).
+    """
+    def __init__(self, process: subprocess.Popen):
+        self.process = process
+        self.raw = process.stdout
+
+    def close(self):
+        self.process.stdout.close()
+        if self.process.wait() not in (0, -13):  # -13: SIGPIPE when the reader stops early
+            raise RuntimeError(f"git exited with status {self.process.returncode}")
+
+class GitCloneSource(RepositorySource):
+    """
+    Reads a repository from a bare, blobless clone kept in a worker-local cache
+    directory. The clone is refreshed with a fetch when it already exists.
+    Works with any URL git understands, including file:// repositories.
+    """
+    def __init__(
+        self,
+        url: str,
+        cache_dir: str = settings.GIT_CACHE_DIR,
+        depth: Optional[int] = settings.GIT_CLONE_DEPTH,
+        clone_filter: Optional[str] = settings.GIT_CLONE_FILTER,
+        max_commits: int = settings.GIT_HISTORY_MAX_COMMITS,
+    ):
+        self.url = url
+        self.depth = depth
+        self.clone_filter = clone_filter
+        self.max_commits = max_commits
+        name = url.rstrip('/').split('://', 1)[-1].replace(':', '/')
+        if not name.endswith('.git'):
+            name = f"{name}.git"
+        self.path = os.path.join(cache_dir, name.lstrip('/'))
+        self._synced = False
+
+    def _git(self, *args: str) -> str:
+        result = subprocess.run(
+            ["git", "--git-dir", self.path, *args],
+            check=True, capture_output=True, text=True,
+        )
+        return result.stdout
+
+    def _fetch_args(self) -> List[str]:
+        args = []
+        if self.clone_filter:
+            args.append(f"--filter={self.clone_filter}")
+        if self.depth:
+            args.append(f"--depth={self.depth}")
+        return args
+
+    def sync(self):
+        """
+        Clones the repository, or fetches new commits into an existing clone.
+        A lock file keeps concurrent tasks on one worker from racing.
+        """
+        if self._synced:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(f"{self.path}.lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if os.path.isdir(self.path):
+                self._git("fetch", *self._fetch_args(), "origin", "+refs/heads/*:refs/heads/*")
+            else:
+                subprocess.run(
+                    ["git", "clone", "--bare", *self._fetch_args(), self.url, self.path],
+                    check=True, capture_output=True, text=True,
+                )
+        self._synced = True
+
+    def get_head(self, owner: str, repo: str) -> Dict[str, str]:
+        self.sync()
+        return {
+            "branch": self._git("symbolic-ref", "--short", "HEAD").strip(),
+            "commit_sha": self._git("rev-parse", "HEAD").strip(),
+            "tree_sha": self._git("rev-parse", "HEAD^{tree}").strip(),
+        }
+
+    def get_file_tree(self, owner: str, repo: str, ref: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Lists the tree in the same shape as GitHub's recursive tree endpoint.
+        Sizes are left out: reading them would fetch every blob.
+        """
+        self.sync()
+        tree = []
+        for line in self._git("ls-tree", "-r", "--full-tree", ref or "HEAD").splitlines():
+            meta, path = line.split('\t', 1)
+            mode, item_type, sha = meta.split()
+            tree.append({"path": path, "mode": mode, "type": item_type, "sha": sha})
+        return tree
+
+    def get_file_content(self, owner: str, repo: str, file_path: str, ref: Optional[str] = None) -> str:
+        self.sync()
+        return self._git("cat-file", "blob", f"{ref or 'HEAD'}:{file_path}")
+
+    def _prefetch(self, ref: str, file_paths: List[str]):
+        """
+        Fetches the missing blobs of the given files in one request. Without
+        this a blobless clone would fetch every blob lazily, one at a time.
+        """
+        if not self.clone_filter:
+            return
+        wanted = set(file_paths)
+        shas = {item["sha"] for item in self.get_file_tree(None, None, ref) if item["path"] in wanted}
+        listing = self._git("rev-list", "--objects", "--no-walk", "--missing=print", ref)
+        self._fetch_objects([line[1:] for line in listing.splitlines() if line.startswith('?') and line[1:] in shas])
+
+    def _prefetch_history(self, log_args: List[str]):
+        """
+        Fetches the blobs `git log --numstat` over log_args diffs in one
+        request. Listing them with --raw only reads trees, which a blobless
+        clone has; numstat alone would fetch each commit's blobs lazily, a
+        request per commit.
+        """
+        if not self.clone_filter:
+            return
+        shas = set()
+        for line in self._git("log", "--raw", "--no-abbrev", "--no-renames", "--format=", *log_args).splitlines():
+            if not line.startswith(':'):
+                continue
+            old_mode, new_mode, old_sha, new_sha = line[1:].split()[:4]
+            # Submodules are commits of another repository
+            for mode, sha in ((old_mode, old_sha), (new_mode, new_sha)):
+                if mode != "160000" and sha.strip('0'):
+                    shas.add(sha)
+        # Objects the clone already has are skipped by the fetch
+        self._fetch_objects(sorted(shas))
+
+    def _fetch_objects(self, shas: List[str]):
+        if shas:
+            subprocess.run(
+                ["git", "--git-dir", self.path, "fetch", "--no-tags", "--no-write-fetch-head", "--stdin", "origin"],
+                input="\n".join(shas), check=True, capture_output=True, text=True,
+            )
+
+    def iter_file_contents(self, owner: str, repo: str, file_paths: Iterable[str], ref: Optional[str] = None) -> Iterator[Tuple[str, Optional[str]]]:
+        """
+        Reads many files through a single `git cat-file --batch` process.
+        """
+        self.sync()
+        file_paths = list(file_paths)
+        self._prefetch(ref or "HEAD", file_paths)
+        process = subprocess.Popen(
+            ["git", "--git-dir", self.path, "cat-file", "--batch"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+        )
+        try:
+            for file_path in file_paths:
+                process.stdin.write(f"{ref or 'HEAD'}:{file_path}\n".encode('utf-8'))
+                process.stdin.flush()
+                header = process.stdout.readline().decode('utf-8').split()
+                if len(header) != 3:
+                    print(f"Error fetching {file_path}: not found")
+                    yield file_path, None
+                    continue
+                content = process.stdout.read(int(header[2]))
+                process.stdout.read(1)  # trailing newline
+                yield file_path, content.decode('utf-8', errors='replace')
+        finally:
+            process.stdin.close()
+            process.stdout.close()
+            process.wait()
+
+    def get_archive_stream(self, owner: str, repo: str, ref: Optional[str] = None):
+        """
+        Streams an uncompressed tarball of the tree from `git archive`.
+        """
+        self.sync()
+        process = subprocess.Popen(
+            ["git", "--git-dir", self.path, "archive", "--format=tar", f"--prefix={repo}/", ref or "HEAD"],
+            stdout=subprocess.PIPE,
+        )
+        return _ProcessStream(process)
+
+    def get_file_history(self, owner: str, repo: str) -> Dict[str, Dict[str, int]]:
+        """
+        Computes churn (lines added + deleted), commit count, distinct author
+        count and last change timestamp per file in one streaming pass over
+        `git log --numstat`, after fetching the blobs it diffs in one go.
+        """
+        self.sync()
+        log_args = [f"--max-count={self.max_commits}", "HEAD"]
+        self._prefetch_history(log_args)
+        history: Dict[str, Dict[str, Any]] = {}
+        process = subprocess.Popen(
+            [
+                "git", "--git-dir", self.path, "log", "--numstat", "--no-renames",
+                "--format=%x1e%ae%x1f%ct", *log_args,
+            ],
+            stdout=subprocess.PIPE, text=True, errors="replace",
+        )
+        author, timestamp = None, 0
+        for line in process.stdout:
+            if line.startswith('\x1e'):
+                author, timestamp = line[1:].rstrip('\n').split('\x1f')
+                timestamp = int(timestamp)
+                continue
+            parts = line.rstrip('\n').split('\t')
+            if len(parts) != 3:
+                continue
+            added, deleted, path = parts
+            stats = history.setdefault(path, {"churn": 0, "commits": 0, "authors": set(), "last_modified": 0})
+            # Binary files report "-" for both counts
+            if added != '-':
+                stats["churn"] += int(added) + int(deleted)
+            stats["commits"] += 1
+            stats["authors"].add(author)
+            stats["last_modified"] = max(stats["last_modified"], timestamp)
+        process.stdout.close()
+        if process.wait() != 0:
+            raise RuntimeError(f"git log exited with status {process.returncode}")
+
+        for stats in history.values():
+            stats["authors"] = len(stats["authors"])
+        return history
@@ -0,0 +1,285 @@
+import io
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from app.core.compact_graph import CompactGraph
+
+# Repository record fields with a column of their own; the full record is
+# kept as JSON alongside
+REPO_COLUMNS = ("id", "owner", "name", "is_public", "last_analyzed", "branch", "commit_sha", "tree_sha")
+JOB_COLUMNS = ("id", "repo_id", "status", "created_at", "updated_at")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS repos (
+    id TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    name TEXT NOT NULL,
+    is_public BOOLEAN,
+    last_analyzed TEXT,
+    branch TEXT,
+    commit_sha TEXT,
+    tree_sha TEXT,
+    record {json} NOT NULL,
+    UNIQUE (owner, name)
+);
+CREATE INDEX IF NOT EXISTS repos_last_analyzed ON repos (last_analyzed);
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    repo_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created_at TEXT,
+    updated_at TEXT,
+    record {json} NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_repo_id ON jobs (repo_id, created_at);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status);
+CREATE TABLE IF NOT EXISTS nodes (
+    repo_id TEXT NOT NULL,
+    path TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    grp TEXT,
+    churn BIGINT,
+    PRIMARY KEY (repo_id, path)
+);
+CREATE TABLE IF NOT EXISTS edges (
+    repo_id TEXT NOT NULL,
+    source TEXT NOT NULL,
+    target TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (repo_id, source, target)
+);
+CREATE INDEX IF NOT EXISTS edges_target ON edges (repo_id, target);
+CREATE TABLE IF NOT EXISTS sections (
+    repo_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    data {blob} NOT NULL,
+    PRIMARY KEY (repo_id, name)
+);
+"""
+
+class SQLStore:
+    """
+    Durable copy of repositories, jobs and analysis results in PostgreSQL,
+    or in SQLite as a local stand-in ("sqlite:///path/to.db"). Graphs are
+    stored normalized, a row per node and per edge, and loaded in bulk (COPY
+    on PostgreSQL, executemany on SQLite); the other sections are kept as the
+    encoded blobs Redis holds. Redis stays the store requests are served
+    from; this is what it falls back to on a miss.
+    """
+    def __init__(self, url: str, pool_size: int = 10):
+        self.sqlite = url.startswith("sqlite:")
+        self.url = url
+        self.pool_size = pool_size
+        self._pool = None
+        # The pool raises rather than waits when every connection is out;
+        # this makes callers wait for one instead
+        self._slots = threading.BoundedSemaphore(pool_size)
+        # SQLite connections cannot be shared between threads; one per thread
+        self._local = threading.local()
+        # Reentrant: the schema is created under it, opening the pool
+        self._lock = threading.RLock()
+        self._ready = False
+
+    def _open(self):
+        if self.sqlite:
+            connection = getattr(self._local, "connection", None)
+            if connection is None:
+                connection = sqlite3.connect(self.url.split(":///", 1)[1], timeout=30)
+                connection.execute("PRAGMA journal_mode=WAL")
+                self._local.connection = connection
+            return connection
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    # Imported here so the SQLite stand-in runs without the driver
+                    from psycopg2.pool import ThreadedConnectionPool
+                    self._pool = ThreadedConnectionPool(1, self.pool_size, dsn=self.url)
+        self._slots.acquire()
+        try:
+            return self._pool.getconn()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _close(self, connection):
+        if not self.sqlite:
+            try:
+                self._pool.putconn(connection)
+            finally:
+                self._slots.release()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[Any]:
+        """
+        A cursor in a transaction, committed when the block exits. The
+        schema is created on first use.
+        """
+        if not self._ready:
+            with self._lock:
+                if not self._ready:
+                    self._create_schema()
+                    self._ready = True
+        connection = self._open()
+        cursor = connection.cursor()
+        try:
+            yield cursor
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            cursor.close()
+            self._close(connection)
+
+    def _create_schema(self):
+        ddl = SCHEMA.format(json="TEXT" if self.sqlite else "JSONB", blob="BLOB" if self.sqlite else "BYTEA")
+        connection = self._open()
+        try:
+            if self.sqlite:
+                connection.executescript(ddl)
+            else:
+                with connection.cursor() as cursor:
+                    cursor.execute(ddl)
+            connection.commit()
+        finally:
+            self._close(connection)
+
+    def _sql(self, statement: str) -> str:
+        # Statements are written with %s placeholders; SQLite's are ?
+        return statement.replace("%s", "?") if self.sqlite else statement
+
+    def _upsert(self, cursor, table: str, columns: Sequence[str], values: Sequence[Any]):
+        updates = ", ".join(f"{column} = excluded.{column}" for column in columns[1:])
+        cursor.execute(self._sql(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))}) "
+            f"ON CONFLICT ({columns[0]}) DO UPDATE SET {updates}"
+        ), values)
+
+    def _bulk_insert(self, cursor, table: str, columns: Sequence[str], rows: List[Sequence[Any]]):
+        """
+        Inserts many rows at once: COPY on PostgreSQL, executemany on SQLite.
+        """
+        if not rows:
+            return
+        if self.sqlite:
+            cursor.executemany(
+                f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['?'] * len(columns))})", rows,
+            )
+            return
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write("\t".join(_copy_value(value) for value in row))
+            buffer.write("\n")
+        buffer.seek(0)
+        cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer)
+
+    def save_repo(self, record: Dict[str, Any]):
+        with self._transaction() as cursor:
+            self._save_repo(cursor, record)
+
+    def _save_repo(self, cursor, record: Dict[str, Any]):
+        self._upsert(cursor, "repos", REPO_COLUMNS + ("record",), [record.get(column) for column in REPO_COLUMNS] + [json.dumps(record)])
+
+    def save_job(self, job: Dict[str, Any]):
+        with self._transaction() as cursor:
+            self._upsert(cursor, "jobs", JOB_COLUMNS + ("record",), [job.get(column) for column in JOB_COLUMNS] + [json.dumps(job)])
+
+    def delete_job(self, job_id: str):
+        with self._transaction() as cursor:
+            cursor.execute(self._sql("DELETE FROM jobs WHERE id = %s"), (job_id,))
+
+    def save_analysis(self, record: Dict[str, Any], sections: Dict[str, bytes], graph: Optional[CompactGraph] = None):
+        """
+        Stores an analyzed repository in one transaction: its record, the
+        given encoded sections (graph excluded), and, if given, its graph,
+        replacing the stored nodes and edges.
+        """
+        repo_id = record["id"]
+        with self._transaction() as cursor:
+            self._save_repo(cursor, record)
+            for name, data in sections.items():
+                if name == "graph":
+                    continue
+                cursor.execute(self._sql("DELETE FROM sections WHERE repo_id = %s AND name = %s"), (repo_id, name))
+                cursor.execute(self._sql("INSERT INTO sections (repo_id, name, data) VALUES (%s, %s, %s)"), (repo_id, name, data))
+            if graph is not None:
+                cursor.execute(self._sql("DELETE FROM nodes WHERE repo_id = %s"), (repo_id,))
+                cursor.execute(self._sql("DELETE FROM edges WHERE repo_id = %s"), (repo_id,))
+                paths = graph.paths
+                self._bulk_insert(cursor, "nodes", ("repo_id", "path", "position", "grp", "churn"), [
+                    (repo_id, path, position, graph.groups[group], churn)
+                    for position, (path, group, churn) in enumerate(zip(paths, graph.group.tolist(), graph.churn.tolist()))
+                ])
+                self._bulk_insert(cursor, "edges", ("repo_id", "source", "target", "position"), [
+                    (repo_id, paths[source], paths[target], position)
+                    for position, (source, target) in enumerate(zip(graph.sources.tolist(), graph.targets.tolist()))
+                ])
+
+    def load_repo(self, repo_id: Optional[str] = None, owner: Optional[str] = None, name: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        A repository record, by id or by owner and name.
+        """
+        with self._transaction() as cursor:
+            if repo_id is not None:
+                cursor.execute(self._sql("SELECT record FROM repos WHERE id = %s"), (repo_id,))
+            else:
+                cursor.execute(self._sql("SELECT record FROM repos WHERE owner = %s AND name = %s"), (owner, name))
+            row = cursor.fetchone()
+        return _json(row[0]) if row else None
+
+    def load_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._transaction() as cursor:
+            cursor.execute(self._sql("SELECT record FROM jobs WHERE id = %s"), (job_id,))
+            row = cursor.fetchone()
+        return _json(row[0]) if row else None
+
+    def load_sections(self, repo_id: str, names: Iterable[str]) -> Dict[str, Any]:
+        """
+        The stored sections among `names`: the graph rebuilt from its nodes
+        and edges, the others as encoded blobs. Missing ones are left out.
+        """
+        names = list(names)
+        loaded: Dict[str, Any] = {}
+        with self._transaction() as cursor:
+            blobs = [name for name in names if name != "graph"]
+            if blobs:
+                cursor.execute(
+                    self._sql(f"SELECT name, data FROM sections WHERE repo_id = %s AND name IN ({', '.join(['%s'] * len(blobs))})"),
+                    [repo_id] + blobs,
+                )
+                loaded.update({name: bytes(data) for name, data in cursor.fetchall()})
+            if "graph" in names:
+                cursor.execute(self._sql("SELECT path, grp, churn FROM nodes WHERE repo_id = %s ORDER BY position"), (repo_id,))
+                nodes = [{"id": path, "group": group, "size": churn} for path, group, churn in cursor.fetchall()]
+                cursor.execute(self._sql("SELECT source, target FROM edges WHERE repo_id = %s ORDER BY position"), (repo_id,))
+                links = [{"source": source, "target": target} for source, target in cursor.fetchall()]
+                if nodes:
+                    loaded["graph"] = {"nodes": nodes, "links": links}
+        return loaded
+
+def _json(value: Any) -> Dict[str, Any]:
+    # JSONB columns come back decoded, TEXT ones as strings
+    return json.loads(value) if isinstance(value, str) else value
+
+def _copy_value(value: Any) -> str:
+    """
+    Formats a value for COPY's text format.
+    """
+    if value is None:
+        return "\\N"
+    text = str(value)
+    return text.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+def open_store(url: Optional[str], pool_size: int = 10) -> Optional[SQLStore]:
+    """
+    The store configured by `url`, or None for Redis only.
+    """
+    if not url:
+        return None
+    if url.startswith("postgres://"):
+        # psycopg2 only knows the postgresql:// scheme some hosts shorten
+        url = "postgresql://" + url[len("postgres://"):]
+    return SQLStore(url, pool_size)
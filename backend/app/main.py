@@ -1,9 +1,44 @@
-from fastapi import FastAPI, APIRouter
+import time
+from contextlib import asynccontextmanager
+import redis.asyncio
+from fastapi import FastAPI, APIRouter, Request, Response
+from starlette.concurrency import run_in_threadpool
 from starlette.middleware.cors import CORSMiddleware
+from starlette.middleware.gzip import GZipMiddleware
 
-from app.api import health, analyze, status, results, history
+from app.api import health, analyze, status, results, history, queues
+from app.config import settings
+from app.core.async_db_client import AsyncDBClient
+from app.core.async_github_client import AsyncGitHubClient
+from app.core.db_client import db_client
+from app.core.job_events import JobEventBroker
+from app.core.instrumentation import HTTP_SECONDS, instrument_redis, render_metrics
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Creates the async Redis pool and GitHub client the request handlers share.
+    """
+    # Requests wait for a free connection instead of failing when the pool is busy
+    pool = redis.asyncio.BlockingConnectionPool.from_url(settings.REDIS_URL, max_connections=settings.API_REDIS_MAX_CONNECTIONS)
+    redis_client = instrument_redis(redis.asyncio.Redis(connection_pool=pool))
+    # Shares the worker-side client's SQL store (and its connection pool)
+    app.state.db = AsyncDBClient(redis_client, db_client.store)
+    app.state.github = AsyncGitHubClient(redis_client)
+    # Pub/sub holds its connection for good, so it gets one outside the pool
+    app.state.events = JobEventBroker(redis.asyncio.from_url(settings.REDIS_URL))
+    await app.state.events.start()
+    await run_in_threadpool(db_client.ensure_history_index)
+    await run_in_threadpool(db_client.ensure_retention_index)
+    try:
+        yield
+    finally:
+        await app.state.events.stop()
+        await app.state.events.redis_client.aclose()
+        await app.state.github.aclose()
+        await app.state.db.close()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -11,7 +46,21 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],  
+    expose_headers=["X-Next-Cursor", "ETag", "Last-Modified"],
 )
+# Graphs compress well; small responses are not worth the CPU
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+@app.middleware("http")
+async def record_latency(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template, not raw path, to keep the series bounded
+    route = request.scope.get("route")
+    HTTP_SECONDS.labels(
+        request.method, route.path if route else "unmatched", str(response.status_code)
+    ).observe(time.perf_counter() - started)
+    return response
 
 api_v1_router = APIRouter(prefix="/api/v1")
 
@@ -20,9 +69,18 @@ api_v1_router.include_router(analyze.router)
 api_v1_router.include_router(status.router)
 api_v1_router.include_router(results.router)
 api_v1_router.include_router(history.router)
+api_v1_router.include_router(queues.router)
 
 app.include_router(api_v1_router)
 
 @app.get("/")
 def read_root():
     return {"message": "Welcome to the internet"}
+
+@app.get("/metrics")
+def metrics():
+    """
+    Prometheus metrics of the API process(es).
+    """
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from app.core.graph_builder import GraphBuilder
+
+def _two_modules_in_one_directory():
+    """
+    Two 20-file modules in a flat src/, densely importing within themselves
+    and joined by a single import.
+    """
+    rng = np.random.default_rng(1)
+    dependencies = []
+    for module in ("a", "b"):
+        for i in range(20):
+            for j in rng.choice(20, 4, replace=False):
+                if i != j:
+                    dependencies.append({"source": f"src/{module}{i}.py", "target": f"src/{module}{j}.py"})
+    dependencies.append({"source": "src/a0.py", "target": "src/b0.py"})
+    tree = [{"path": f"src/{module}{i}.py", "type": "blob"} for module in ("a", "b") for i in range(20)]
+    return tree, dependencies
+
+@pytest.mark.parametrize("seed_directories", [False, True])
+def test_splits_a_directory_holding_two_modules(seed_directories):
+    tree, dependencies = _two_modules_in_one_directory()
+    builder = GraphBuilder(tree, {}, dependencies)
+    clusters = builder.generate_clusters(seed_directories=seed_directories)
+
+    assert sorted(sorted({path[4] for path in files}) for files in clusters.values()) == [["a"], ["b"]]
+    assert builder.community_stats["modularity"] > 0.4
+    assert builder.community_stats["directory_modularity"] == 0.0
+
+def test_directory_seeding_is_kept_when_it_scores_as_well():
+    # Two directories that are also the two modules
+    tree, dependencies = _two_modules_in_one_directory()
+    rename = lambda path: path.replace("src/", "src/a/") if path.startswith("src/a") else path.replace("src/", "src/b/")
+    tree = [{**item, "path": rename(item["path"])} for item in tree]
+    dependencies = [{"source": rename(dep["source"]), "target": rename(dep["target"])} for dep in dependencies]
+    builder = GraphBuilder(tree, {}, dependencies)
+    clusters = builder.generate_clusters(seed_directories=True)
+
+    assert sorted(clusters) == ["src/a", "src/b"]
+    assert builder.community_stats["seeded_from_directories"] is True
@@ -0,0 +1,33 @@
+import time
+
+from app.core.github_client import GitHubClient
+
+def test_map_stays_a_bounded_distance_ahead_of_its_consumer():
+    client = GitHubClient(token="", max_concurrency=3)
+    taken = []
+
+    def items():
+        for i in range(100):
+            taken.append(i)
+            yield i
+
+    results = []
+    for item, result, error in client._map(lambda i: i * 2, items()):
+        # A slow consumer: the calls must not run through the whole input
+        time.sleep(0.001)
+        # (the item at hand, plus the calls submitted ahead of it)
+        assert len(taken) - len(results) <= 2 * client.max_concurrency + 1
+        results.append((item, result, error))
+
+    assert sorted(results) == [(i, 2 * i, None) for i in range(100)]
+
+def test_map_yields_errors_with_their_items():
+    client = GitHubClient(token="", max_concurrency=2)
+
+    def fail_odd(i):
+        if i % 2:
+            raise ValueError(i)
+        return i
+
+    errors = {item: error for item, _, error in client._map(fail_odd, range(6)) if error}
+    assert sorted(errors) == [1, 3, 5] and all(isinstance(error, ValueError) for error in errors.values())
@@ -0,0 +1,29 @@
+from app.core.graph_builder import GraphBuilder
+from app.core.graph_hierarchy import build_views
+
+def _package():
+    tree = [{"path": path, "type": "blob"} for path in ("pkg/__init__.py", "pkg/a.py", "pkg/b.py", "main.py")]
+    dependencies = [
+        # `from . import a` in pkg/__init__.py resolves to the package itself
+        {"source": "pkg/__init__.py", "target": "pkg/__init__.py"},
+        {"source": "pkg/__init__.py", "target": "pkg/a.py"},
+        {"source": "pkg/a.py", "target": "pkg/b.py"},
+        {"source": "main.py", "target": "pkg/__init__.py"},
+    ]
+    return tree, dependencies
+
+def test_builder_drops_self_imports():
+    tree, dependencies = _package()
+    builder = GraphBuilder(tree, {}, dependencies)
+    assert {"source": "pkg/__init__.py", "target": "pkg/__init__.py"} not in builder.edges
+    assert len(builder.edges) == 3
+
+def test_views_skip_self_imports_in_stored_graphs():
+    tree, dependencies = _package()
+    graph = {"nodes": [{"id": item["path"], "size": 1} for item in tree], "links": dependencies}
+    views = build_views(graph, {"pkg": ["pkg/__init__.py", "pkg/a.py", "pkg/b.py"]})
+
+    directory = views["directory"]
+    assert directory[""]["links"] == [["main.py", "pkg", 1]]
+    assert sorted(map(tuple, directory["pkg"]["links"])) == [("pkg/__init__.py", "pkg/a.py", 1), ("pkg/a.py", "pkg/b.py", 1)]
+    assert views["cluster"][""]["links"] == [["(unclustered)", "pkg", 1]]
@@ -0,0 +1,40 @@
+from app.core.graph_builder import GraphBuilder
+from app.core.import_parser import ImportParser
+from app.core.incremental import IncrementalAnalysis
+from app.core.module_resolver import ModuleResolver
+from app.core.pipeline import AnalysisPipeline, PipelineProgress
+
+def _tree(*paths):
+    return [{"path": path, "type": "blob", "sha": f"sha-{path}"} for path in paths]
+
+def test_re_resolves_only_imports_that_did_not_resolve():
+    old_tree = _tree("a/main.py", "a/util.py", "a/c.py")
+    new_tree = _tree("a/main.py", "a/util.py", "a/c.py", "a/newmod.py")
+    previous = {"graph": {"links": [{"source": "a/main.py", "target": "a/util.py"}]}}
+    incremental = IncrementalAnalysis(previous, old_tree, new_tree, {"a/c.py": ["./newmod", "os"], "a/main.py": ["sys"]})
+
+    builder = GraphBuilder(new_tree, {}, incremental.carried_dependencies())
+    pipeline = AnalysisPipeline(ImportParser(None), ModuleResolver(new_tree), builder, PipelineProgress())
+    pipeline.resolve(incremental.carried_unresolved())
+
+    assert sorted((edge["source"], edge["target"]) for edge in builder.edges) == [
+        ("a/c.py", "a/newmod.py"), ("a/main.py", "a/util.py"),
+    ]
+    assert builder.unresolved == {"a/c.py": ["os"], "a/main.py": ["sys"]}
+
+def test_importers_of_deleted_files_are_not_carried():
+    old_tree = _tree("a/main.py", "a/gone.py", "a/other.py", "a/changed.py")
+    new_tree = _tree("a/main.py", "a/other.py") + [{"path": "a/changed.py", "type": "blob", "sha": "new"}]
+    previous = {"graph": {"links": [
+        {"source": "a/main.py", "target": "a/gone.py"},
+        {"source": "a/changed.py", "target": "a/gone.py"},
+        {"source": "a/other.py", "target": "a/main.py"},
+    ]}}
+    incremental = IncrementalAnalysis(previous, old_tree, new_tree, {"a/main.py": ["os"], "a/other.py": ["sys"], "a/changed.py": ["re"]})
+
+    assert incremental.orphaned_files() == {"a/main.py"}
+    assert incremental.carried_unresolved() == {"a/other.py": ["sys"]}
+
+def test_results_stored_without_unresolved_imports_carry_none():
+    tree = _tree("a.py")
+    assert IncrementalAnalysis({"graph": {"links": []}}, tree, tree).carried_unresolved() is None
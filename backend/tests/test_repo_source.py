@@ -0,0 +1,102 @@
+import subprocess
+import tarfile
+
+import pytest
+
+from app.core.graph_builder import GraphBuilder
+from app.core.metrics import Metrics
+from app.core.repo_source import GitCloneSource, RepositorySource
+
+def _commit(repo, author, files):
+    for path, content in files.items():
+        target = repo / path
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_text(content)
+    subprocess.run(["git", "-C", str(repo), "add", "-A"], check=True)
+    subprocess.run(
+        ["git", "-C", str(repo), "-c", f"user.name={author}", "-c", f"user.email={author}@example.com",
+         "commit", "-q", "-m", f"change by {author}"],
+        check=True,
+    )
+
+@pytest.fixture
+def origin(tmp_path):
+    repo = tmp_path / "origin"
+    repo.mkdir()
+    subprocess.run(["git", "init", "-q", "-b", "main", str(repo)], check=True)
+    # Serve partial clones, as GitHub does
+    subprocess.run(["git", "-C", str(repo), "config", "uploadpack.allowFilter", "true"], check=True)
+    _commit(repo, "ada", {"app/main.py": "from app import util\n", "app/util.py": "x = 1\n"})
+    _commit(repo, "bob", {"app/util.py": "x = 1\ny = 2\nz = 3\n", "README.md": "hello\n"})
+    return repo
+
+@pytest.fixture
+def source(origin, tmp_path):
+    return GitCloneSource(f"file://{origin}", cache_dir=str(tmp_path / "cache"), depth=None, clone_filter="blob:none")
+
+def test_repository_source_is_abstract():
+    with pytest.raises(TypeError):
+        RepositorySource()
+
+def test_reads_head_tree_and_contents(source, origin):
+    head = source.get_head("o", "r")
+    assert head["branch"] == "main"
+    assert head["commit_sha"] == subprocess.run(
+        ["git", "-C", str(origin), "rev-parse", "HEAD"], check=True, capture_output=True, text=True,
+    ).stdout.strip()
+
+    tree = source.get_file_tree("o", "r")
+    assert sorted(item["path"] for item in tree) == ["README.md", "app/main.py", "app/util.py"]
+    assert all(item["type"] == "blob" and item["sha"] for item in tree)
+
+    assert source.get_file_content("o", "r", "app/main.py") == "from app import util\n"
+    contents = dict(source.iter_file_contents("o", "r", ["app/util.py", "missing.py"]))
+    assert contents == {"app/util.py": "x = 1\ny = 2\nz = 3\n", "missing.py": None}
+
+def test_archive_stream_holds_the_tree(source):
+    stream = source.get_archive_stream("o", "r")
+    with tarfile.open(fileobj=stream.raw, mode="r|") as archive:
+        names = [member.name for member in archive if member.isfile()]
+    stream.close()
+    assert sorted(names) == ["r/README.md", "r/app/main.py", "r/app/util.py"]
+
+def test_history_gives_real_churn(source):
+    history = source.get_file_history("o", "r")
+    # util.py: 1 line added, then 2 added (3 lines changed in total)
+    assert history["app/util.py"]["churn"] == 3
+    assert history["app/util.py"]["commits"] == 2
+    assert history["app/util.py"]["authors"] == 2
+    assert history["app/main.py"] == {"churn": 1, "commits": 1, "authors": 1, "last_modified": history["app/main.py"]["last_modified"]}
+
+    tree = source.get_file_tree("o", "r")
+    churn = Metrics(tree, history).calculate_churn()
+    assert churn == {"README.md": 1, "app/main.py": 1, "app/util.py": 3}
+
+    builder = GraphBuilder(tree, churn, [{"source": "app/main.py", "target": "app/util.py"}])
+    graph = builder.build_synapse_graph()
+    assert {node["id"]: node["size"] for node in graph["nodes"]} == churn
+    assert graph["links"] == [{"source": "app/main.py", "target": "app/util.py"}]
+
+def test_fetches_into_an_existing_clone(source, origin, tmp_path):
+    source.get_head("o", "r")
+    _commit(origin, "ada", {"app/new.py": "import app.util\n"})
+    # A new task syncs the cached clone instead of cloning again
+    later = GitCloneSource(f"file://{origin}", cache_dir=str(tmp_path / "cache"), depth=None, clone_filter="blob:none")
+    assert "app/new.py" in {item["path"] for item in later.get_file_tree("o", "r")}
+    assert later.get_file_content("o", "r", "app/new.py") == "import app.util\n"
+
+def test_history_fetches_its_blobs_in_one_request(source, origin, tmp_path):
+    for i in range(5):
+        _commit(origin, "ada", {"app/util.py": f"x = {i}\n", f"app/m{i}.py": "pass\n"})
+    source.sync()
+    # Count the requests the clone makes to origin from here on
+    calls = tmp_path / "upload-pack.calls"
+    wrapper = tmp_path / "upload-pack"
+    wrapper.write_text(f'#!/bin/sh\necho >> "{calls}"\nexec git-upload-pack "$@"\n')
+    wrapper.chmod(0o755)
+    subprocess.run(["git", "--git-dir", source.path, "config", "remote.origin.uploadpack", str(wrapper)], check=True)
+
+    history = source.get_file_history("o", "r")
+    assert history["app/util.py"]["commits"] == 7
+    # One batched fetch, rather than a lazy fetch per commit
+    assert len(calls.read_text().splitlines()) == 1
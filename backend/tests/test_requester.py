@@ -0,0 +1,26 @@
+import pytest
+from starlette.requests import Request
+
+from app.api.dependencies import get_requester
+from app.config import settings
+
+def _request(forwarded=None, peer="10.0.0.1"):
+    headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded is not None else []
+    return Request({"type": "http", "headers": headers, "client": (peer, 1234)})
+
+def test_uses_the_peer_without_proxies():
+    assert get_requester(_request("1.2.3.4")) == "10.0.0.1"
+
+@pytest.mark.parametrize("forwarded, requester", [
+    ("1.2.3.4", "1.2.3.4"),
+    # A client can prepend whatever it likes; the proxy's entry is last
+    ("6.6.6.6, 1.2.3.4", "1.2.3.4"),
+    (None, "10.0.0.1"),
+])
+def test_reads_the_entry_the_proxy_appended(monkeypatch, forwarded, requester):
+    monkeypatch.setattr(settings, "TRUSTED_PROXY_HOPS", 1)
+    assert get_requester(_request(forwarded)) == requester
+
+def test_counts_hops_from_the_end(monkeypatch):
+    monkeypatch.setattr(settings, "TRUSTED_PROXY_HOPS", 2)
+    assert get_requester(_request("6.6.6.6, 1.2.3.4, 172.16.0.1")) == "1.2.3.4"
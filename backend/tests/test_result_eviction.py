@@ -0,0 +1,109 @@
+import fakeredis
+import pytest
+import redis
+
+from app.config import settings
+from app.core import db_client as db_module
+from app.core.db_client import RESULT_READS, RESULT_SIZES, RESULTS_BYTES, DBClient
+
+GRAPH = {"nodes": [{"id": "a.py", "group": "", "size": 1}], "links": []}
+
+@pytest.fixture
+def db(monkeypatch):
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(redis, "from_url", lambda url, **kwargs: fakeredis.FakeRedis(server=server))
+    monkeypatch.setattr(settings, "RESULT_IDLE_TTL", 60)
+    return DBClient("redis://fake")
+
+def _idle_result(db, name):
+    repo_id = db.create_repo("o", name, True)["id"]
+    db.store_analysis_result(repo_id, {"graph": GRAPH, "commit_sha": "c1"})
+    db.redis_client.zadd(RESULT_READS, {repo_id: 1})
+    return repo_id
+
+def test_evicts_idle_results(db):
+    repo_id = _idle_result(db, "r")
+
+    assert db.evict_results() == [repo_id]
+    assert db.get_repo_by_id(repo_id, fields=[]).get("evicted")
+    assert not db.redis_client.exists(f"repo_data:{repo_id}")
+
+def test_keeps_a_result_stored_before_it_is_evicted(db, monkeypatch):
+    repo_id = _idle_result(db, "r")
+    evict_result = db._evict_result
+
+    def store_first(*args):
+        db.store_analysis_result(repo_id, {"graph": GRAPH, "commit_sha": "c2"})
+        return evict_result(*args)
+
+    monkeypatch.setattr(db, "_evict_result", store_first)
+    assert db.evict_results() == []
+    record = db.get_repo_by_id(repo_id)
+    assert record["commit_sha"] == "c2" and not record.get("evicted")
+    assert record["graph"]["nodes"][0]["id"] == "a.py"
+
+def test_keeps_a_result_stored_while_it_is_evicted(db, monkeypatch):
+    repo_id = _idle_result(db, "r")
+    pipeline = db.redis_client.pipeline
+
+    def racing_pipeline(*args, **kwargs):
+        pipe = pipeline(*args, **kwargs)
+        get = pipe.get
+
+        def store_then_get(key):
+            # Lands between the eviction's WATCH and its MULTI
+            db.store_analysis_result(repo_id, {"graph": GRAPH, "commit_sha": "c2"})
+            return get(key)
+
+        pipe.get = store_then_get
+        return pipe
+
+    monkeypatch.setattr(db.redis_client, "pipeline", racing_pipeline)
+    assert db.evict_results() == []
+    monkeypatch.undo()
+    record = db.get_repo_by_id(repo_id)
+    assert record["commit_sha"] == "c2" and not record.get("evicted")
+    assert db.redis_client.exists(f"repo_data:{repo_id}")
+
+def _total(db):
+    return int(db.redis_client.get(RESULTS_BYTES) or 0)
+
+def _sizes(db):
+    return sum(size for _, size in db.redis_client.zrange(RESULT_SIZES, 0, -1, withscores=True))
+
+def test_keeps_a_running_total_of_the_result_sizes(db):
+    repo_id = _idle_result(db, "r")
+    other = db.create_repo("o", "s", True)["id"]
+    db.store_analysis_result(other, {"graph": GRAPH, "metrics": {"files": 1}, "commit_sha": "c1"})
+    # Storing again replaces a result's size rather than adding to it
+    db.store_analysis_result(other, {"graph": GRAPH, "metrics": {"files": 2}, "commit_sha": "c2"})
+    assert _total(db) == _sizes(db) > 0
+
+    db.evict_results()
+    assert db.redis_client.zscore(RESULT_SIZES, repo_id) is None
+    assert _total(db) == _sizes(db) > 0
+
+def test_evicts_the_least_recently_read_until_within_budget(db, monkeypatch):
+    monkeypatch.setattr(db_module, "EVICTION_BATCH", 2)
+    repo_ids = []
+    for i in range(5):
+        repo_id = db.create_repo("o", f"r{i}", True)["id"]
+        db.store_analysis_result(repo_id, {"graph": GRAPH, "commit_sha": "c1"})
+        db.redis_client.zadd(RESULT_READS, {repo_id: 10**10 + i})
+        repo_ids.append(repo_id)
+    size = _total(db) // 5
+    monkeypatch.setattr(settings, "RESULT_PAYLOAD_BUDGET", 2 * size)
+
+    assert db.evict_results(keep=repo_ids[0]) == repo_ids[1:4]
+    assert _total(db) == 2 * size
+
+def test_counts_the_results_tracked_before_the_total(db):
+    _idle_result(db, "r")
+    db.redis_client.delete(RESULTS_BYTES)
+
+    db.ensure_retention_index()
+    assert _total(db) == _sizes(db) > 0
+    # Only once
+    db.redis_client.incrby(RESULTS_BYTES, 5)
+    db.ensure_retention_index()
+    assert _total(db) == _sizes(db) + 5
@@ -0,0 +1,96 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import fakeredis
+import pytest
+import redis
+
+from app.core.async_db_client import AsyncDBClient
+from app.core.compact_graph import CompactGraph
+from app.core.db_client import DBClient
+from app.core.sql_store import SQLStore, open_store
+
+# Paths COPY's text format has to escape
+PATHS = ["src/a.py", "src/tab\there.py", "src/back\\slash.py", "src/new\nline.py", "src/ünï.py", "src/\\N.py"]
+
+@pytest.fixture(params=["sqlite", "postgresql"])
+def store(request, tmp_path):
+    if request.param == "sqlite":
+        return SQLStore(f"sqlite:///{tmp_path / 'store.db'}", pool_size=2)
+    # PostgreSQL runs the COPY path; point TEST_DATABASE_URL at a scratch database
+    url = os.environ.get("TEST_DATABASE_URL")
+    if not url:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    store = open_store(url, pool_size=2)
+    with store._transaction() as cursor:
+        cursor.execute("TRUNCATE repos, jobs, nodes, edges, sections")
+    return store
+
+def _graph(paths=PATHS):
+    return CompactGraph.build(
+        paths, {paths[0]: "core"}, {path: i for i, path in enumerate(paths)},
+        list(range(len(paths) - 1)), list(range(1, len(paths))),
+    )
+
+def _record(repo_id="r1", commit_sha="c1"):
+    return {"id": repo_id, "owner": "o", "name": repo_id, "is_public": True, "commit_sha": commit_sha, "last_analyzed": "2024-01-01"}
+
+def test_round_trips_an_analysis(store):
+    store.save_analysis(_record(), {"graph": b"ignored", "metrics": b"\x00\x01metrics"}, _graph())
+
+    assert store.load_repo(repo_id="r1")["commit_sha"] == "c1"
+    assert store.load_repo(owner="o", name="r1")["id"] == "r1"
+    loaded = store.load_sections("r1", ["graph", "metrics", "narrative"])
+    assert loaded["metrics"] == b"\x00\x01metrics"
+    assert "narrative" not in loaded
+    assert loaded["graph"] == _graph().to_graph()
+
+def test_replaces_the_stored_graph(store):
+    store.save_analysis(_record(), {}, _graph())
+    store.save_analysis(_record(commit_sha="c2"), {}, _graph(["x.py", "y.py"]))
+
+    assert store.load_repo(repo_id="r1")["commit_sha"] == "c2"
+    assert store.load_sections("r1", ["graph"])["graph"] == _graph(["x.py", "y.py"]).to_graph()
+
+def test_saves_and_deletes_jobs(store):
+    store.save_job({"id": "j1", "repo_id": "r1", "status": "pending"})
+    store.save_job({"id": "j1", "repo_id": "r1", "status": "completed"})
+    assert store.load_job("j1")["status"] == "completed"
+
+    store.delete_job("j1")
+    assert store.load_job("j1") is None
+
+def test_api_deletes_the_rows_of_jobs_it_drops(store):
+    db = AsyncDBClient(fakeredis.FakeAsyncRedis(), store=store)
+
+    async def create_and_delete():
+        job = await db.create_job("r1")
+        await db.delete_job(job["id"])
+        return job["id"]
+
+    assert store.load_job(asyncio.run(create_and_delete())) is None
+
+def test_waits_for_a_connection_when_all_are_in_use(store):
+    def save(i):
+        store.save_analysis(_record(f"r{i}"), {"metrics": b"m"}, _graph())
+        return store.load_sections(f"r{i}", ["graph"])["graph"]
+
+    # More threads than the pool has connections
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        graphs = list(pool.map(save, range(16)))
+    assert graphs == [_graph().to_graph()] * 16
+
+def test_redis_reads_through_to_the_store(store, monkeypatch):
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(redis, "from_url", lambda url, **kwargs: fakeredis.FakeRedis(server=server))
+    db = DBClient("redis://fake", store=store)
+    repo_id = db.create_repo("o", "r", True)["id"]
+    graph = {"nodes": [{"id": "a.py", "group": "", "size": 1}, {"id": "b.py", "group": "", "size": 2}], "links": [{"source": "a.py", "target": "b.py"}]}
+    db.store_analysis_result(repo_id, {"graph": graph, "metrics": {"files": 2}, "commit_sha": "c1"})
+
+    db.redis_client.flushall()
+    restored = db.get_repo_by_id(repo_id)
+    assert restored["commit_sha"] == "c1"
+    assert restored["graph"] == graph
+    assert restored["metrics"] == {"files": 2}
@@ -1,20 +1,33 @@
 from app.core.import_parser import ImportParser
 import os
 import sys
-from celery import Celery
+from celery import Celery, chord
+from celery.signals import worker_init
 
 # Add the project root to the python path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from app.config import settings
 from app.core.github_client import GitHubClient
+from app.core.admission import LARGE_QUEUE, SMALL_QUEUE, choose_queue, in_flight_ttl, queue_options, tree_cost
+from app.core.rate_limiter import RateLimitExceeded
 from app.core.metrics import Metrics
 from app.core.graph_builder import GraphBuilder
+from app.core.graph_analytics import GraphAnalytics, centrality_scores
+from app.core.graph_hierarchy import build_views
+from app.core.graph_index import GraphIndex
 from app.core.narrative import Narrative
 from app.core.llm_client import LLMClient
-from app.core.db_client import db_client
+from app.core.db_client import JOB_FINAL_STATUSES, db_client
+from app.core.parse_cache import ParseCache
+from app.core.incremental import IncrementalAnalysis
+from app.core.repo_source import GitCloneSource
+from app.core.pipeline import AnalysisPipeline, PipelineProgress
+from app.core.instrumentation import ANALYSES, QUEUE_WAIT_SECONDS, clear_multiprocess_dir, start_exporter
 
 import ssl
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
 
 celery_app = Celery(
     "worker",
@@ -35,59 +48,206 @@ if settings.CELERY_BROKER_URL.startswith("rediss://"):
         redis_backend_use_ssl=ssl_conf,
     )
 
-from celery.exceptions import SoftTimeLimitExceeded
+# Analyses are sent to the small or large queue by /analyze; shards of a
+# large analysis stay on the large queue. Workers take one task at a time
+# so the priorities set for fairness decide what runs next.
+celery_app.conf.update(
+    task_default_queue=SMALL_QUEUE,
+    task_routes={
+        "worker.worker.parse_shard": {"queue": LARGE_QUEUE},
+        "worker.worker.reduce_analysis": {"queue": LARGE_QUEUE},
+    },
+    broker_transport_options={"priority_steps": list(range(10)), "queue_order_strategy": "priority"},
+    worker_prefetch_multiplier=1,
+)
+
+from celery.exceptions import Retry, SoftTimeLimitExceeded
+
+@worker_init.connect
+def _start_metrics_exporter(**kwargs):
+    """
+    Exposes the worker's Prometheus metrics on settings.WORKER_METRICS_PORT.
+    Tasks run (and record their metrics) in the pool processes, so unless
+    the worker runs tasks in-process (--pool=solo/threads) the exporter
+    needs PROMETHEUS_MULTIPROC_DIR to aggregate them; the worker image sets it.
+    """
+    if not settings.WORKER_METRICS_PORT:
+        return
+    if clear_multiprocess_dir() is None:
+        print("WARNING: PROMETHEUS_MULTIPROC_DIR is not set; metrics recorded by pool processes will not be exported")
+    if start_exporter(settings.WORKER_METRICS_PORT):
+        print(f"Serving worker metrics on port {settings.WORKER_METRICS_PORT}")
+
+def _open_source(owner: str, repo: str, kind: Optional[str] = None):
+    """
+    Returns the repository source of the given kind ("github" or "git"),
+    by default the one configured by settings.REPO_SOURCE.
+    """
+    if (kind or settings.REPO_SOURCE) == "git":
+        return GitCloneSource(f"https://github.com/{owner}/{repo}.git")
+    return GitHubClient(redis_client=db_client.redis_client)
 
 @celery_app.task(bind=True, soft_time_limit=300, time_limit=310)
-def analyze_repository(self, owner: str, repo: str, repo_id: str):
+def analyze_repository(self, owner: str, repo: str, repo_id: str, refresh: bool = False):
     """
     A Celery task to analyze a GitHub repository.
+    With refresh=True and a previous result built from a known tree, only the
+    files that changed since then are fetched and parsed. Repositories with
+    more than SHARD_MIN_FILES files left to parse are handed to parse_shard
+    tasks and finished by reduce_analysis. A job queued as small whose tree
+    turns out to be large is moved to the large queue.
     """
     print(f"Analyzing {owner}/{repo}")
     
     # Update job status to 'running'
-    db_client.update_job_status(self.request.id, "running")
+    job = db_client.update_job_status(self.request.id, "running") or {}
+    queue = job.get("queue", SMALL_QUEUE)
+    waited = db_client.start_queued_job(self.request.id, queue, job.get("requester"))
+    if waited is not None:
+        QUEUE_WAIT_SECONDS.labels(queue).observe(waited)
+    # The marker was set to outlast the wait in the queue; from here on it
+    # only needs to cover the run
+    db_client.extend_analysis(owner, repo, self.request.id, in_flight_ttl(queue))
 
+    progress = PipelineProgress(lambda snapshot: db_client.update_job(self.request.id, snapshot))
+    history_pool = ThreadPoolExecutor(max_workers=1)
+    outcome = "failed"
     try:
         # 1. Fetch data from GitHub
-        github_client = GitHubClient()
-        file_tree = github_client.get_file_tree(owner, repo)
+        progress.set_stage("fetching_tree")
+        github_client = _open_source(owner, repo)
+        # A local clone reads single blobs cheaply, so skip building an archive
+        import_source = "api" if settings.REPO_SOURCE == "git" else settings.IMPORT_SOURCE
+        head = github_client.get_head(owner, repo)
+        file_tree = github_client.get_file_tree(owner, repo, head["tree_sha"])
 
-        # 2. Parse imports to find dependencies
-        import_parser = ImportParser(github_client)
-        dependencies = import_parser.get_dependencies(owner, repo, file_tree)
+        previous = db_client.get_repo_by_id(repo_id, fields=[]) if refresh else None
+        if previous and previous.get("evicted"):
+            # Only the summary is left to build on
+            previous = None
+        incremental = None
+        if previous and previous.get("tree_sha") and previous.get("last_analyzed"):
+            if previous["tree_sha"] == head["tree_sha"]:
+                print(f"{owner}/{repo} is unchanged since {previous['commit_sha']}")
+                # Only the record is re-stamped; the stored sections are kept
+                analysis_data = {"job_id": self.request.id, **head}
+                hierarchy = index = None
+                has_hierarchy, has_index = db_client.has_graph_hierarchy(repo_id), db_client.has_graph_index(repo_id)
+                if not (has_hierarchy and has_index):
+                    # Analyzed before level-of-detail graphs or query indexes were stored
+                    stored = db_client.get_repo_by_id(repo_id, fields=["graph", "clusters"])
+                    if stored.get("graph"):
+                        if not has_hierarchy:
+                            hierarchy = build_views(stored["graph"], stored.get("clusters") or {})
+                        if not has_index:
+                            index = GraphIndex.from_graph(stored["graph"]).dump()
+                db_client.store_analysis_result(repo_id, {**analysis_data, "hierarchy": hierarchy, "index": index})
+                outcome = "unchanged"
+                return {"status": "completed", "result": analysis_data}
+            previous = db_client.get_repo_by_id(repo_id)
 
-        # 3. Calculate metrics
-        metrics_analyzer = Metrics(file_tree)
-        churn = metrics_analyzer.calculate_churn()
-        hotspots = metrics_analyzer.identify_hotspots(churn)
+        cost = tree_cost(file_tree)
+        db_client.set_repo_cost(repo_id, cost)
+        if queue == SMALL_QUEUE and choose_queue(cost) == LARGE_QUEUE:
+            # Queued on GitHub's size estimate; the tree says otherwise
+            print(f"{owner}/{repo} has {cost['files']} files, moving it to {LARGE_QUEUE}")
+            outcome = "rerouted"
+            db_client.update_job(self.request.id, {"status": "pending", "queue": LARGE_QUEUE})
+            db_client.requeue_job(self.request.id, LARGE_QUEUE)
+            db_client.extend_analysis(owner, repo, self.request.id, in_flight_ttl(LARGE_QUEUE, queued=True))
+            # Re-sent under the same task id, priority and retry count; unlike
+            # self.retry this does not use up one of its rate-limit deferrals
+            self.signature_from_request(**queue_options(LARGE_QUEUE)).apply_async()
+            return {"status": "rerouted"}
 
-        # 4. Build graph
-        graph_builder = GraphBuilder(file_tree, churn, dependencies)
-        graph = graph_builder.build_synapse_graph()
-        clusters = graph_builder.generate_clusters()
+        if previous and previous.get("tree_sha") and previous.get("graph"):
+            try:
+                old_tree = github_client.get_file_tree(owner, repo, previous["tree_sha"])
+            except Exception as e:
+                # e.g. a shallow clone no longer reaching the old tree
+                print(f"Previous tree of {owner}/{repo} unavailable, running a full analysis: {e}")
+                old_tree = None
+            if old_tree is not None:
+                incremental = IncrementalAnalysis(previous, old_tree, file_tree, db_client.get_unresolved_imports(repo_id))
+                db_client.update_job(self.request.id, {"diff": incremental.summary()})
 
-        # 5. Generate narrative
-        llm_client = LLMClient(api_key=settings.LLM_API_KEY)
-        summary = {"hotspots": hotspots, "clusters": clusters}
-        narrative_generator = Narrative(summary, llm_client)
-        story = narrative_generator.generate_story()
+        if incremental and len(incremental.changed_files()) > settings.SHARD_MIN_FILES:
+            # Too much changed for carrying edges over to pay off
+            incremental = None
+        if not incremental:
+            progress.set_stage("sharding")
+            shards = _dispatch_shards(self.request.id, owner, repo, repo_id, github_client, file_tree, head, import_source)
+            if shards:
+                print(f"Split {owner}/{repo} into {shards} parse shards")
+                outcome = "sharded"
+                return {"status": "sharded", "shards": shards}
 
-        # 6. Store results in DB
-        analysis_data = {
-            "job_id": self.request.id,
-            "graph": graph,
-            "metrics": {
-                "churn": churn,
-                "hotspots": hotspots,
-            },
-            "clusters": clusters,
-            "narrative": story,
-        }
-        db_client.store_analysis_result(repo_id, analysis_data)
+        # File history does not depend on the imports, so read it alongside them
+        file_history_future = history_pool.submit(github_client.get_file_history, owner, repo)
+
+        # 2. Parse imports, adding dependency edges to the graph as they resolve
+        parse_cache = ParseCache(db_client.redis_client)
+        import_parser = ImportParser(github_client, parse_cache)
+        resolver = import_parser.build_resolver(owner, repo, file_tree, head["commit_sha"])
+        graph_builder = GraphBuilder(file_tree, {}, incremental.carried_dependencies() if incremental else [])
+        pipeline = AnalysisPipeline(import_parser, resolver, graph_builder, progress)
+        if incremental:
+            changed = incremental.changed_files()
+            source = "api" if len(changed) <= settings.INCREMENTAL_API_MAX_FILES else import_source
+            pipeline.run(owner, repo, file_tree, source=source, ref=head["commit_sha"], only=changed)
+            carried = incremental.carried_unresolved()
+            if carried is not None:
+                # Only imports of unchanged files that resolved to nothing can
+                # reach an added file; re-resolve just those, fetching nothing.
+                # Files that imported a deleted one are resolved in full.
+                orphaned = incremental.orphaned_files()
+                if orphaned:
+                    _, uncached, _ = import_parser.plan(file_tree, orphaned)
+                    source = "api" if len(uncached) <= settings.INCREMENTAL_API_MAX_FILES else import_source
+                    pipeline.run(owner, repo, file_tree, source=source, ref=head["commit_sha"], only=orphaned)
+                pipeline.resolve(carried)
+            elif incremental.added:
+                # Stored without its unresolved imports: re-resolve every
+                # unchanged file from the parse cache, fetching the ones it
+                # has dropped, so their edges to the new files are not lost
+                unchanged = {item['path'] for item in file_tree if item['type'] == 'blob'} - changed
+                _, uncached, _ = import_parser.plan(file_tree, unchanged)
+                source = "api" if len(uncached) <= settings.INCREMENTAL_API_MAX_FILES else import_source
+                pipeline.run(owner, repo, file_tree, source=source, ref=head["commit_sha"], only=unchanged)
+            else:
+                # The unchanged files' unresolved imports are not known
+                graph_builder.unresolved = None
+        else:
+            pipeline.run(owner, repo, file_tree, source=import_source, ref=head["commit_sha"])
+        db_client.update_job(self.request.id, {
+            "parse_cache": parse_cache.stats(),
+            "parse_throughput": import_parser.throughput(),
+        })
+
+        analysis_data = _complete_analysis(
+            self.request.id, repo_id, file_tree, head, graph_builder, progress, file_history_future, incremental, previous,
+        )
+        outcome = "completed"
 
         return {"status": "completed", "result": analysis_data}
 
+    except Retry:
+        raise
+    except RateLimitExceeded as e:
+        if self.request.retries >= settings.RATE_LIMIT_MAX_DEFERRALS:
+            # Out of deferrals; fail for good so the marker is released
+            db_client.update_job_status(self.request.id, "failed")
+            print(f"Analysis failed for {owner}/{repo} after {self.request.retries} deferrals: {e}")
+            raise
+        # Wait for the shared quota to reset instead of failing halfway through
+        outcome = "deferred"
+        db_client.update_job_status(self.request.id, "deferred")
+        # Callers keep sharing this job while it waits to be retried
+        db_client.extend_analysis(owner, repo, self.request.id, int(e.retry_after) + settings.ANALYSIS_IN_FLIGHT_TTL)
+        print(f"Analysis deferred for {owner}/{repo}: {e}")
+        raise self.retry(exc=e, countdown=int(e.retry_after) + 1, max_retries=settings.RATE_LIMIT_MAX_DEFERRALS)
     except SoftTimeLimitExceeded:
+        outcome = "timed_out"
         db_client.update_job_status(self.request.id, "TIMED_OUT")
         print(f"Analysis timed out for {owner}/{repo}")
         raise
@@ -96,6 +256,262 @@ def analyze_repository(self, owner: str, repo: str, repo_id: str):
         print(f"Analysis failed for {owner}/{repo}: {e}")
         # Optionally re-raise the exception if you want Celery to record it as a failure
         raise
+    finally:
+        history_pool.shutdown(wait=False)
+        # Deferred and rerouted jobs come back; sharded ones are finished by reduce_analysis
+        if outcome not in ("deferred", "sharded", "rerouted"):
+            db_client.release_analysis(owner, repo, self.request.id)
+        if outcome not in ("sharded", "rerouted"):
+            ANALYSES.labels(outcome).inc()
+        # Where the time went, including for analyses that failed or timed out
+        db_client.update_job(self.request.id, {"trace": progress.finish()})
+
+def _complete_analysis(
+    job_id: str,
+    repo_id: str,
+    file_tree: List[Dict[str, Any]],
+    head: Dict[str, str],
+    graph_builder: GraphBuilder,
+    progress: PipelineProgress,
+    file_history_future: Future,
+    incremental: Optional[IncrementalAnalysis] = None,
+    previous: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Everything after the imports are resolved: metrics, graph, analytics,
+    narrative, and storing the result. Returns the repository and commit
+    analyzed; the results themselves are read from the store rather than
+    passed through the Celery result backend.
+    """
+    # 3. Calculate metrics
+    progress.set_stage("metrics")
+    file_history = file_history_future.result()
+    if incremental and file_history is None:
+        churn = incremental.carried_churn()
+        churn.update(Metrics(incremental.changed_items()).calculate_churn())
+    else:
+        churn = Metrics(file_tree, file_history).calculate_churn()
+
+    # 4. Build graph
+    progress.set_stage("graph")
+    graph_builder.churn_data = churn
+    graph_analytics = GraphAnalytics.from_edges(graph_builder.node_ids, *graph_builder.edge_arrays())
+    clusters = graph_builder.generate_clusters(graph_analytics.adjacency)
+    # Interned; expanded to nodes and links only when served as JSON
+    graph = graph_builder.compact_graph()
+    hierarchy = build_views(graph, clusters)
+    index = GraphIndex.build(graph.paths, graph_analytics.adjacency)
+
+    # 5. Structural analytics; hotspots are busy files that much depends on
+    progress.set_stage("analytics")
+    analytics = graph_analytics.analyze()
+    hotspots = Metrics(file_tree).identify_hotspots(churn, centrality=centrality_scores(analytics["files"]))
+
+    # 6. Generate narrative, reusing the previous one if the architecture did not move
+    progress.set_stage("narrative")
+    if incremental and set(clusters) == set(previous.get("clusters") or {}) and previous.get("narrative"):
+        story = previous["narrative"]
+    else:
+        llm_client = LLMClient(api_key=settings.LLM_API_KEY)
+        summary = {
+            "hotspots": hotspots,
+            "clusters": clusters,
+            "cycles": analytics["cycles"],
+            "modularity": graph_builder.community_stats.get("modularity"),
+        }
+        narrative_generator = Narrative(summary, llm_client)
+        story = narrative_generator.generate_story()
+
+    # 7. Store results in DB
+    progress.set_stage("storing")
+    analysis_data = {
+        "job_id": job_id,
+        "graph": graph,
+        "metrics": {
+            "churn": churn,
+            "hotspots": hotspots,
+            "file_history": file_history,
+            "graph": analytics,
+            "communities": graph_builder.community_stats,
+        },
+        "clusters": clusters,
+        "narrative": story,
+        **head,
+    }
+    db_client.store_analysis_result(repo_id, {
+        **analysis_data, "hierarchy": hierarchy, "index": index.dump(), "unresolved": graph_builder.unresolved,
+    })
+    # Stored results are what grows; trim the ones nobody reads
+    db_client.evict_results(keep=repo_id)
+    return {"job_id": job_id, "repo_id": repo_id, **head}
+
+def _dispatch_shards(
+    job_id: str,
+    owner: str,
+    repo: str,
+    repo_id: str,
+    github_client,
+    file_tree: List[Dict[str, Any]],
+    head: Dict[str, str],
+    import_source: str,
+) -> int:
+    """
+    Starts a sharded analysis if more than SHARD_MIN_FILES files are not in
+    the parse cache: a chord of parse_shard tasks over batches of those files,
+    with reduce_analysis as its callback. Every shard reading the archive
+    would download all of it, so with the archive source the shards read
+    their files from a partial clone instead, each fetching its batch's
+    blobs in one request. Returns the number of shards (0 if the analysis is
+    small enough to run in this task).
+    """
+    import_parser = ImportParser(github_client, ParseCache(db_client.redis_client))
+    cached, pending, _ = import_parser.plan(file_tree)
+    if len(pending) <= settings.SHARD_MIN_FILES:
+        return 0
+
+    shas = {item['path']: item.get('sha') for item in file_tree if item['type'] == 'blob'}
+    # Sorted, so a shard covers neighbouring directories
+    pending.sort()
+    batches = [pending[i:i + settings.SHARD_FILES] for i in range(0, len(pending), settings.SHARD_FILES)]
+    repo_source, source = ("git", "api") if import_source == "archive" else (settings.REPO_SOURCE, import_source)
+    total = len(cached) + len(pending)
+    db_client.start_shards(job_id, {"tree": file_tree, "head": head}, len(batches), total, len(cached), settings.SHARDED_ANALYSIS_TTL)
+    db_client.extend_analysis(owner, repo, job_id, settings.SHARDED_ANALYSIS_TTL)
+    db_client.update_job(job_id, {
+        "stage": "parsing",
+        "shards": {"total": len(batches), "done": 0},
+        "progress": {"total": total, "fetched": len(cached), "parsed": len(cached), "resolved": 0},
+    })
+
+    header = [
+        parse_shard.s(
+            owner, repo, job_id, index,
+            [{"path": path, "type": "blob", "sha": shas[path]} for path in batch],
+            head["commit_sha"], source, repo_source,
+        )
+        for index, batch in enumerate(batches)
+    ]
+    try:
+        chord(header)(reduce_analysis.s(owner, repo, repo_id, job_id).on_error(analysis_failed.si(owner, repo, job_id)))
+    except Exception:
+        db_client.clear_shards(job_id)
+        raise
+    return len(batches)
+
+@celery_app.task(bind=True, soft_time_limit=300, time_limit=310, max_retries=settings.SHARD_MAX_RETRIES)
+def parse_shard(
+    self, owner: str, repo: str, job_id: str, index: int, items: List[Dict[str, Any]], ref: str, source: str,
+    repo_source: Optional[str] = None,
+):
+    """
+    Fetches and parses one batch of files of a sharded analysis into the
+    parse cache, which doubles as the shard's checkpoint: imports are written
+    every SHARD_CHECKPOINT_FILES files and whenever the shard fails, so a
+    retry only fetches the files the previous attempt did not get to.
+    """
+    if db_client.is_shard_done(job_id, index):
+        return index
+
+    import_parser = ImportParser(_open_source(owner, repo, repo_source), ParseCache(db_client.redis_client))
+    _, pending, blob_shas = import_parser.plan(items)
+    parsed = {}
+    try:
+        for file_path, imports in import_parser.iter_parsed(import_parser.iter_source(owner, repo, pending, source, ref)):
+            parsed[file_path] = imports
+            if len(parsed) >= settings.SHARD_CHECKPOINT_FILES:
+                import_parser.store_parsed(parsed, blob_shas)
+                parsed = {}
+    except RateLimitExceeded as e:
+        print(f"Shard {index} of {owner}/{repo} deferred: {e}")
+        raise self.retry(exc=e, countdown=int(e.retry_after) + 1, max_retries=settings.RATE_LIMIT_MAX_DEFERRALS)
+    except Exception as e:
+        print(f"Shard {index} of {owner}/{repo} failed (attempt {self.request.retries + 1}): {e}")
+        raise self.retry(exc=e, countdown=2 ** self.request.retries)
+    finally:
+        import_parser.store_parsed(parsed, blob_shas)
+
+    totals = db_client.finish_shard(job_id, index, len(items), settings.SHARDED_ANALYSIS_TTL)
+    db_client.extend_analysis(owner, repo, job_id, settings.SHARDED_ANALYSIS_TTL)
+    db_client.update_job(job_id, {
+        "shards": {"total": totals["shards"], "done": totals["done"]},
+        "progress": {"total": totals["files"], "fetched": totals["parsed"], "parsed": totals["parsed"], "resolved": 0},
+    })
+    return index
+
+@celery_app.task(bind=True, soft_time_limit=settings.REDUCE_TIME_LIMIT, time_limit=settings.REDUCE_TIME_LIMIT + 10)
+def reduce_analysis(self, shard_results: List[int], owner: str, repo: str, repo_id: str, job_id: str):
+    """
+    Last step of a sharded analysis: resolves every file's imports from the
+    parse cache the shards filled (fetching the few that are missing, e.g.
+    evicted ones) and builds and stores the result like analyze_repository.
+    """
+    print(f"Merging {len(shard_results)} shards of {owner}/{repo}")
+    progress = PipelineProgress(lambda snapshot: db_client.update_job(job_id, snapshot))
+    history_pool = ThreadPoolExecutor(max_workers=1)
+    outcome = "failed"
+    try:
+        checkpoint = db_client.get_job_tree(job_id)
+        if checkpoint is None:
+            raise RuntimeError("the tree checkpoint of the analysis has expired")
+        file_tree, head = checkpoint["tree"], checkpoint["head"]
+        github_client = _open_source(owner, repo)
+        file_history_future = history_pool.submit(github_client.get_file_history, owner, repo)
+
+        parse_cache = ParseCache(db_client.redis_client)
+        import_parser = ImportParser(github_client, parse_cache)
+        resolver = import_parser.build_resolver(owner, repo, file_tree, head["commit_sha"])
+        graph_builder = GraphBuilder(file_tree, {}, [])
+        AnalysisPipeline(import_parser, resolver, graph_builder, progress).run(
+            owner, repo, file_tree, source="api", ref=head["commit_sha"],
+        )
+        db_client.update_job(job_id, {"parse_cache": parse_cache.stats()})
+
+        _complete_analysis(job_id, repo_id, file_tree, head, graph_builder, progress, file_history_future)
+        outcome = "completed"
+        return {"status": "completed", "shards": len(shard_results)}
+
+    except RateLimitExceeded as e:
+        if self.request.retries >= settings.RATE_LIMIT_MAX_DEFERRALS:
+            db_client.update_job_status(job_id, "failed")
+            print(f"Merging failed for {owner}/{repo} after {self.request.retries} deferrals: {e}")
+            raise
+        outcome = "deferred"
+        db_client.update_job_status(job_id, "deferred")
+        db_client.extend_analysis(owner, repo, job_id, int(e.retry_after) + settings.SHARDED_ANALYSIS_TTL)
+        print(f"Merging deferred for {owner}/{repo}: {e}")
+        raise self.retry(exc=e, countdown=int(e.retry_after) + 1, max_retries=settings.RATE_LIMIT_MAX_DEFERRALS)
+    except SoftTimeLimitExceeded:
+        outcome = "timed_out"
+        db_client.update_job_status(job_id, "TIMED_OUT")
+        print(f"Merging timed out for {owner}/{repo}")
+        raise
+    except Exception as e:
+        db_client.update_job_status(job_id, "failed")
+        print(f"Merging failed for {owner}/{repo}: {e}")
+        raise
+    finally:
+        history_pool.shutdown(wait=False)
+        if outcome != "deferred":
+            db_client.release_analysis(owner, repo, job_id)
+            db_client.clear_shards(job_id)
+        ANALYSES.labels(outcome).inc()
+        db_client.update_job(job_id, {"trace": progress.finish()})
+
+@celery_app.task
+def analysis_failed(owner: str, repo: str, job_id: str):
+    """
+    Error callback of a sharded analysis, for when a shard fails for good
+    and reduce_analysis never runs.
+    """
+    job = db_client.get_job(job_id)
+    if job and job.get("status") in JOB_FINAL_STATUSES:
+        # reduce_analysis ran and recorded the outcome itself
+        return
+    print(f"Sharded analysis of {owner}/{repo} failed")
+    db_client.update_job_status(job_id, "failed")
+    db_client.release_analysis(owner, repo, job_id)
+    db_client.clear_shards(job_id)
+    ANALYSES.labels("failed").inc()
 
 # To run the worker:
 # celery -A worker.worker.celery_app worker --loglevel=info
\ No newline at end of file
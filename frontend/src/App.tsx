@@ -31,9 +31,25 @@ import {
 } from "./components/ui/sidebar";
 import { AnimatePresence, motion } from "motion/react";
 import { ThemeToggle } from "./components/ThemeToggle";
+import { GRAPH_MEDIA_TYPE, decodeGraph } from "./lib/graphFormat";
 
 const API_URL = "http://localhost:8000/api/v1";
 
+// The graph comes in its binary format, alongside the other sections as JSON
+async function requestResults(repoId: string): Promise<AnalysisResult | null> {
+  const [sectionsResponse, graphResponse] = await Promise.all([
+    fetch(`${API_URL}/results/${repoId}?fields=metrics,clusters,narrative`),
+    fetch(`${API_URL}/results/${repoId}`, {
+      headers: { Accept: GRAPH_MEDIA_TYPE },
+    }),
+  ]);
+  if (!sectionsResponse.ok || !graphResponse.ok) {
+    return null;
+  }
+  const sections = await sectionsResponse.json();
+  return { ...sections, graph: decodeGraph(await graphResponse.arrayBuffer()) };
+}
+
 function App() {
   const [loading, setLoading] = useState(false);
   const [results, setResults] = useState<AnalysisResult | null>(null);
@@ -47,9 +63,8 @@ function App() {
       const fetchResults = async () => {
         setLoading(true);
         try {
-          const response = await fetch(`${API_URL}/results/${repoId}`);
-          if (response.ok) {
-            const data = await response.json();
+          const data = await requestResults(repoId);
+          if (data) {
             setResults(data);
           } else {
             toast.error("Failed to fetch analysis results.");
@@ -103,39 +118,68 @@ function App() {
       const analyzeData = await analyzeResponse.json();
 
       if (analyzeData.job_id) {
-        const pollStatus = async () => {
-          const statusResponse = await fetch(
-            `${API_URL}/status/${analyzeData.job_id}`
-          );
-          if (!statusResponse.ok) {
-            throw new Error("Failed to get job status");
+        const loadResults = async () => {
+          const resultsData = await requestResults(analyzeData.repo_id);
+          if (!resultsData) {
+            throw new Error("Failed to get results");
           }
-          const statusData = await statusResponse.json();
+          setResults(resultsData);
+          setLoading(false);
+        };
 
-          if (statusData.status === "completed") {
-            const resultsResponse = await fetch(
-              `${API_URL}/results/${analyzeData.repo_id}`
-            );
-            if (!resultsResponse.ok) {
-              throw new Error("Failed to get results");
-            }
-            const resultsData = await resultsResponse.json();
-            setResults(resultsData);
-            setLoading(false);
-          } else if (statusData.status === "failed") {
+        // Returns true once the job has reached a final status
+        const handleStatus = async (status: string) => {
+          if (status === "completed") {
+            await loadResults();
+          } else if (status === "failed") {
             toast.error("Analysis job failed. Please try again later.");
             setLoading(false);
-          } else if (statusData.status === "TIMED_OUT") {
+          } else if (status === "TIMED_OUT") {
             toast.error(
               "Analysis timed out. The repository may be too large."
             );
             setLoading(false);
           } else {
+            return false;
+          }
+          return true;
+        };
+
+        const pollStatus = async () => {
+          const statusResponse = await fetch(
+            `${API_URL}/status/${analyzeData.job_id}`
+          );
+          if (!statusResponse.ok) {
+            throw new Error("Failed to get job status");
+          }
+          const statusData = await statusResponse.json();
+          if (!(await handleStatus(statusData.status))) {
             setTimeout(pollStatus, 2000);
           }
         };
 
-        setTimeout(pollStatus, 2000);
+        // Status changes are pushed over Server-Sent Events; polling is the
+        // fallback when the stream cannot be opened or drops
+        const events = new EventSource(
+          `${API_URL}/status/${analyzeData.job_id}/stream`
+        );
+        const onFinalStatus = (event: MessageEvent) => {
+          events.close();
+          const statusData = JSON.parse(event.data);
+          handleStatus(statusData.status).catch((err: unknown) => {
+            toast.error(
+              err instanceof Error ? err.message : "An unknown error occurred"
+            );
+            setLoading(false);
+          });
+        };
+        events.addEventListener("completed", onFinalStatus);
+        events.addEventListener("failed", onFinalStatus);
+        events.addEventListener("timed_out", onFinalStatus);
+        events.onerror = () => {
+          events.close();
+          setTimeout(pollStatus, 2000);
+        };
       } else {
         setResults(analyzeData);
         setHistory((prev) => [
@@ -162,9 +206,8 @@ function App() {
     setLoading(true);
     setResults(null);
     try {
-      const response = await fetch(`${API_URL}/results/${repo.id}`);
-      if (response.ok) {
-        const data = await response.json();
+      const data = await requestResults(repo.id);
+      if (data) {
         setResults(data);
         setSearchParams({ repo_id: repo.id });
       } else {
@@ -0,0 +1,58 @@
+import type { GraphData } from "../types";
+
+// Binary graph format served by the API (see backend/app/core/compact_graph.py)
+export const GRAPH_MEDIA_TYPE = "application/vnd.synapse.graph";
+const GRAPH_MAGIC = "SYNG";
+const GRAPH_FORMAT_VERSION = 1;
+
+// Reads a length-prefixed, NUL-separated UTF-8 string table padded to 4 bytes
+function readStrings(
+  view: DataView,
+  offset: number,
+  count: number,
+  decoder: TextDecoder
+): [string[], number] {
+  const length = view.getUint32(offset, true);
+  const start = offset + 4;
+  const text = decoder.decode(
+    new Uint8Array(view.buffer, view.byteOffset + start, length)
+  );
+  return [count ? text.split("\0") : [], start + length + ((4 - (length % 4)) % 4)];
+}
+
+export function decodeGraph(buffer: ArrayBuffer): GraphData {
+  const view = new DataView(buffer);
+  const decoder = new TextDecoder();
+  const magic = decoder.decode(new Uint8Array(buffer, 0, 4));
+  if (magic !== GRAPH_MAGIC || view.getUint32(4, true) !== GRAPH_FORMAT_VERSION) {
+    throw new Error("Unsupported graph format");
+  }
+  const nodeCount = view.getUint32(8, true);
+  const edgeCount = view.getUint32(12, true);
+  const groupCount = view.getUint32(16, true);
+
+  let offset = 20;
+  let paths: string[];
+  let groups: string[];
+  [paths, offset] = readStrings(view, offset, nodeCount, decoder);
+  [groups, offset] = readStrings(view, offset, groupCount, decoder);
+
+  // Int32Array assumes a little-endian host, like every browser platform
+  const readInts = (count: number) => {
+    const values = new Int32Array(buffer, offset, count);
+    offset += 4 * count;
+    return values;
+  };
+  const group = readInts(nodeCount);
+  const churn = readInts(nodeCount);
+  const sources = readInts(edgeCount);
+  const targets = readInts(edgeCount);
+
+  return {
+    nodes: paths.map((id, i) => ({ id, group: groups[group[i]], size: churn[i] })),
+    links: Array.from(sources, (source, i) => ({
+      source: paths[source],
+      target: paths[targets[i]],
+    })),
+  };
+}
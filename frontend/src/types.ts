@@ -20,11 +20,32 @@ export interface GraphData {
   links: Link[];
 }
 
+export interface FileAnalytics {
+  in_degree: number;
+  out_degree: number;
+  pagerank: number;
+  betweenness: number;
+  layer: number;
+}
+
+export interface GraphAnalytics {
+  files: Record<string, FileAnalytics>;
+  cycles: string[][];
+  summary: {
+    nodes: number;
+    edges: number;
+    cycles: number;
+    largest_cycle: number;
+    layers: number;
+  };
+}
+
 export interface AnalysisResult extends HistoryItem {
   graph: GraphData;
   narrative: string;
   metrics: {
     hotspots: string[];
+    graph?: GraphAnalytics;
   };
   clusters: Record<string, string[]>;
 }
\ No newline at end of file